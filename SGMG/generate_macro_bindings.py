@@ -7,7 +7,13 @@ class macro_bindings:
     def __init__(self):
         pass
 
-    def write_entry(macroFile: TextIOWrapper, fileName, numberOfSketches):
+    def write_entry(
+        macroFile: TextIOWrapper,
+        fileName,
+        numberOfSketches,
+        modelName=None,
+        supersededName=None,
+    ):
         macroFile.write(f"// Simcenter STAR-CCM+ macro: {fileName}\n")
         macroFile.write(f"// Written by Erik Hasselwander\n")
         macroFile.write(f"\n")
@@ -26,6 +32,25 @@ class macro_bindings:
         macroFile.write(f"\n")
         macroFile.write(f"  private void execute{0}() {{\n")
         macroFile.write(f"    Simulation simulation_0 = getActiveSimulation();\n")
+        # Left over by a case that failed while building its model
+        macroFile.write(
+            f'    if (simulation_0.get(SolidModelManager.class).has("{MODEL_TMP_NAME}")) {{\n'
+        )
+        macroFile.write(
+            f'      simulation_0.get(SolidModelManager.class).removeObjects(simulation_0.get(SolidModelManager.class).getObject("{MODEL_TMP_NAME}"));\n'
+        )
+        macroFile.write(f"    }}\n")
+        if modelName is not None:
+            # The sim still holds the model of the base case or of the previous
+            # case, replace_geometry removes it once no part is bound to it
+            supersededName = supersededName or f"{modelName}_superseded"
+            macroFile.write(
+                f'    if (simulation_0.get(SolidModelManager.class).has("{modelName}")) {{\n'
+            )
+            macroFile.write(
+                f'      ((CadModel) simulation_0.get(SolidModelManager.class).getObject("{modelName}")).setPresentationName("{supersededName}");\n'
+            )
+            macroFile.write(f"    }}\n")
         macroFile.write(
             f"    CadModel cadModel_0 = simulation_0.get(SolidModelManager.class).createSolidModel();\n\n"
         )
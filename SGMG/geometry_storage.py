@@ -1,4 +1,6 @@
 from dataclasses import dataclass, field
+from pathlib import Path
+import json
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -25,6 +27,18 @@ class Sketch:
     def length(self):
         return len(self.curves)
 
+    def is_equal(self, other: "Sketch", atol=1e-9):
+        if self.length() != other.length():
+            return False
+        for curve, other_curve in zip(self.curves, other.curves):
+            if curve.face_name != other_curve.face_name:
+                return False
+            if curve.points.shape != other_curve.points.shape:
+                return False
+            if not np.allclose(curve.points, other_curve.points, rtol=0, atol=atol):
+                return False
+        return True
+
 
 @dataclass
 class GeometryStorage:
@@ -46,6 +60,68 @@ class GeometryStorage:
     def get_sketches(self) -> dict[str, Sketch]:
         return self.sketches
 
+    def changed_sketches(self, other: "GeometryStorage", atol=1e-9) -> list[str]:
+        """Names of the sketches in self that are missing from or differ in other."""
+        changed = []
+        for sketch_name, sketch in self.sketches.items():
+            if sketch_name not in other.sketches or not sketch.is_equal(
+                other.sketches[sketch_name], atol
+            ):
+                changed.append(sketch_name)
+        return changed
+
+    def displacements(self, other: "GeometryStorage") -> np.ndarray | None:
+        """
+        Rows (x, y, dx, dy) moving the curve points of other onto those of self,
+        None if the sketches do not correspond point by point.
+        """
+        rows = []
+        for sketch_name, sketch in self.sketches.items():
+            other_sketch = other.sketches.get(sketch_name)
+            if other_sketch is None or sketch.length() != other_sketch.length():
+                return None
+            for curve, other_curve in zip(sketch.curves, other_sketch.curves):
+                if (
+                    curve.face_name != other_curve.face_name
+                    or curve.points.shape != other_curve.points.shape
+                ):
+                    return None
+                rows.append(
+                    np.hstack([other_curve.points, curve.points - other_curve.points])
+                )
+        if not rows:
+            return None
+        return np.vstack(rows)
+
+    def save(self, path: Path):
+        data = {"name": self.name, "sketches": []}
+        for sketch in self.sketches.values():
+            data["sketches"].append(
+                {
+                    "name": sketch.name,
+                    "curves": [
+                        {"face_name": curve.face_name, "points": curve.points.tolist()}
+                        for curve in sketch.curves
+                    ],
+                }
+            )
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+    @classmethod
+    def load(cls, path: Path) -> "GeometryStorage":
+        with open(path, "r") as file:
+            data = json.load(file)
+        geometry = cls(data["name"])
+        for sketch_data in data["sketches"]:
+            sketch = Sketch(sketch_data["name"])
+            for curve_data in sketch_data["curves"]:
+                sketch.add_curve(
+                    Curve(np.array(curve_data["points"]), curve_data["face_name"])
+                )
+            geometry.add_sketch(sketch)
+        return geometry
+
     def plot_geometry(self):
         fig, ax = plt.subplots()
 
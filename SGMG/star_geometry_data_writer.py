@@ -0,0 +1,76 @@
+from pathlib import Path
+from io import TextIOWrapper
+
+from SGMG.geometry_storage import GeometryStorage, Sketch
+from SGMG.generate_macro_bindings import MODEL_TMP_NAME
+
+
+class StarGeometryDataWriter:
+    """
+    Writes the geometry and global parameters of a case to a data file that is
+    read at runtime by the fixed refFiles/load_design.java macro, so nothing has
+    to be compiled per case.
+
+    Row types (comma separated):
+        model, <name>, <temporary name>, <name the previous model is renamed to>
+        parameter, <name>, <value>
+        sketch, <name>
+        point, <x>, <y>
+        curve, <face name>, <point index> <point index> ...
+    """
+
+    def __init__(
+        self,
+        geometry: GeometryStorage,
+        fileName: str,
+        path=Path.cwd(),
+        sketchNames: list[str] = None,
+        parameters: dict = None,
+        supersededName: str = None,
+    ):
+        if fileName[-4:] != ".csv":
+            fileName += ".csv"
+        self.filePath = path / fileName
+
+        sketches = [
+            sketch
+            for sketch in geometry.get_sketches().values()
+            if sketchNames is None or sketch.name in sketchNames
+        ]
+
+        with open(self.filePath, "w+") as dataFile:
+            supersededName = supersededName or f"{geometry.name}_superseded"
+            dataFile.write(
+                f"model, {geometry.name}, {MODEL_TMP_NAME}, {supersededName}\n"
+            )
+            for key, value in (parameters or {}).items():
+                dataFile.write(f"parameter, {key}, {float(value)}\n")
+            for sketch in sketches:
+                self.__add_sketch(sketch, dataFile)
+
+    def getPath(self):
+        return self.filePath
+
+    def __add_sketch(self, sketch: Sketch, dataFile: TextIOWrapper):
+        dataFile.write(f"sketch, {sketch.name}\n")
+
+        # Unique points of the sketch, in order of appearance
+        points = {}
+        for curveData in sketch.curves:
+            for point in curveData.points:
+                pointTuple = tuple(point)
+                if pointTuple not in points:
+                    points[pointTuple] = len(points)
+        for pointTuple in points:
+            dataFile.write(f"point, {float(pointTuple[0])}, {float(pointTuple[1])}\n")
+
+        # Each curve is a polyline through its points, repeated points are dropped
+        for curveData in sketch.curves:
+            indices = []
+            for point in curveData.points:
+                index = points[tuple(point)]
+                if not indices or indices[-1] != index:
+                    indices.append(index)
+            dataFile.write(
+                f"curve, {curveData.face_name}, {" ".join(map(str, indices))}\n"
+            )
@@ -8,25 +8,35 @@ from SGMG.generate_macro_bindings import macro_bindings
 
 class StarGeometryMacroGenerator:
     def __init__(
-        self, geometry: GeometryStorage, fileName: str, path=Path.cwd()
+        self,
+        geometry: GeometryStorage,
+        fileName: str,
+        path=Path.cwd(),
+        sketchNames: list[str] = None,
+        supersededName: str = None,
     ) -> Path:
         if fileName[-5:] != ".java":
             fileName += ".java"
         self.filePath = path / fileName
         self.sketches = {}
 
+        # Only the requested sketches are written, the rest are left untouched in the model
+        sketches = [
+            sketch
+            for sketch in geometry.get_sketches().values()
+            if sketchNames is None or sketch.name in sketchNames
+        ]
+
         with open(self.filePath, "w+") as macroFile:
             macro_bindings.write_entry(
-                macroFile, fileName, len(geometry.get_sketches())
+                macroFile, fileName, len(sketches), geometry.name, supersededName
             )
             macroFile.write("\n")
 
-            for index, sketch in enumerate(geometry.get_sketches().values()):
+            for index, sketch in enumerate(sketches):
                 self.__add_sketch(sketch, macroFile, index)
 
-            macro_bindings.write_end(
-                macroFile, len(geometry.get_sketches()), geometry.name
-            )
+            macro_bindings.write_end(macroFile, len(sketches), geometry.name)
 
     def getPath(self):
         return self.filePath
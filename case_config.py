@@ -1,7 +1,9 @@
 import os
 import subprocess
 import csv
-import shutil
+import shlex
+import sys
+import time
 
 import numpy as np
 from pathlib import Path
@@ -10,17 +12,96 @@ import pandas as pd
 
 from geometryParametrization import HEXTestrigDuctCurvedFinsGeometry
 from SGMG.star_geometry_macro_generator import StarGeometryMacroGenerator
+from SGMG.star_geometry_data_writer import StarGeometryDataWriter
+from SGMG.geometry_storage import GeometryStorage
+from starRunner.executors import CaseJob, LocalPoolExecutor
+from starRunner.file_lock import FileLock
+from starRunner.sim_files import (
+    BASE_SIM_SUFFIX,
+    findCampaignBase,
+    publishCampaignBase,
+    stageSimFile,
+    writeCasePointer,
+)
+from starRunner.star_session import supersedeCadModels
+from starRunner.telemetry import PhaseTimer
+from starRunner.warm_start import SNAPSHOT_FILE_NAME, findNearestSnapshot
+from starRunner.mesh_morph import (
+    MESHED_SIM_SUFFIX,
+    findMorphReference,
+    maxDisplacement,
+    readMorphStatus,
+    writeDisplacements,
+)
 
 
 class StarManager:
     def __init__(self):
         self.baseGeometryDict = {}
         self.batchCommands = []
+        self.caseOptions = {}
+        # Wall and CPU time per phase of the case, see telemetryRecord
+        self.telemetry = PhaseTimer()
+        # Settings can be overridden on the instance before runSingleCase
+        self.__setBaseSettings()
 
     def __setBaseSettings(self):
         self.STARCCMPath = "starccm+"
         self.baseCaseFileName = "basecase_curved_hexmodel_newstar.sim"
         self.nCPUs = 2
+        # Only rebuild the sketches that differ from the reference geometry
+        self.incrementalGeometry = True
+        # "data": geometry and variables are written to design_data.csv and read by
+        # the fixed load_design.java macro, "generated": a Java macro per case
+        self.macroMode = "data"
+        # Precompiled static macros (starRunner.macro_bundle.MacroBundle). STAR-CCM+
+        # needs one: the macros extend macro.CaseMacro, found on its -classpath
+        self.macroBundle = None
+        # Plots and scenes rendered by post_star: "none", "all", a list of names, or
+        # "best" to keep the solved sim so exportImages() can render it afterwards
+        self.imageExport = "none"
+        # Objective of the best design so far: with imageExport "best" only a case
+        # below it keeps its solved sim
+        self.bestObjective = None
+        # Reused STAR-CCM+ server (starRunner.star_session.StarSession), if any
+        self.starSession = None
+        # Runs the STAR command of the case (starRunner.executors.CaseExecutor),
+        # a local executor limited to nCPUs is used if none is given
+        self.executor = None
+        # Timeouts, hang detection and retries of the default executor
+        # (starRunner.watchdog.Watchdog)
+        self.watchdog = None
+        # Peak memory estimate that gates the start of cases in the default
+        # executor (starRunner.memory_model.MemoryModel)
+        self.memoryModel = None
+        # Converged cases keep a field snapshot, new cases are initialized from
+        # the snapshot of the nearest converged design
+        self.warmStart = False
+        # [low, high] per design variable for the warm start distance, the span
+        # of the evaluated designs if None
+        self.designSpace = None
+        # Morph the mesh of a previous design onto the new curves instead of
+        # remeshing, unless a wall point moves more than morphMaxDisplacement (m)
+        # or the morphed mesh fails the quality limits
+        self.meshMorphing = False
+        self.morphMaxDisplacement = 2e-3
+        self.morphMinCellQuality = 1e-2
+        self.morphMaxSkewness = 85.0
+        # How the case gets its .sim (starRunner.sim_files.stageSimFile): "auto",
+        # "reflink", "hardlink", "load" (the shared base, read-only) or "copy"
+        self.simFileStrategy = "auto"
+        # Node-local directory (e.g. "$TMPDIR" or "/dev/shm", expanded on the node
+        # running the case) to run the case in (starRunner/scratch.py), only the
+        # outputs are copied back to the case directory; None runs it in place
+        self.scratchPath = None
+        # Copied back from scratch besides what warm start, morphing and image
+        # export need
+        self.scratchOutputs = ["results.csv", "CFD_*.txt*", "morph_status.csv"]
+        # CFD_out.txt is gzipped to CFD_out.txt.<n>.gz every logMaxBytes and its
+        # monitor lines indexed (starRunner/case_log.py), None writes it as is;
+        # logBackupCount limits the gzipped parts kept
+        self.logMaxBytes = 50 * 1024**2
+        self.logBackupCount = None
 
     def __setBaseGeometry(self):
         # Radial coordinates for the duct
@@ -47,55 +128,117 @@ class StarManager:
         designVariablesList: list,
         dataPath: Path,
         refFilesPath: Path,
+        referenceGeometryPath: Path = None,
     ):
+        """
+        referenceGeometryPath: geometry.json of the geometry currently held by the
+        .sim that is loaded, e.g. the previous case when the sim is reused.
+        Defaults to the geometry stored next to the base case, if there is
+        none to the campaign base saved by the first case (starRunner.sim_files).
+        """
+        self.prepareCase(
+            casename, designVariablesList, dataPath, refFilesPath, referenceGeometryPath
+        )
+        self.__print("Running...")
+        self.__runCase()
+        return self.collectResults()
+
+    def checkGeometry(self, designVariablesList: list):
+        """Why the design's geometry cannot be built, None if it can. Writes nothing."""
+        self.__setBaseGeometry()
+        self.__setDesignVariables(designVariablesList)
+        try:
+            geometry = HEXTestrigDuctCurvedFinsGeometry(self.baseGeometryDict)
+        except (ValueError, ZeroDivisionError, FloatingPointError) as error:
+            return str(error)
+        return geometry.infeasibility()
+
+    def prepareCase(
+        self,
+        casename: str,
+        designVariablesList: list,
+        dataPath: Path,
+        refFilesPath: Path,
+        referenceGeometryPath: Path = None,
+    ):
+        """Build the geometry, macros and case directory, ready for submitCase."""
         self.caseName = casename
+        self.dataPath = dataPath
+        self.caseStartTime = time.time()
         # Set the folder to run the case in
         self.refFilesPath = refFilesPath
         self.casePath = dataPath / self.caseName
         self.casePath.mkdir(parents=True, exist_ok=True)
 
-        # The static macros
-        self.baseGeometryDict["replaceGeometryMacro"] = str(
-            self.refFilesPath / "replace_geometry.java"
-        )
-        self.baseGeometryDict["starPostMacro"] = str(
-            self.refFilesPath / "post_star.java"
-        )
-        self.baseGeometryDict["starRunMacro"] = str(self.refFilesPath / "run_star.java")
+        self.__setMacroPaths()
 
-        # Set the base parameters (paths etc)
-        self.__setBaseSettings()
         # Set the base geometry params (the static description of the case)
         self.__setBaseGeometry()
-        var_names = [
-            "xMidFactor",
-            "rMidFactor",
-            "alpha",
-            "lambda1",
-            "lambda2",
-            "lambda3",
-            "lambda4",
-            "lambda5",
-            "lambda6",
-            "lambda7",
-            "lambda8",
-            "AR",
-        ]
-
         # Set the variable geometry params
-        self.optimization_parameters = {}
-        for key, value in zip(var_names, designVariablesList):
-            self.optimization_parameters[key] = value
-            self.baseGeometryDict[key] = value
+        self.__setDesignVariables(designVariablesList)
 
         # Generate the geometry
         self.__print("Generating geometry...")
-        self.geometry = HEXTestrigDuctCurvedFinsGeometry(self.baseGeometryDict)
-        self.geometry.plot(self.casePath)
-        # Generate the geometry macro
-        geometryMacroPath = StarGeometryMacroGenerator(
-            self.geometry.geometry_storage, f"{self.caseName}_geometry", self.casePath
-        ).getPath()
+        with self.telemetry.phase("geometry_build"):
+            self.geometry = HEXTestrigDuctCurvedFinsGeometry(self.baseGeometryDict)
+        with self.telemetry.phase("geometry_plot"):
+            self.geometry.plot(self.casePath)
+        with self.telemetry.phase("geometry_build"):
+            self.geometryPath = self.casePath / "geometry.json"
+            self.geometry.geometry_storage.save(self.geometryPath)
+
+        # Mesh to morph: the one held by the server, or the saved mesh of the
+        # closest previous case, whose sim is then loaded instead of the base case
+        self.caseOptions.pop("morph_mesh", None)
+        morphSimPath = None
+        if self.meshMorphing:
+            with self.telemetry.phase("morph_preparation"):
+                morphSimPath = self.__prepareMorph()
+            if morphSimPath is not None:
+                referenceGeometryPath = morphSimPath.parent / "geometry.json"
+
+        # Find the sketches that actually have to be rebuilt in the sim
+        baseSimPath = self.refFilesPath / self.baseCaseFileName
+        self.caseOptions.pop("save_base", None)
+        if referenceGeometryPath is None and self.starSession is not None:
+            referenceGeometryPath = self.starSession.geometryPath
+        if referenceGeometryPath is None:
+            referenceGeometryPath = self.refFilesPath / (
+                Path(self.baseCaseFileName).stem + "_geometry.json"
+            )
+            if (
+                self.starSession is None
+                and self.incrementalGeometry
+                and not os.path.isfile(referenceGeometryPath)
+            ):
+                # The geometry of the base case is unknown: load the sim saved
+                # by the first case of the campaign, or be that case
+                campaignBase = findCampaignBase(self.dataPath)
+                if campaignBase is None:
+                    self.caseOptions["save_base"] = "true"
+                else:
+                    baseSimPath, referenceGeometryPath = campaignBase
+        self.changedSketches = list(self.geometry.geometry_storage.get_sketches())
+        if self.incrementalGeometry and os.path.isfile(referenceGeometryPath):
+            with self.telemetry.phase("geometry_build"):
+                self.changedSketches = self.geometry.geometry_storage.changed_sketches(
+                    GeometryStorage.load(referenceGeometryPath)
+                )
+        self.__print(f"Sketches to replace: {", ".join(self.changedSketches) or "none"}")
+        self.caseOptions["replace_bodies"] = ";".join(self.changedSketches)
+
+        # CAD models of the sim: the one of the base case, or those the server
+        # holds. The model of the changed sketches supersedes the current one
+        self.modelName = self.geometry.geometry_storage.name
+        self.cadModelsBefore = {
+            self.modelName: set(self.geometry.geometry_storage.get_sketches())
+        }
+        if self.starSession is not None and self.starSession.cadModels is not None:
+            self.cadModelsBefore = self.starSession.cadModels
+        self.cadModels, supersededName, removeModels = supersedeCadModels(
+            self.cadModelsBefore, self.modelName, self.caseName, self.changedSketches
+        )
+        self.caseOptions["remove_models"] = ";".join(removeModels)
 
         # Add the design variables we need in star to the dict
         designVariablesForStar = ["alpha", "kappa"]
@@ -106,87 +249,504 @@ class StarManager:
                 ]
         self.starInputDict["yprimx0"] = self.geometry.P_H[0]
         self.starInputDict["yprimy0"] = self.geometry.P_H[1]
-        variableMacroPath = self.__generateVariableMacro(
-            self.starInputDict, self.casePath
-        )
 
-        self.simFilePath = self.casePath / (self.caseName + ".sim")
-        shutil.copy2(self.refFilesPath / self.baseCaseFileName, self.simFilePath)
+        with self.telemetry.phase("macro_generation"):
+            if self.macroMode == "data":
+                # Geometry and variables are read at runtime by the fixed load_design macro
+                StarGeometryDataWriter(
+                    self.geometry.geometry_storage,
+                    "design_data",
+                    self.casePath,
+                    sketchNames=self.changedSketches,
+                    parameters=self.starInputDict,
+                    supersededName=supersededName,
+                )
+            else:
+                # Generate the geometry macro
+                geometryMacroPath = StarGeometryMacroGenerator(
+                    self.geometry.geometry_storage,
+                    f"{self.caseName}_geometry",
+                    self.casePath,
+                    sketchNames=self.changedSketches,
+                    supersededName=supersededName,
+                ).getPath()
+                variableMacroPath = self.__generateVariableMacro(
+                    self.starInputDict, self.casePath
+                )
+
+        # A server session already has the sim loaded
+        self.jobEnv = None
+        if self.starSession is None:
+            with self.telemetry.phase("sim_staging"):
+                self.simFilePath, strategy = stageSimFile(
+                    morphSimPath or baseSimPath,
+                    self.casePath / (self.caseName + ".sim"),
+                    self.simFileStrategy,
+                )
+            if strategy == "load":
+                # The macros would write next to the shared sim otherwise
+                self.jobEnv = {"BOGP_CASE_POINTER": str(writeCasePointer(self.casePath))}
+        else:
+            self.simFilePath = self.starSession.simFilePath
+        # Saved sims are named after the case, whatever sim was loaded
+        self.caseOptions["case_name"] = self.caseName
+
+        self.caseOptions.pop("keep_solution_below", None)
+        if self.imageExport == "best":
+            self.caseOptions["export_images"] = "none"
+            self.caseOptions["keep_solution"] = "true"
+            if self.bestObjective is not None and np.isfinite(self.bestObjective):
+                # Only a case that may become the new best keeps its solved sim
+                self.caseOptions["keep_solution_below"] = self.bestObjective
+        elif isinstance(self.imageExport, str):
+            self.caseOptions["export_images"] = self.imageExport
+        else:
+            self.caseOptions["export_images"] = ";".join(self.imageExport)
+
+        if self.meshMorphing:
+            # Keep the mesh for the next designs, outside a server in a saved sim
+            self.caseOptions["keep_mesh"] = "true"
+            self.caseOptions["save_mesh"] = str(self.starSession is None).lower()
+
+        self.warmStartFrom = None
+        if self.warmStart:
+            self.caseOptions["save_snapshot"] = "true"
+            with self.telemetry.phase("warm_start_lookup"):
+                nearest = findNearestSnapshot(
+                    self.dataPath / "database.csv",
+                    self.dataPath,
+                    designVariablesList,
+                    list(self.optimization_parameters),
+                    designSpace=self.designSpace,
+                    residualLimit=self.residual_limit,
+                )
+            if nearest is not None:
+                self.warmStartFrom, snapshotPath, distance = nearest
+                self.caseOptions["warm_start"] = str(snapshotPath)
+                self.__print(f"Warm start from {self.warmStartFrom} (distance {distance:.3f})")
+            else:
+                self.caseOptions.pop("warm_start", None)
+
+        self.__writeCaseOptions(self.caseOptions, self.casePath)
 
         # Set batch commands now that we have the paths.
-        self.batchCommands.append(geometryMacroPath)
-        self.batchCommands.append(self.baseGeometryDict["replaceGeometryMacro"])
-        self.batchCommands.append(variableMacroPath)
+        if self.macroMode == "data":
+            self.batchCommands.append(self.baseGeometryDict["loadDesignMacro"])
+            self.batchCommands.append(self.baseGeometryDict["replaceGeometryMacro"])
+        else:
+            if self.changedSketches:
+                self.batchCommands.append(geometryMacroPath)
+            self.batchCommands.append(self.baseGeometryDict["replaceGeometryMacro"])
+            self.batchCommands.append(variableMacroPath)
+        if self.warmStart:
+            self.batchCommands.append(self.baseGeometryDict["warmStartMacro"])
         self.batchCommands.append(self.baseGeometryDict["starRunMacro"])
         self.batchCommands.append(self.baseGeometryDict["starPostMacro"])
 
-        self.__print("Running...")
-        self.__runCase()
+    def attachCase(
+        self,
+        casename: str,
+        designVariablesList: list,
+        dataPath: Path,
+        refFilesPath: Path,
+        job: CaseJob = None,
+    ):
+        """
+        Take over a case prepared by an earlier driver process, e.g. after a
+        restart, without regenerating it. job: the run if it is still going on,
+        otherwise the case is taken as finished with what it left in its directory.
+        """
+        self.caseName = casename
+        self.dataPath = dataPath
+        self.refFilesPath = refFilesPath
+        self.casePath = dataPath / self.caseName
+        self.caseStartTime = time.time()
+        self.geometryPath = self.casePath / "geometry.json"
+        self.warmStartFrom = None
+        self.jobEnv = None
+        self.__setMacroPaths()
+        self.__setBaseGeometry()
+        self.__setDesignVariables(designVariablesList)
+        if job is None:
+            finished = (self.casePath / "results.csv").is_file()
+            job = CaseJob(
+                self.caseName,
+                [],
+                self.casePath,
+                self.casePath / "CFD_out.txt",
+                self.casePath / "CFD_err.txt",
+                nCPUs=self.nCPUs,
+                status="done" if finished else "failed",
+                returncode=0 if finished else 1,
+            )
+        self.job = job
+        return self.job
+
+    def submitCase(self) -> CaseJob:
+        """
+        Hand the prepared case to the executor and return its job without waiting,
+        collect the results with collectResults once the job has finished.
+        """
+        self.job = self.buildJob()
+        if self.starSession is not None:
+            # The server runs one case at a time, the job is finished on return
+            self.__runSessionCase(self.job)
+            return self.job
+        if self.executor is None:
+            self.executor = LocalPoolExecutor(
+                self.nCPUs, watchdog=self.watchdog, memoryModel=self.memoryModel
+            )
+        return self.executor.submit(self.job)
+
+    def collectResults(self):
         self.__print("Posting...")
         self.resultsPath = self.casePath / "results.csv"
 
-        self.results = self.__dictifyResults(self.resultsPath)
-        self.__print("Posting successful")
+        with self.telemetry.phase("results_parsing"):
+            self.results = self.__dictifyResults(self.resultsPath)
+            self.__print("Posting successful")
 
-        self.__postProcess()
+            self.__postProcess()
 
+        # Terminal status of the run: done, failed, or what stopped it
+        # (timeout, hung, license, transient, cancelled)
+        status = self.job.status
+        if status != "done" and self.job.reason is not None:
+            status = self.job.reason
         self.data_to_file = {
-            "casename": casename,
+            "casename": self.caseName,
+            "status": status,
+            "attempts": self.job.attempt,
+            "nCPUs": self.nCPUs,
+            # Solver time of the STAR run, and wall time from prepareCase on (s)
+            "runtime": self.job.runtime(),
+            "case_time": time.time() - self.caseStartTime,
+            "peak_rss_mb": (
+                self.job.peakRSS / 1024**2 if self.job.peakRSS is not None else None
+            ),
+            "warm_start_from": self.warmStartFrom,
+            "mesh_update": readMorphStatus(self.casePath).get(
+                "mesh_update", "remesh" if self.meshMorphing else None
+            ),
             **self.optimization_parameters,
             **self.results
         }
-        self.databasePath = dataPath / "database.csv"
+        self.databasePath = self.dataPath / "database.csv"
         # Convert current data to a DataFrame
         new_df = pd.DataFrame([self.data_to_file])
 
-        if os.path.isfile(self.databasePath):
-            # Load existing data
-            existing_df = pd.read_csv(self.databasePath)
-
-            # Combine columns from both new and existing data
-            combined_df = pd.concat([existing_df, new_df], ignore_index=True, sort=False)
-
-            # Write back full DataFrame with updated columns
-            combined_df.to_csv(self.databasePath, index=False)
-        else:
-            # File doesn't exist — just write the new row
-            new_df.to_csv(self.databasePath, index=False)
-
-        if self.optimization_target not in self.results:
-            return 1
-        if (
+        # Cases may finish concurrently, possibly on other nodes
+        with self.telemetry.phase("database_update"), FileLock(
+            self.dataPath / "database.csv.lock"
+        ):
+            if os.path.isfile(self.databasePath):
+                # Load existing data, a case collected again replaces its row
+                existing_df = pd.read_csv(self.databasePath)
+                existing_df = existing_df[existing_df["casename"] != self.caseName]
+
+                # Combine columns from both new and existing data
+                combined_df = pd.concat([existing_df, new_df], ignore_index=True, sort=False)
+
+                # Write back full DataFrame with updated columns
+                combined_df.to_csv(self.databasePath, index=False)
+            else:
+                # File doesn't exist — just write the new row
+                new_df.to_csv(self.databasePath, index=False)
+
+        meshedSimPath = self.casePath / (self.caseName + MESHED_SIM_SUFFIX)
+        if meshedSimPath.is_file() and (
+            self.job.status != "done"
+            or readMorphStatus(self.casePath).get("mesh_update") == "morph"
+        ):
+            # A morphed mesh no longer matches the parts of its sim, so only
+            # remeshed cases serve as morph references
+            meshedSimPath.unlink()
+
+        baseSimPath = self.casePath / (self.caseName + BASE_SIM_SUFFIX)
+        if baseSimPath.is_file():
+            # The geometry of a failed case may not have been built
+            if self.job.status == "done" and publishCampaignBase(
+                self.casePath, self.caseName, self.dataPath
+            ):
+                self.__print("Saved as the campaign base, later cases load it")
+            baseSimPath.unlink(missing_ok=True)
+
+        if self.optimization_target not in self.results or (
             "maxAveResidual" in self.results
             and self.results["maxAveResidual"] > self.residual_limit
         ):
+            # Not converged, not a solution to start other cases from
+            snapshotPath = self.casePath / SNAPSHOT_FILE_NAME
+            if snapshotPath.is_file():
+                snapshotPath.unlink()
             return 1
 
         return self.results[self.optimization_target]
 
+    def telemetryRecord(self) -> dict:
+        """Time per phase of the collected case, a starRunner.telemetry record."""
+        phases = self.telemetry.toDict()
+        if self.job.runtime() is not None:
+            phases["star_run"] = {"wall": self.job.runtime(), "cpu": self.job.cpuTime}
+        return {
+            "case": self.caseName,
+            "status": self.data_to_file["status"],
+            "attempts": self.job.attempt,
+            "nCPUs": self.nCPUs,
+            "objective": self.results.get(self.optimization_target),
+            "star_peak_rss_mb": self.data_to_file["peak_rss_mb"],
+            "phases": phases,
+        }
+
+    def updateBestObjective(self, bestObjective):
+        """
+        A better design was found while the case runs: its solved sim is then
+        only kept if the case beats that one too (imageExport = "best"). Not
+        seen by a case running in scratch, which has a copy of its options.
+        """
+        self.bestObjective = bestObjective
+        if self.caseOptions.get("keep_solution") != "true" or not np.isfinite(
+            bestObjective
+        ):
+            return
+        self.caseOptions["keep_solution_below"] = bestObjective
+        self.__writeCaseOptions(self.caseOptions, self.casePath)
+
+    def exportImages(self, images="all"):
+        """
+        Render plots and scenes from the solved sim kept by post_star
+        (imageExport = "best"). Runs in the background, the process is returned
+        for the caller to reap (starRunner.image_export.BestImageExport).
+        """
+        solvedSimPath = self.casePath / (self.caseName + "_solved.sim")
+        if not solvedSimPath.is_file():
+            self.__print("No solved sim to export images from")
+            return None
+        if isinstance(images, str):
+            self.caseOptions["export_images"] = images
+        else:
+            self.caseOptions["export_images"] = ";".join(images)
+        self.__writeCaseOptions(self.caseOptions, self.casePath)
+
+        exportMacro = self.baseGeometryDict["exportImagesMacro"]
+        classpathArgs = []
+        if self.macroBundle is not None:
+            exportMacro = self.macroBundle.getMacro(exportMacro)
+            classpathArgs = ["-classpath", str(self.macroBundle.bundlePath)]
+        # No shell, paths with spaces or shell characters stay one argument
+        command = shlex.split(self.STARCCMPath, posix=os.name != "nt")
+        command += classpathArgs
+        command += ["-load", str(solvedSimPath), "-batch", str(exportMacro)]
+        self.__print("Exporting images...")
+        with open(self.casePath / "CFD_export_out.txt", "w") as logFile:
+            return subprocess.Popen(
+                command,
+                stdout=logFile,
+                stderr=subprocess.STDOUT,
+                cwd=self.casePath,
+            )
+
+    def discardSolution(self):
+        """Remove the solved sim kept by post_star once no images are wanted from it."""
+        solvedSimPath = self.casePath / (self.caseName + "_solved.sim")
+        if solvedSimPath.is_file():
+            solvedSimPath.unlink()
+
     def __runCase(self):
+        self.submitCase()
+        if self.starSession is None:
+            self.executor.wait(self.job)
+
+    def buildJob(self) -> CaseJob:
+        """The STAR command of the prepared case, for running it outside submitCase."""
         self.logFilePath = self.casePath / "CFD_out.txt"
         self.logErrorFilePath = self.casePath / "CFD_err.txt"
-        self.f1 = open(self.logFilePath, "w")
-        self.f2 = open(self.logErrorFilePath, "w")
+        classpathArgs = []
+        if self.macroBundle is not None:
+            self.batchCommands = [
+                self.macroBundle.getMacro(command) for command in self.batchCommands
+            ]
+            classpathArgs = ["-classpath", str(self.macroBundle.bundlePath)]
         self.batchCommands = [str(command) for command in self.batchCommands]
+
+        # No shell, the executable may still carry arguments (e.g. a wrapper)
+        command = shlex.split(self.STARCCMPath, posix=os.name != "nt")
+        batchArgs = ["-load", str(self.simFilePath), "-batch", ",".join(self.batchCommands)]
         if os.name == "nt":
-            self.starRunCommand = f"{self.STARCCMPath} -np {self.nCPUs} -load {self.simFilePath} -batch {",".join(self.batchCommands)}"
+            command += ["-np", str(self.nCPUs)] + classpathArgs + batchArgs
         elif os.name == "posix":
-            self.starRunCommand = f"{self.STARCCMPath} -load {self.simFilePath} -batch {",".join(self.batchCommands)} -np {self.nCPUs}"
+            command += classpathArgs + batchArgs + ["-np", str(self.nCPUs)]
         else:
             print("os.name not recognized as linux")
+        if self.logMaxBytes is not None and self.starSession is None:
+            command = self.__logCommand() + command
+        if self.scratchPath is not None and self.starSession is None:
+            command = self.__scratchCommand() + command
+        self.starRunCommand = command
+
+        return CaseJob(
+            self.caseName,
+            command,
+            self.casePath,
+            self.logFilePath,
+            self.logErrorFilePath,
+            nCPUs=self.nCPUs,
+            env=self.jobEnv,
+        )
+
+    def __logCommand(self) -> list:
+        command = [
+            sys.executable,
+            str(Path(__file__).parent / "starRunner" / "case_log.py"),
+            "--log",
+            str(Path(self.logFilePath).resolve()),
+            "--maxBytes",
+            str(self.logMaxBytes),
+        ]
+        if self.logBackupCount is not None:
+            command += ["--backupCount", str(self.logBackupCount)]
+        return command + ["--"]
+
+    def __scratchCommand(self) -> list:
+        outputs = list(self.scratchOutputs)
+        if self.caseOptions.get("save_snapshot") == "true":
+            outputs.append(SNAPSHOT_FILE_NAME)
+        if self.caseOptions.get("save_mesh") == "true":
+            outputs.append("*" + MESHED_SIM_SUFFIX)
+        if self.caseOptions.get("save_base") == "true":
+            outputs.append("*" + BASE_SIM_SUFFIX)
+        if self.caseOptions.get("keep_solution") == "true":
+            outputs.append("*_solved.sim")
+        if self.caseOptions.get("export_images", "none") != "none":
+            outputs.append("*.png")
+        command = [
+            sys.executable,
+            str(Path(__file__).parent / "starRunner" / "scratch.py"),
+            "--case",
+            str(self.casePath),
+            "--scratch",
+            str(self.scratchPath),
+        ]
+        for pattern in outputs:
+            command += ["--sync", pattern]
+        return command + ["--"]
+
+    def __runSessionCase(self, job: CaseJob):
+        job.startTime = time.time()
+        job.status = "running"
+        with open(job.stdoutPath, "w") as f1, open(job.stderrPath, "w") as f2:
+            job.returncode = self.starSession.runMacros(
+                self.batchCommands, self.casePath, f1, f2
+            )
+        job.endTime = time.time()
+        job.status = "done" if job.returncode == 0 else "failed"
+        # Models renamed by the case, their bodies still back the parts
+        keptModels, _, _ = supersedeCadModels(
+            self.cadModelsBefore,
+            self.modelName,
+            self.caseName,
+            self.changedSketches,
+            bound=False,
+        )
+        # The geometry in the server is only known if the case went through
+        if job.returncode != 0:
+            self.starSession.geometryPath = None
+            self.starSession.meshGeometryPath = None
+            # The next case rebuilds all sketches, after which all older models go
+            allSketches = self.geometry.geometry_storage.get_sketches()
+            keptModels[self.modelName] = set(allSketches)
+            self.starSession.cadModels = keptModels
+            return
+        if self.meshMorphing:
+            self.starSession.meshGeometryPath = self.geometryPath
+        # A morphed mesh leaves the parts of the previous design in place
+        if readMorphStatus(self.casePath).get("mesh_update") != "morph":
+            self.starSession.geometryPath = self.geometryPath
+            self.starSession.cadModels = self.cadModels
+        else:
+            self.starSession.cadModels = keptModels
 
-        proc = subprocess.Popen(
-            self.starRunCommand,
-            stdout=self.f1,
-            stderr=self.f2,
-            shell=True,
-            cwd=self.casePath,
+    def __setMacroPaths(self):
+        # The static macros
+        self.baseGeometryDict["replaceGeometryMacro"] = str(
+            self.refFilesPath / "replace_geometry.java"
         )
-        proc.wait()
-        proc.terminate()
+        self.baseGeometryDict["starPostMacro"] = str(
+            self.refFilesPath / "post_star.java"
+        )
+        self.baseGeometryDict["starRunMacro"] = str(self.refFilesPath / "run_star.java")
+        self.baseGeometryDict["loadDesignMacro"] = str(
+            self.refFilesPath / "load_design.java"
+        )
+        self.baseGeometryDict["exportImagesMacro"] = str(
+            self.refFilesPath / "export_images.java"
+        )
+        self.baseGeometryDict["warmStartMacro"] = str(
+            self.refFilesPath / "warm_start.java"
+        )
+
+    def __setDesignVariables(self, designVariablesList: list):
+        var_names = [
+            "xMidFactor",
+            "rMidFactor",
+            "alpha",
+            "lambda1",
+            "lambda2",
+            "lambda3",
+            "lambda4",
+            "lambda5",
+            "lambda6",
+            "lambda7",
+            "lambda8",
+            "AR",
+        ]
+        self.optimization_parameters = {}
+        for key, value in zip(var_names, designVariablesList):
+            self.optimization_parameters[key] = value
+            self.baseGeometryDict[key] = value
 
-        self.f1.close()
-        self.f2.close()
+    def __prepareMorph(self):
+        """
+        Writes the displacements and sets the morph options if the new design is
+        close enough to a mesh. Returns the sim to load outside a server session.
+        """
+        geometry = self.geometry.geometry_storage
+        morphSimPath = None
+        if self.starSession is not None:
+            if self.starSession.meshGeometryPath is None:
+                self.__print("No mesh in the server to morph, remeshing")
+                return None
+            displacements = geometry.displacements(
+                GeometryStorage.load(self.starSession.meshGeometryPath)
+            )
+            referenceName = "the server mesh"
+        else:
+            reference = findMorphReference(
+                self.dataPath, geometry, excludeCase=self.caseName
+            )
+            if reference is None:
+                self.__print("No saved mesh to morph, remeshing")
+                return None
+            referencePath, displacements, _ = reference
+            morphSimPath = referencePath / (referencePath.name + MESHED_SIM_SUFFIX)
+            referenceName = referencePath.name
+        if displacements is None:
+            self.__print("Curves do not match the mesh, remeshing")
+            return None
+
+        distance = maxDisplacement(displacements)
+        if distance > self.morphMaxDisplacement:
+            self.__print(
+                f"Displacement {distance:.2e} m above {self.morphMaxDisplacement:.2e} m, remeshing"
+            )
+            return None
+        self.__print(f"Morphing {referenceName} (max displacement {distance:.2e} m)")
+        self.caseOptions["morph_mesh"] = str(
+            writeDisplacements(self.casePath, displacements)
+        )
+        self.caseOptions["morph_min_quality"] = self.morphMinCellQuality
+        self.caseOptions["morph_max_skewness"] = self.morphMaxSkewness
+        return morphSimPath
 
     def __generateVariableMacro(self, starInputDict: dict, path: Path) -> Path:
         macroName = "update_variables"
@@ -218,6 +778,17 @@ class StarManager:
 
         return macroPath
 
+    def __writeCaseOptions(self, caseOptions: dict, path: Path) -> Path:
+        # Read by the static macros in refFiles, one "key, value" pair per line
+        optionsPath = path / "case_options.csv"
+        # Replaced in one step, post_star may read it while it is updated
+        tmpPath = path / "case_options.csv.tmp"
+        with open(tmpPath, "w") as optionsFile:
+            for key, value in caseOptions.items():
+                optionsFile.write(f"{key}, {value}\n")
+        os.replace(tmpPath, optionsPath)
+        return optionsPath
+
     def __dictifyResults(self, path):
         results_dict = {}
         try:
@@ -234,7 +805,7 @@ class StarManager:
                         row.append("")
 
                     key, value, unit = row
-                    results_dict[key] = self.__convertValue(value),
+                    results_dict[key] = self.__convertValue(value)
                     
         except:
             return {}
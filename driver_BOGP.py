@@ -9,9 +9,13 @@
 
 # %% libraries
 import os
+import json
 import logging
+import subprocess
 import pathlib
+import time
 import numpy as np
+import pandas as pd
 
 # %% Helper functions
 def get_current_iteration(filepath):
@@ -30,6 +34,44 @@ def get_current_iteration(filepath):
 
     return 1  # No non-empty line found
 
+
+def get_median_runtime(databasePath):
+    # Median CFD runtime (s) of the recorded cases, 0 if none
+    if not os.path.isfile(databasePath):
+        return 0.0
+    database = pd.read_csv(databasePath)
+    if "runtime" not in database or database["runtime"].isna().all():
+        return 0.0
+    return float(database["runtime"].median())
+
+def recover_journal(journalState, path2gpList):
+    """
+    Add the samples told in the optimizer journal but missing from gpList.dat,
+    and return the best sample so far as (minInd, minR, minQ).
+    """
+    from gpOptim import gpOpt_TBL as X
+
+    xList, yList = X.read_available_GPsamples(path2gpList, X.nPar)
+    told = list(journalState.told.values())
+    nWritten = len(yList) - journalState.baseline
+    if nWritten < len(told):
+        missing = told[nWritten:]
+        xList = np.vstack([xList, np.array([tell["x"] for tell in missing])])
+        yList = np.append(yList, [tell["y"] for tell in missing])
+        X.write_GPsamples(path2gpList, xList, yList)
+        logger.info("%d samples restored to %s from the journal" % (len(missing), path2gpList))
+
+    minInd, minR, minQ = 0, np.inf, [np.inf, np.inf]
+    best = journalState.best()
+    if best is not None:
+        minInd, minR, minQ = best
+    # Samples from before the journal was started, numbered by their row
+    if journalState.baseline > 0:
+        k = int(np.argmin(yList[: journalState.baseline]))
+        if yList[k] < minR:
+            minInd, minR, minQ = k + 1, yList[k], list(xList[k])
+    return minInd, minR, minQ
+
 # %% logging
 # create logger
 logger = logging.getLogger("Driver")
@@ -59,6 +101,11 @@ PATH2GPLIST = current_dir / "gpOptim/workDir/gpList.dat"
 REFFILES_PATH = current_dir / "refFiles"
 CFD_PATH = current_dir / "cfd"
 CFD_DATABASE_PATH = CFD_PATH / "database.csv"
+MACRO_BUNDLE_PATH = CFD_PATH / "macros"
+SESSION_PATH = CFD_PATH / "session"
+QUEUE_PATH = CFD_PATH / "queue"
+JOURNAL_PATH = CFD_PATH / "journal.jsonl"
+TELEMETRY_PATH = CFD_PATH / "telemetry.jsonl"
 
 PATH2FIGS.mkdir(parents=True, exist_ok=True)
 PATH2GPLIST.parent.mkdir(parents=True, exist_ok=True)
@@ -68,6 +115,41 @@ CFD_PATH.mkdir(parents=True, exist_ok=True)
 iStart = get_current_iteration(PATH2GPLIST)  # Starting iteration
 iEnd = 500  # < 100
 # assert iEnd < 100
+useMacroBundle = True  # compile the static macros once instead of on every launch (needs javac either way)
+useStarSession = False  # one STAR-CCM+ server reused for all cases
+imageExport = "best"  # "none", "all", list of plot/scene names or "best" (new-best designs only)
+executorType = "local"  # "local" process pool, "batch" scheduler (Slurm by default)
+# or "queue": designs are put in QUEUE_PATH for workers started on any node with
+#   python -m starRunner.work_queue worker
+nConcurrentCases = 1  # cases in flight, pending ones are fantasized in nextGPsample
+nCPUsPerCase = 2  # -np of each case
+# Core split measured with python -m starRunner.calibration, overrides the two above
+CALIBRATION_PATH = CFD_PATH / "calibration.json"
+if CALIBRATION_PATH.is_file():
+    with open(CALIBRATION_PATH) as calibrationFile:
+        calibration = json.load(calibrationFile)
+    nCPUsPerCase = calibration["nCPUs"]
+    nConcurrentCases = calibration["nConcurrentCases"]
+usePipeline = True  # prepare the next case while the running ones are in STAR-CCM+
+caseWallClockLimit = 12 * 3600  # s, a case running longer is stopped (None: no limit)
+caseInactivityLimit = 1800  # s without log output before a case counts as hung
+caseMaxRetries = 2  # retries of hung cases and license/transient errors, with backoff
+useMemoryScheduling = True  # start a case only if its estimated peak memory is free
+defaultCaseMemory = 8 * 1024**3  # bytes, estimate until peak memory has been recorded
+initialDesign = "maximin"  # space-filling first batch: "sobol", "lhs", "maximin" or None (random)
+nInitialDesign = 16  # samples of the initial design, all submitted at once before BO starts
+initialDesignSeed = 0  # a restarted campaign regenerates the same design
+acquisitionType = "EI"  # "EI" or "EIperSecond" (EI per predicted CFD runtime)
+timeBudget = None  # s of wall time, no case is started that would not finish in it
+useWarmStart = False  # initialize cases from the solution of the nearest converged design
+useMeshMorphing = False  # morph a previous mesh for small design changes instead of remeshing
+morphMaxDisplacement = 2e-3  # m, larger wall displacements are remeshed
+retentionTopK = 10  # best designs whose case directories are kept in full (None: keep all)
+retentionRecent = 20  # latest cases kept in full, the others are compressed and pruned
+simFileStrategy = "auto"  # .sim per case: "auto" (reflink, else load), "reflink", "hardlink", "load" or "copy"
+logMaxBytes = 50 * 1024**2  # CFD_out.txt is gzipped in parts of this size, monitor lines indexed (None: as is)
+scratchPath = None  # node-local dir to run cases in, e.g. "$TMPDIR" or "/dev/shm" (None: in cfd/)
+useFakeStar = False  # analytic stand-in instead of STAR-CCM+ (starRunner/fake_starccm.py), for load tests
 
 
 # %% misc.
@@ -77,6 +159,17 @@ minInd, minR, minQ = 0, np.inf, [np.inf, np.inf]
 if __name__ == "__main__":
     from gpOptim import gpOpt_TBL as X
     from case_config import StarManager
+    from starRunner.macro_bundle import STATIC_MACROS, MacroBundle
+    from starRunner.star_session import StarSession
+    from starRunner.executors import CaseJob, LocalPoolExecutor, BatchSchedulerExecutor
+    from starRunner.work_queue import WorkQueue, readJson
+    from starRunner.journal import OptimizerJournal
+    from starRunner.retention import RetentionPolicy
+    from starRunner.watchdog import Watchdog
+    from starRunner.memory_model import MemoryModel
+    from starRunner.fake_starccm import fakeCommand
+    from starRunner.telemetry import appendRecord
+    from starRunner.image_export import BestImageExport
 
     # initialiization
     # subprocess.call('clear')
@@ -85,35 +178,345 @@ if __name__ == "__main__":
     logger.info("pwd = %s" % current_dir)
     X.printSetting()
 
+    # The macros extend macro.CaseMacro, which STAR only finds compiled in the
+    # bundle; without useMacroBundle the bundle holds just that class
+    macroBundle = MacroBundle(
+        REFFILES_PATH,
+        MACRO_BUNDLE_PATH,
+        macroNames=STATIC_MACROS if useMacroBundle else [],
+    )
+    try:
+        macroBundle.build()
+    except (OSError, subprocess.CalledProcessError) as error:
+        if not useFakeStar:
+            raise RuntimeError("macro bundle not built, it needs javac: %s" % error)
+        logger.warning("macro bundle not built, the fake STAR runs without: %s" % error)
+        macroBundle = None
+
+    settings = StarManager()
+    settings.nCPUs = nCPUsPerCase
+    if useFakeStar:
+        settings.STARCCMPath = fakeCommand()
+    starSession = None
+    if useStarSession:
+        starSession = StarSession(
+            REFFILES_PATH / settings.baseCaseFileName,
+            SESSION_PATH,
+            STARCCMPath=settings.STARCCMPath,
+            nCPUs=settings.nCPUs,
+            simFileStrategy=simFileStrategy,
+            classpath=macroBundle.bundlePath if macroBundle is not None else None,
+        ).start()
+
+    if useStarSession:
+        # The session runs one case at a time
+        nConcurrentCases = 1
+    watchdog = Watchdog(
+        wallClockLimit=caseWallClockLimit,
+        inactivityLimit=caseInactivityLimit,
+        maxRetries=caseMaxRetries,
+    )
+    executor, queue = None, None
+    memoryModel = None
+    if useMemoryScheduling:
+        memoryModel = MemoryModel(CFD_DATABASE_PATH, defaultPeak=defaultCaseMemory)
+    if executorType == "queue":
+        queue = WorkQueue(QUEUE_PATH)
+        if imageExport == "best":
+            logger.warning("imageExport 'best' needs the case manager, not exported")
+    elif executorType == "batch":
+        # The scheduler admits the job with the memory it requests
+        executor = BatchSchedulerExecutor(watchdog=watchdog, memoryModel=memoryModel)
+    else:
+        executor = LocalPoolExecutor(
+            nConcurrentCases * settings.nCPUs, watchdog=watchdog, memoryModel=memoryModel
+        )
+
+    # Journal of asks and tells, a restarted driver continues where the last one
+    # stopped: gpList.dat and the best design are restored from it
+    journal = OptimizerJournal(
+        JOURNAL_PATH, baseline=len(X.read_available_GPsamples(PATH2GPLIST, X.nPar)[1])
+    )
+    journalState = journal.recover()
+    minInd, minR, minQ = recover_journal(journalState, PATH2GPLIST)
+    iStart = max(iStart, journalState.nextIndex())
+    if executor is not None:
+        # The pid or job id of every start, to reattach after a restart
+        executor.onStart = lambda job: journal.submit(
+            job.name,
+            command=job.command,
+            nCPUs=job.nCPUs,
+            pid=job.info.get("pid"),
+            jobId=job.info.get("jobId"),
+        )
+
+    retention = None
+    if retentionTopK is not None:
+        retention = RetentionPolicy(
+            CFD_PATH, topK=retentionTopK, keepRecent=retentionRecent
+        )
+    imageExports = BestImageExport() if imageExport == "best" else None
+
+    queueSettings = {
+        "imageExport": "none",
+        "nCPUs": nCPUsPerCase,
+        "warmStart": useWarmStart,
+        "meshMorphing": useMeshMorphing,
+        "morphMaxDisplacement": morphMaxDisplacement,
+        "simFileStrategy": simFileStrategy,
+        "scratchPath": scratchPath,
+        "logMaxBytes": logMaxBytes,
+        "STARCCMPath": settings.STARCCMPath,
+        "designSpace": [list(bound) for bound in X.qBound],
+    }
+
+    def newManager():
+        manager = StarManager()
+        manager.nCPUs = nCPUsPerCase
+        manager.macroBundle = macroBundle
+        manager.imageExport = imageExport
+        manager.bestObjective = minR
+        manager.warmStart = useWarmStart
+        manager.designSpace = X.qBound
+        manager.meshMorphing = useMeshMorphing
+        manager.morphMaxDisplacement = morphMaxDisplacement
+        manager.simFileStrategy = simFileStrategy
+        manager.scratchPath = scratchPath
+        manager.logMaxBytes = logMaxBytes
+        manager.STARCCMPath = settings.STARCCMPath
+        manager.starSession = starSession
+        manager.executor = executor
+        return manager
+
     # clean remaining data
     # TODO: if database > 0 (exists?). Continue or break or whatever.
     # MAIN LOOP
-    for i in range(iStart, iEnd + 1):
+    def prepareNextCase(i):
         logger.info("############### START LOOP i = %d #################" % i)
-        # 1. Generate a sample from the parameters space
+        # 1. Generate a sample from the parameters space, the cases in flight are
+        # fantasized
+        pendingX = [newQ for (_, newQ, _) in inFlight.values()]
         newQ = X.nextGPsample(
-            PATH2GPLIST
+            PATH2GPLIST,
+            pendingX=pendingX,
+            acquisitionType_=acquisitionType,
+            path2database=CFD_DATABASE_PATH,
         )  # "gpOptim/workDir/gpList.dat") # path2gpList
+        journal.ask(str(f"case_{i}"), i, newQ)
 
-        manager = StarManager()
-        obj = manager.runSingleCase(str(f"case_{i}"), newQ, CFD_PATH, REFFILES_PATH)
+        if queue is not None:
+            return None, newQ, i
+        manager = newManager()
+        manager.telemetry.addTimings(X.last_timings)
+        manager.prepareCase(str(f"case_{i}"), newQ, CFD_PATH, REFFILES_PATH)
+        return manager, newQ, i
+
+    def resumeCase(caseName, iCase, newQ):
+        # A case asked before the restart: reattach to it if it still runs,
+        # harvest it if it finished, and only run it again if it was lost
+        if queue is not None:
+            consumedPath = queue.consumedPath / f"{caseName}.json"
+            if consumedPath.is_file():
+                recovered[caseName] = readJson(consumedPath)["objective"]
+                logger.info("%s harvested from the queue" % caseName)
+            elif (
+                caseName not in queue.inFlight()
+                and not (queue.resultsPath / f"{caseName}.json").is_file()
+            ):
+                queue.put(caseName, newQ, settings=queueSettings)
+                logger.info("%s was lost, queued again" % caseName)
+            return None, newQ, iCase
+
+        manager = newManager()
+        casePath = CFD_PATH / caseName
+        submitted = journalState.submitted.get(caseName)
+        job = None
+        if submitted is not None and executor is not None:
+            job = CaseJob(
+                caseName,
+                submitted["command"],
+                casePath,
+                casePath / "CFD_out.txt",
+                casePath / "CFD_err.txt",
+                nCPUs=submitted["nCPUs"],
+                startTime=submitted["time"],
+                info={
+                    key: submitted[key]
+                    for key in ("pid", "jobId", "host")
+                    if submitted.get(key) is not None
+                },
+            )
+        if job is not None and executor.isAlive(job):
+            manager.attachCase(caseName, newQ, CFD_PATH, REFFILES_PATH, job)
+            executor.adopt(job)
+        elif (casePath / "results.csv").is_file():
+            manager.attachCase(caseName, newQ, CFD_PATH, REFFILES_PATH)
+            logger.info("%s finished before the restart, harvested" % caseName)
+        else:
+            logger.info("%s was lost, running it again" % caseName)
+            manager.prepareCase(caseName, newQ, CFD_PATH, REFFILES_PATH)
+            manager.submitCase()
+        return manager, newQ, iCase
+
+    # The session runs its case inside submitCase and the queue workers prepare
+    # their own cases, so there is nothing to overlap in those modes
+    usePipeline = usePipeline and starSession is None and queue is None
 
-        # update minInd
-        if obj < minR:
-            minR = obj
-            minInd = i
-            minQ = newQ
+    campaignStartTime = time.time()
 
-        # 5. Post-process optimization
-        isConv = X.BO_update_convergence(
-            newQ, obj, path2gpList=PATH2GPLIST, path2figs=PATH2FIGS
+    def budgetLeft():
+        # Would a new case, of the median runtime so far, finish within timeBudget?
+        if timeBudget is None:
+            return True
+        elapsed = time.time() - campaignStartTime
+        return elapsed + get_median_runtime(CFD_DATABASE_PATH) <= timeBudget
+
+    inFlight = {}  # case name -> (manager, newQ, i)
+    recovered = {}  # case name -> objective consumed from the queue before the restart
+    for caseName, ask in journalState.pending().items():
+        inFlight[caseName] = resumeCase(caseName, ask["i"], ask["x"])
+    if journalState.told or inFlight:
+        logger.info(
+            "resumed after %d told cases, %d in flight"
+            % (len(journalState.told), len(inFlight))
         )
-        #  os.chdir(current_dir)
+    if minR < np.inf:
+        logger.info("best so far: case_%d, R = %g" % (minInd, minR))
+    i = iStart
+
+    # Initial design: no sequential decisions needed, so the whole batch is
+    # submitted at once and BO only starts once it has been evaluated. The cases
+    # of the design are the first nInitialDesign samples of the campaign.
+    nAsked = journalState.baseline + len(journalState.asked)
+    askOrder = {
+        caseName: journalState.baseline + k for k, caseName in enumerate(journalState.asked)
+    }
+    initialCases = {
+        caseName for caseName in inFlight if askOrder[caseName] < nInitialDesign
+    }
+    if initialDesign is not None and nAsked < nInitialDesign and i <= iEnd:
+        designQ = X.initial_design(
+            nInitialDesign,
+            initialDesign,
+            screen=lambda q: StarManager().checkGeometry(q),
+            seed=initialDesignSeed,
+        )[nAsked - nInitialDesign :]
+        designQ = designQ[: iEnd - i + 1]
+        logger.info("submitting %d cases of the initial design" % len(designQ))
+        for newQ in designQ:
+            caseName = str(f"case_{i}")
+            journal.ask(caseName, i, newQ)
+            manager = None
+            if queue is not None:
+                queue.put(caseName, newQ, settings=queueSettings)
+            else:
+                manager = newManager()
+                manager.prepareCase(caseName, newQ, CFD_PATH, REFFILES_PATH)
+                manager.submitCase()
+            inFlight[caseName] = (manager, newQ, i)
+            initialCases.add(caseName)
+            i += 1
+
+    def initialDesignRunning():
+        return any(caseName in inFlight for caseName in initialCases)
+
+    prepared = None  # next case, prepared while the slots were busy
+    isConv = False
+    while not isConv and ((budgetLeft() and (i <= iEnd or prepared)) or inFlight):
+        # Fill the free slots with new samples
+        while (
+            budgetLeft()
+            and (i <= iEnd or prepared)
+            and len(inFlight) < nConcurrentCases
+            and not initialDesignRunning()
+        ):
+            if prepared is not None:
+                manager, newQ, iCase = prepared
+                prepared = None
+            else:
+                manager, newQ, iCase = prepareNextCase(i)
+                i += 1
+            caseName = str(f"case_{iCase}")
+            if queue is not None:
+                queue.put(caseName, newQ, settings=queueSettings)
+            else:
+                manager.submitCase()
+            inFlight[caseName] = (manager, newQ, iCase)
+
+        # Pipeline: prepare the next case while the running ones are busy
+        if (
+            usePipeline
+            and prepared is None
+            and i <= iEnd
+            and budgetLeft()
+            and not initialDesignRunning()
+        ):
+            prepared = prepareNextCase(i)
+            i += 1
+
+        # Wait for cases to finish
+        objectives = dict(recovered)
+        recovered.clear()
+        if queue is not None and not objectives:
+            for result in queue.waitResults():
+                if result["caseName"] in inFlight:
+                    objectives[result["caseName"]] = result["objective"]
+        elif queue is None:
+            if not any(manager.job.isFinished() for manager, _, _ in inFlight.values()):
+                executor.waitAny()
+            for caseName, (manager, _, _) in inFlight.items():
+                if manager.job.isFinished():
+                    objectives[caseName] = manager.collectResults()
+        for caseName, obj in objectives.items():
+            manager, newQ, iCase = inFlight.pop(caseName)
+
+            # update minInd
+            if obj < minR:
+                minR = obj
+                minInd = iCase
+                minQ = newQ
+                if imageExports is not None and manager is not None:
+                    imageExports.submit(manager)
+                    # The cases in flight or prepared only keep a solution that beats it
+                    others = [other for other, _, _ in inFlight.values()]
+                    if prepared is not None:
+                        others.append(prepared[0])
+                    for other in others:
+                        other.updateBestObjective(minR)
+            elif imageExports is not None and manager is not None:
+                manager.discardSolution()
+
+            # 5. Post-process optimization, journaled first: gpList.dat can be
+            # rebuilt from the journal, not the other way round
+            journal.tell(caseName, iCase, newQ, obj)
+            isConv = X.BO_update_convergence(
+                newQ, obj, path2gpList=PATH2GPLIST, path2figs=PATH2FIGS
+            ) or isConv
+            # Time per phase of the case, the queue workers' cases are not timed
+            if manager is not None:
+                manager.telemetry.addTimings(X.last_timings)
+                appendRecord(TELEMETRY_PATH, manager.telemetryRecord())
+            # Prune the case directories in the background
+            if retention is not None:
+                retention.schedule(protected=inFlight)
+            #  os.chdir(current_dir)
+        if imageExports is not None:
+            imageExports.poll()
 
-        # 6. check convergence
-        if isConv:
-            break
+    # 6. check convergence: stop the cases still running
+    if prepared is not None:
+        logger.info("case_%d was prepared but not run" % prepared[2])
+    if executor is not None:
+        executor.shutdown()
+    if starSession is not None:
+        starSession.stop()
+    if retention is not None:
+        retention.wait()
+    if imageExports is not None:
+        imageExports.wait()
 
+    if not isConv and not budgetLeft():
+        logger.info("time budget of %.0f s used up" % timeBudget)
     logger.info("################### MAIN LOOP END ####################")
     logger.info("The iteration gave the smallest R: %d" % minInd)
     logger.info(f"Result: x1={minQ[0]}, x2={minQ[1]}, y={minR}")
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+###############################################################
+#      Bayesian Optimization based on Gaussian Processes
+#  asyncio variant of driver_BOGP.py: the cases run as asyncio
+#  subprocesses with streamed, rotating logs, and the GP refit
+#  and geometry generation of the next samples overlap with
+#  the cases that are running.
+###############################################################
+# Paths and settings are shared with driver_BOGP.py.
+
+# %% libraries
+import asyncio
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from driver_BOGP import (
+    logger,
+    current_dir,
+    PATH2FIGS,
+    PATH2GPLIST,
+    REFFILES_PATH,
+    CFD_PATH,
+    CFD_DATABASE_PATH,
+    MACRO_BUNDLE_PATH,
+    JOURNAL_PATH,
+    TELEMETRY_PATH,
+    iStart,
+    iEnd,
+    useMacroBundle,
+    imageExport,
+    nConcurrentCases,
+    nCPUsPerCase,
+    useMemoryScheduling,
+    defaultCaseMemory,
+    caseWallClockLimit,
+    caseInactivityLimit,
+    caseMaxRetries,
+    acquisitionType,
+    initialDesign,
+    nInitialDesign,
+    initialDesignSeed,
+    timeBudget,
+    useWarmStart,
+    useMeshMorphing,
+    morphMaxDisplacement,
+    simFileStrategy,
+    scratchPath,
+    useFakeStar,
+    retentionTopK,
+    retentionRecent,
+    get_median_runtime,
+    recover_journal,
+)
+
+# %% SETTINGS
+logMaxBytes = 50 * 1024**2  # size at which CFD_out.txt / CFD_err.txt are rotated
+logBackupCount = 3  # rotated log files kept per stream
+memoryRecheckInterval = 5  # s, how often a case waiting for memory is checked
+
+
+# %% MAIN
+async def main():
+    from gpOptim import gpOpt_TBL as X
+    from case_config import StarManager
+    from starRunner.macro_bundle import STATIC_MACROS, MacroBundle
+    from starRunner.async_runner import runCaseJob
+    from starRunner.watchdog import Watchdog
+    from starRunner.journal import OptimizerJournal
+    from starRunner.retention import RetentionPolicy
+    from starRunner.fake_starccm import fakeCommand
+    from starRunner.telemetry import appendRecord
+    from starRunner.image_export import BestImageExport
+    from starRunner.memory_model import MemoryModel
+
+    logger.info("process id = %d" % os.getpid())
+    logger.info("pwd = %s" % current_dir)
+    X.printSetting()
+
+    # The macros extend macro.CaseMacro, which STAR only finds compiled in the
+    # bundle; without useMacroBundle the bundle holds just that class
+    macroBundle = MacroBundle(
+        REFFILES_PATH,
+        MACRO_BUNDLE_PATH,
+        macroNames=STATIC_MACROS if useMacroBundle else [],
+    )
+    try:
+        macroBundle.build()
+    except (OSError, subprocess.CalledProcessError) as error:
+        if not useFakeStar:
+            raise RuntimeError("macro bundle not built, it needs javac: %s" % error)
+        logger.warning("macro bundle not built, the fake STAR runs without: %s" % error)
+        macroBundle = None
+
+    watchdog = Watchdog(
+        wallClockLimit=caseWallClockLimit,
+        inactivityLimit=caseInactivityLimit,
+        maxRetries=caseMaxRetries,
+    )
+    loop = asyncio.get_running_loop()
+    # GP refits run in a process of their own, geometry generation and
+    # post-processing in the default thread pool
+    gpPool = ProcessPoolExecutor(max_workers=1)
+
+    campaignStartTime = time.time()
+
+    def budgetLeft():
+        if timeBudget is None:
+            return True
+        elapsed = time.time() - campaignStartTime
+        return elapsed + get_median_runtime(CFD_DATABASE_PATH) <= timeBudget
+
+    # Same journal as driver_BOGP.py. The cases run as children of this process,
+    # so after a restart finished cases are harvested and the others run again
+    journal = OptimizerJournal(
+        JOURNAL_PATH, baseline=len(X.read_available_GPsamples(PATH2GPLIST, X.nPar)[1])
+    )
+    journalState = journal.recover()
+    minInd, minR, minQ = recover_journal(journalState, PATH2GPLIST)
+    resumed = list(journalState.pending().values())
+
+    retention = None
+    if retentionTopK is not None:
+        retention = RetentionPolicy(
+            CFD_PATH, topK=retentionTopK, keepRecent=retentionRecent
+        )
+    imageExports = BestImageExport() if imageExport == "best" else None
+    memoryModel = None
+    if useMemoryScheduling:
+        memoryModel = MemoryModel(CFD_DATABASE_PATH, defaultPeak=defaultCaseMemory)
+
+    def newManager():
+        manager = StarManager()
+        manager.nCPUs = nCPUsPerCase
+        manager.macroBundle = macroBundle
+        manager.imageExport = imageExport
+        manager.bestObjective = minR
+        manager.warmStart = useWarmStart
+        manager.designSpace = X.qBound
+        manager.meshMorphing = useMeshMorphing
+        manager.morphMaxDisplacement = morphMaxDisplacement
+        manager.simFileStrategy = simFileStrategy
+        manager.scratchPath = scratchPath
+        # runCaseJob streams the logs itself, no case_log.py wrapper
+        manager.logMaxBytes = None
+        if useFakeStar:
+            manager.STARCCMPath = fakeCommand()
+        return manager
+
+    def fitsInMemory(manager):
+        # Same admission as LocalPoolExecutor; the first case always starts
+        if memoryModel is None or not running:
+            return True
+        runningJobs = [
+            other.job
+            for other, _, _ in running.values()
+            if other.job.status not in ("done", "failed")
+        ]
+        return memoryModel.fits(manager.job, runningJobs)
+
+    def startCase(manager):
+        return asyncio.create_task(
+            runCaseJob(
+                manager.job,
+                watchdog=watchdog,
+                maxBytes=logMaxBytes,
+                backupCount=logBackupCount,
+            )
+        )
+
+    async def finishedCase(manager):
+        # The job is already finished, the task only hands the manager over
+        return manager.job
+
+    running = {}  # asyncio.Task -> (manager, newQ, i)
+    held = []  # (manager, newQ, i) prepared, waiting for memory
+    for ask in resumed:
+        caseName = str(f"case_{ask['i']}")
+        manager = newManager()
+        if (CFD_PATH / caseName / "results.csv").is_file():
+            manager.attachCase(caseName, ask["x"], CFD_PATH, REFFILES_PATH)
+            logger.info("%s finished before the restart, harvested" % caseName)
+            task = asyncio.create_task(finishedCase(manager))
+        else:
+            logger.info("%s was lost, running it again" % caseName)
+            await loop.run_in_executor(
+                None, manager.prepareCase, caseName, ask["x"], CFD_PATH, REFFILES_PATH
+            )
+            manager.job = manager.buildJob()
+            held.append((manager, ask["x"], ask["i"]))
+            continue
+        running[task] = (manager, ask["x"], ask["i"])
+
+    i = max(iStart, journalState.nextIndex())
+
+    # Initial design, taken before any BO sample: its cases have no process
+    # pool to wait in, so they fill the nConcurrentCases slots as they free up
+    nAsked = journalState.baseline + len(journalState.asked)
+    designQ = []
+    if initialDesign is not None and nAsked < nInitialDesign:
+        designQ = list(
+            await loop.run_in_executor(
+                None,
+                lambda: X.initial_design(
+                    nInitialDesign,
+                    initialDesign,
+                    screen=lambda q: StarManager().checkGeometry(q),
+                    seed=initialDesignSeed,
+                ),
+            )
+        )[nAsked - nInitialDesign :]
+    initialCases = {
+        str(f"case_{ask['i']}")
+        for k, ask in enumerate(journalState.asked.values())
+        if journalState.baseline + k < nInitialDesign
+    }
+
+    def initialDesignRunning():
+        return any(manager.caseName in initialCases for manager, _, _ in running.values())
+
+    isConv = False
+    try:
+        while not isConv and ((i <= iEnd and budgetLeft()) or running or held):
+            # Start the prepared cases as memory frees up
+            while held and fitsInMemory(held[0][0]):
+                manager, newQ, iCase = held.pop(0)
+                running[startCase(manager)] = (manager, newQ, iCase)
+
+            # Fill the free slots, the running cases go on meanwhile
+            while (
+                not held
+                and i <= iEnd
+                and budgetLeft()
+                and len(running) < nConcurrentCases
+                and (designQ or not initialDesignRunning())
+            ):
+                logger.info("############### START LOOP i = %d #################" % i)
+                gpTimings = {}
+                if designQ:
+                    newQ = designQ.pop(0)
+                    initialCases.add(str(f"case_{i}"))
+                else:
+                    pendingX = [newQ for (_, newQ, _) in running.values()]
+                    newQ, gpTimings = await loop.run_in_executor(
+                        gpPool,
+                        X.nextGPsample_timed,
+                        PATH2GPLIST,
+                        X.kernelType,
+                        pendingX,
+                        acquisitionType,
+                        CFD_DATABASE_PATH,
+                    )
+                journal.ask(str(f"case_{i}"), i, newQ)
+
+                manager = newManager()
+                manager.telemetry.addTimings(gpTimings)
+                await loop.run_in_executor(
+                    None,
+                    manager.prepareCase,
+                    str(f"case_{i}"),
+                    newQ,
+                    CFD_PATH,
+                    REFFILES_PATH,
+                )
+                manager.job = manager.buildJob()
+                if fitsInMemory(manager):
+                    running[startCase(manager)] = (manager, newQ, i)
+                else:
+                    held.append((manager, newQ, i))
+                i += 1
+
+            if not running:
+                continue
+            # A held case is checked again after a while, the free memory changes
+            finished, _ = await asyncio.wait(
+                running,
+                timeout=memoryRecheckInterval if held else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in finished:
+                manager, newQ, iCase = running.pop(task)
+                logger.info(
+                    "case_%d finished with code %d" % (iCase, manager.job.returncode)
+                )
+                obj = await loop.run_in_executor(None, manager.collectResults)
+
+                # update minInd
+                if obj < minR:
+                    minR = obj
+                    minInd = iCase
+                    minQ = newQ
+                    if imageExports is not None:
+                        imageExports.submit(manager)
+                        # The running cases only keep a solution that beats it
+                        for other, _, _ in running.values():
+                            other.updateBestObjective(minR)
+                elif imageExports is not None:
+                    manager.discardSolution()
+
+                # Post-process optimization, journaled first
+                journal.tell(manager.caseName, iCase, newQ, obj)
+                isConv = (
+                    await loop.run_in_executor(
+                        None,
+                        lambda: X.BO_update_convergence(
+                            newQ, obj, path2gpList=PATH2GPLIST, path2figs=PATH2FIGS
+                        ),
+                    )
+                    or isConv
+                )
+                manager.telemetry.addTimings(X.last_timings)
+                appendRecord(TELEMETRY_PATH, manager.telemetryRecord())
+                # Prune the case directories in the background
+                if retention is not None:
+                    retention.schedule(
+                        protected=[m.caseName for m, _, _ in [*running.values(), *held]]
+                    )
+            if imageExports is not None:
+                imageExports.poll()
+    finally:
+        # Converged or interrupted: stop the cases still running
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        gpPool.shutdown()
+        if retention is not None:
+            retention.wait()
+        if imageExports is not None:
+            imageExports.wait()
+
+    logger.info("################### MAIN LOOP END ####################")
+    logger.info("The iteration gave the smallest R: %d" % minInd)
+    logger.info(f"Result: x1={minQ[0]}, x2={minQ[1]}, y={minR}")
+    logger.info("FINISHED")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -46,52 +46,49 @@ def bezierCurve(bezierPoints, numPoints=100, selfIntersectFlag=False):
 
 
 def checkIfCurveSelfIntersects(curve):
-    np.seterr(divide="ignore")
-
-    foundIntersection = False
+    # Every pair of distinct segments at once
+    # https://stackoverflow.com/questions/563198/how-do-you-detect-where-two-line-segments-intersect
+    p, r = curve[:-1], np.diff(curve, axis=0)
+    t, u = segmentIntersections(p, r, p, r)
+    crossing = (t > 0) & (t < 1) & (u > 0) & (u < 1)
+    np.fill_diagonal(crossing, False)
+
+    foundIntersection = bool(np.any(crossing))
     intersection = None
-    for i in range(len(curve) - 1):  # loop through all curve segments, pick segment 1
-        # pick segment 1
-        p1 = curve[i, :]
-        p2 = curve[i + 1, :]
-
-        for j in range(
-            len(curve) - 1
-        ):  # loop through all curve segments, pick segment 2
-            if i != j:
-                # pick segment 2
-                p3 = curve[j, :]
-                p4 = curve[j + 1, :]
-
-                # check if intersect
-                # https://stackoverflow.com/questions/563198/how-do-you-detect-where-two-line-segments-intersect
-                r = p2 - p1
-                s = p4 - p3
-                p = p1
-                q = p3
-                t = np.cross((q - p), s) / np.cross(r, s)
-                u = np.cross((q - p), r) / np.cross(r, s)
-
-                if t > 0 and t < 1 and u > 0 and u < 1:
-                    intersection = p + t * r
-                    foundIntersection = True
-                    print("\t\tCurve self-intersects!")
-                    break
-
-            if abs(i - j) == 1:
-                # neighbour segment, wont intersect except at ends of curves, so do nothing
-                pass
-            else:
-                # same segment as segment 1
-                pass
-
-        # break outer loop in case inner loops finds self-intersection
-        if foundIntersection:
-            break
+    if foundIntersection:
+        # First crossing in the order of the segments along the curve
+        i, j = np.argwhere(crossing)[0]
+        intersection = p[i] + t[i, j] * r[i]
+        print("\t\tCurve self-intersects!")
 
     return foundIntersection, intersection
 
 
+def segmentIntersections(p, r, q, s):
+    """
+    Parameters (t, u) of the crossing of segment i (p + t r) with segment j
+    (q + u s) for all pairs, inf or nan for parallel segments.
+    """
+    def cross(a, b):
+        return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+    p, r = p[:, None, :], r[:, None, :]
+    q, s = q[None, :, :], s[None, :, :]
+    rxs = cross(r, s)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = cross(q - p, s) / rxs
+        u = cross(q - p, r) / rxs
+    return t, u
+
+
+def curvesIntersect(curve1, curve2):
+    """True if a segment of curve1 crosses a segment of curve2 (end points excluded)."""
+    t, u = segmentIntersections(
+        curve1[:-1], np.diff(curve1, axis=0), curve2[:-1], np.diff(curve2, axis=0)
+    )
+    return bool(np.any((t > 0) & (t < 1) & (u > 0) & (u < 1)))
+
+
 class HEXTestrigDuctCurvedFinsGeometry:  # class definition containing the geometry for a duct in terms of bezier curves
     def __init__(self, baseGeometryDict):
         # Prepare geometry storage
@@ -313,24 +310,24 @@ class HEXTestrigDuctCurvedFinsGeometry:  # class definition containing the geome
         # self.P_12 = np.array([self.P_H[0] + baseGeometryDict['lambda15']*(self.P_D[0] - self.P_H[0]), 0.5*(self.P_H[1] + self.P_D[1]) + baseGeometryDict['lambda16']*self.P_D[1]])
 
         # Generate Bezier curves
-        self.C1, _, _ = bezierCurve(
+        self.C1, self._C1_selfIntersects, _ = bezierCurve(
             [self.P_A, self.P_1, self.P_8, self.P_E],
             selfIntersectFlag=True,
             numPoints=200,
         )
-        self.C2, _, _ = bezierCurve(
+        self.C2, self._C2_selfIntersects, _ = bezierCurve(
             [self.P_B, self.P_2, self.P_3, self.P_F],
             selfIntersectFlag=True,
             numPoints=200,
         )
         # self.C1, _, _ = bezierCurve([self.P_A, self.P_1, self.P_9, self.P_8, self.P_E], selfIntersectFlag=True, numPoints=200)
         # self.C2, _, _ = bezierCurve([self.P_B, self.P_2, self.P_10, self.P_3, self.P_F], selfIntersectFlag=True, numPoints=200)
-        self.C3, _, _ = bezierCurve(
+        self.C3, self._C3_selfIntersects, _ = bezierCurve(
             [self.P_G, self.P_4, self.P_5, self.P_C],
             selfIntersectFlag=True,
             numPoints=200,
         )
-        self.C4, _, _ = bezierCurve(
+        self.C4, self._C4_selfIntersects, _ = bezierCurve(
             [self.P_H, self.P_7, self.P_6, self.P_D],
             selfIntersectFlag=True,
             numPoints=200,
@@ -413,6 +410,19 @@ class HEXTestrigDuctCurvedFinsGeometry:  # class definition containing the geome
             self.P_L,
         ]
 
+    def infeasibility(self):
+        """Why the geometry cannot be meshed, None if it can."""
+        for name in ["C1", "C2", "C3", "C4"]:
+            if not np.all(np.isfinite(getattr(self, name))):
+                return f"{name} is not finite"
+            if getattr(self, f"_{name}_selfIntersects"):
+                return f"{name} self-intersects"
+        # Hub and tip walls of the inlet and outlet ducts must not cross
+        for name1, name2 in [("C1", "C2"), ("C3", "C4")]:
+            if curvesIntersect(getattr(self, name1), getattr(self, name2)):
+                return f"{name1} and {name2} intersect"
+        return None
+
     def plot(self, workingDir):
         # plot points
         plt.figure(figsize=(16, 9))
@@ -0,0 +1,385 @@
+###################################################
+# Benchmark of the BO-GP loop on analytic test
+#  functions, to compare optimizer changes
+###################################################
+#
+# nextGPsample and BO_update_convergence are run end to end, as the drivers run
+# them, on functions of known minimum:
+#   branin     2-D, on its usual domain
+#   hartmann6  6-D, on the unit cube
+#   ackley12   12-D, var_range mapped onto [-5, 10]^12
+#   levy12     12-D, var_range mapped onto [-10, 10]^12
+# Per iteration the best value, regret, the time spent fitting, optimizing the
+# acquisition, reading/writing gpList.dat and plotting, and the peak resident
+# memory are written to a csv; a json summary per run can be compared with the
+# one of an earlier version:
+#   python -m gpOptim.benchmark --problems branin ackley12 --seeds 0 1 2 \
+#       --out benchmark.csv --summary benchmark.json --compare baseline.json
+#
+import argparse
+import itertools
+import json
+import logging
+import math as mt
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gpOptim import gpOpt_TBL as X
+
+logger = logging.getLogger("Driver").getChild("gpOptim/benchmark.py")
+
+# Summary metrics compared against a baseline, larger is worse
+COMPARED_METRICS = [
+    "fit_time",
+    "acquisition_time",
+    "io_time",
+    "plot_time",
+    "iteration_time",
+    "peak_rss_mb",
+]
+
+
+# %% test functions
+def branin(x):
+    b, c, t = 5.1 / (4.0 * mt.pi**2), 5.0 / mt.pi, 1.0 / (8.0 * mt.pi)
+    return (x[1] - b * x[0] ** 2 + c * x[0] - 6.0) ** 2 + 10.0 * (1.0 - t) * np.cos(x[0]) + 10.0
+
+
+HARTMANN6_ALPHA = np.array([1.0, 1.2, 3.0, 3.2])
+HARTMANN6_A = np.array(
+    [
+        [10, 3, 17, 3.5, 1.7, 8],
+        [0.05, 10, 17, 0.1, 8, 14],
+        [3, 3.5, 1.7, 10, 17, 8],
+        [17, 8, 0.05, 10, 0.1, 14],
+    ]
+)
+HARTMANN6_P = 1e-4 * np.array(
+    [
+        [1312, 1696, 5569, 124, 8283, 5886],
+        [2329, 4135, 8307, 3736, 1004, 9991],
+        [2348, 1451, 3522, 2883, 3047, 6650],
+        [4047, 8828, 8732, 5743, 1091, 381],
+    ]
+)
+
+
+def hartmann6(x):
+    return -np.sum(
+        HARTMANN6_ALPHA * np.exp(-np.sum(HARTMANN6_A * (x - HARTMANN6_P) ** 2, axis=1))
+    )
+
+
+def ackley(z):
+    return (
+        -20.0 * np.exp(-0.2 * np.sqrt(np.mean(z**2)))
+        - np.exp(np.mean(np.cos(2.0 * mt.pi * z)))
+        + 20.0
+        + mt.e
+    )
+
+
+def levy(z):
+    w = 1.0 + (z - 1.0) / 4.0
+    return (
+        np.sin(mt.pi * w[0]) ** 2
+        + np.sum((w[:-1] - 1.0) ** 2 * (1.0 + 10.0 * np.sin(mt.pi * w[:-1] + 1.0) ** 2))
+        + (w[-1] - 1.0) ** 2 * (1.0 + np.sin(2.0 * mt.pi * w[-1]) ** 2)
+    )
+
+
+def scaled(function, domain, bounds):
+    """function on domain^d, evaluated on the design space bounds."""
+    bounds = np.array(bounds, dtype=float)
+
+    def scaledFunction(x):
+        unit = (np.asarray(x) - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0])
+        return function(domain[0] + (domain[1] - domain[0]) * unit)
+
+    return scaledFunction
+
+
+PROBLEMS = {
+    "branin": {"function": branin, "bounds": [[-5, 10], [0, 15]], "optimum": 0.397887},
+    "hartmann6": {"function": hartmann6, "bounds": [[0, 1]] * 6, "optimum": -3.32237},
+    "ackley12": {
+        "function": scaled(ackley, (-5, 10), X.var_range),
+        "bounds": X.var_range,
+        "optimum": 0.0,
+    },
+    "levy12": {
+        "function": scaled(levy, (-10, 10), X.var_range),
+        "bounds": X.var_range,
+        "optimum": 0.0,
+    },
+}
+
+
+# %% measurements
+def reset_peak_rss():
+    # Linux: restart the high-water mark of the resident memory
+    try:
+        with open("/proc/self/clear_refs", "w") as clearFile:
+            clearFile.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak resident memory since reset_peak_rss, or of the whole run off Linux."""
+    try:
+        with open("/proc/self/status") as statusFile:
+            for line in statusFile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return maxRSS / 1024**2 if sys.platform == "darwin" else maxRSS / 1024
+
+
+def wall_time(*phases):
+    return sum(X.last_timings.get(phase, (0.0, 0.0))[0] for phase in phases)
+
+
+@contextmanager
+def problem_space(bounds):
+    """The module settings of gpOpt_TBL switched to the design space bounds."""
+    names = ["nPar", "qBound", "var_names", "qMaxDist", "tol_d"]
+    saved = {name: getattr(X, name) for name in names}
+    X.qBound = [list(bound) for bound in bounds]
+    X.nPar = len(bounds)
+    if X.nPar != saved["nPar"]:
+        X.var_names = ["q%d" % (i + 1) for i in range(X.nPar)]
+    X.qMaxDist = np.linalg.norm([bound[1] - bound[0] for bound in bounds])
+    X.tol_d = saved["tol_d"] / saved["qMaxDist"] * X.qMaxDist
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(X, name, value)
+
+
+# %% benchmark
+def benchmark(problem, kernelType_="RBF", acquisitionType_="EI", nIterations=30, nInit=None, seed=0):
+    """
+    One campaign on PROBLEMS[problem]: nInit maximin samples (2 per dimension by
+    default), then nIterations BO samples. Returns one record per sample.
+    """
+    function, bounds = PROBLEMS[problem]["function"], PROBLEMS[problem]["bounds"]
+    optimum = PROBLEMS[problem]["optimum"]
+    nInit = 2 * len(bounds) if nInit is None else nInit
+    np.random.seed(seed)
+    records = []
+    with problem_space(bounds), tempfile.TemporaryDirectory() as workDir:
+        path2gpList = Path(workDir) / "gpList.dat"
+        path2figs = Path(workDir) / "figs"
+        path2figs.mkdir()
+        X.write_GPsamples(path2gpList, np.zeros((0, X.nPar)), np.zeros(0))
+
+        best = np.inf
+        design = X.initial_design(nInit, "maximin", qBound_=X.qBound, seed=seed)
+        for iteration in range(1, nInit + nIterations + 1):
+            reset_peak_rss()
+            startTime = time.perf_counter()
+            askTimings = {}
+            if iteration <= nInit:
+                xNext = design[iteration - 1]
+            else:
+                xNext = X.nextGPsample(path2gpList, kernelType_, acquisitionType_=acquisitionType_)
+                askTimings = dict(X.last_timings)
+            y = float(function(xNext))
+            X.BO_update_convergence(xNext, y, path2gpList=path2gpList, path2figs=path2figs)
+            iterationTime = time.perf_counter() - startTime
+            X.last_timings.update(askTimings)
+
+            best = min(best, y)
+            records.append(
+                {
+                    "iteration": iteration,
+                    "phase": "initial" if iteration <= nInit else "bo",
+                    "y": y,
+                    "best": best,
+                    "regret": best - optimum,
+                    "fit_time": wall_time("fit", "fit_runtime"),
+                    "acquisition_time": wall_time("acquisition"),
+                    "io_time": wall_time("read", "read_runtimes", "update_samples"),
+                    "plot_time": wall_time("convergence_plot", "surface_plot"),
+                    "iteration_time": iterationTime,
+                    "fit_cpu_time": X.last_timings.get("fit", (0.0, 0.0))[1],
+                    "acquisition_cpu_time": X.last_timings.get("acquisition", (0.0, 0.0))[1],
+                    "peak_rss_mb": peak_rss_mb(),
+                }
+            )
+    return records
+
+
+def summarize(records):
+    """Per run: medians of the BO iterations' times, largest peak memory, final regret."""
+    frame = pd.DataFrame(records)
+    keys = ["problem", "kernel", "acquisition", "seed"]
+    runs = []
+    for key, run in frame.groupby(keys, sort=False):
+        bo = run[run["phase"] == "bo"]
+        summary = dict(zip(keys, key))
+        summary["seed"] = int(summary["seed"])
+        for metric in COMPARED_METRICS[:-1]:
+            summary[metric] = float(bo[metric].median()) if len(bo) else 0.0
+        summary["peak_rss_mb"] = float(run["peak_rss_mb"].max())
+        summary["total_time"] = float(run["iteration_time"].sum())
+        summary["final_best"] = float(run["best"].iloc[-1])
+        summary["final_regret"] = float(run["regret"].iloc[-1])
+        runs.append(summary)
+    return runs
+
+
+def compare(runs, baselineRuns, tolerance=0.2):
+    """
+    Log the change of every compared metric against the baseline run of the same
+    problem, kernel, acquisition and seed. Returns the regressions, i.e. the
+    metrics more than tolerance (relative) above the baseline.
+    """
+    keys = ["problem", "kernel", "acquisition", "seed"]
+    baseline = {tuple(run[key] for key in keys): run for run in baselineRuns}
+    regressions = []
+    for run in runs:
+        reference = baseline.get(tuple(run[key] for key in keys))
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not reference.get(metric):
+                continue
+            ratio = run[metric] / reference[metric]
+            label = "%s %s %s seed=%d %s" % (*[run[key] for key in keys], metric)
+            if ratio > 1.0 + tolerance:
+                regressions.append(label)
+                logger.warning("%s: %.3g -> %.3g (x%.2f)" % (label, reference[metric], run[metric], ratio))
+            elif ratio < 1.0 - tolerance:
+                logger.info("%s: %.3g -> %.3g (x%.2f)" % (label, reference[metric], run[metric], ratio))
+        logger.info(
+            "%s %s %s seed=%d final regret: %.3g -> %.3g"
+            % (*[run[key] for key in keys], reference["final_regret"], run["final_regret"])
+        )
+    return regressions
+
+
+def environment():
+    import GPy
+    import GPyOpt
+
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "GPy": GPy.__version__,
+        "GPyOpt": GPyOpt.__version__,
+        "cpus": os.cpu_count(),
+    }
+
+
+def plot_curves(records, path2fig):
+    """Median regret over the seeds vs iteration, one panel per problem."""
+    import matplotlib.pyplot as plt
+
+    frame = pd.DataFrame(records)
+    problems = list(dict.fromkeys(frame["problem"]))
+    fig, axes = plt.subplots(len(problems), 1, figsize=(8, 4 * len(problems)), squeeze=False)
+    for ax, problem in zip(axes[:, 0], problems):
+        for (kernel, acquisition), run in frame[frame["problem"] == problem].groupby(
+            ["kernel", "acquisition"]
+        ):
+            curve = run.groupby("iteration")["regret"].median()
+            ax.semilogy(curve.index, np.maximum(curve.to_numpy(), 1e-12), label=f"{kernel} {acquisition}")
+        ax.set_title(problem)
+        ax.set_xlabel("iteration")
+        ax.set_ylabel("regret")
+        ax.grid(True)
+        ax.legend()
+    fig.savefig(path2fig, bbox_inches="tight")
+    plt.close(fig)
+    logger.info("save: %s" % path2fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BO loop on test functions")
+    parser.add_argument("--problems", nargs="+", choices=list(PROBLEMS), default=list(PROBLEMS))
+    parser.add_argument("--kernels", nargs="+", default=["RBF"])
+    parser.add_argument("--acquisitions", nargs="+", default=["EI"])
+    parser.add_argument("--iterations", type=int, default=30, help="BO samples per run")
+    parser.add_argument("--nInit", type=int, default=None, help="initial samples (2 per dimension)")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--out", type=Path, default=Path("benchmark.csv"))
+    parser.add_argument("--summary", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--compare", type=Path, help="summary json of an earlier version")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change reported")
+    parser.add_argument("--plot", type=Path, help="pdf of the regret curves")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(name)s - %(levelname)s - %(message)s")
+    # The suggestion loop logs every sample, only the benchmark summary is wanted
+    logging.getLogger("Driver").setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    records = []
+    for problem, kernel, acquisition, seed in itertools.product(
+        args.problems, args.kernels, args.acquisitions, args.seeds
+    ):
+        run = benchmark(problem, kernel, acquisition, args.iterations, args.nInit, seed)
+        settings = {"problem": problem, "kernel": kernel, "acquisition": acquisition, "seed": seed}
+        records += [{**settings, **record} for record in run]
+        bo = [record for record in run if record["phase"] == "bo"]
+        logger.info(
+            "%s %s %s seed=%d: regret %g, fit %.2f s, acquisition %.2f s, io %.3f s, plots %.2f s per iteration, peak %.0f MB"
+            % (
+                problem,
+                kernel,
+                acquisition,
+                seed,
+                run[-1]["regret"],
+                np.median([record["fit_time"] for record in bo]),
+                np.median([record["acquisition_time"] for record in bo]),
+                np.median([record["io_time"] for record in bo]),
+                np.median([record["plot_time"] for record in bo]),
+                max(record["peak_rss_mb"] for record in run),
+            )
+        )
+    pd.DataFrame(records).to_csv(args.out, index=False)
+    logger.info("per-iteration results written to %s" % args.out)
+
+    runs = summarize(records)
+    with open(args.summary, "w") as summaryFile:
+        settings = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in vars(args).items()
+        }
+        json.dump(
+            {"environment": environment(), "settings": settings, "runs": runs},
+            summaryFile,
+            indent=2,
+        )
+    logger.info("summary written to %s" % args.summary)
+    if args.plot is not None:
+        plot_curves(records, args.plot)
+
+    if args.compare is not None:
+        with open(args.compare) as baselineFile:
+            regressions = compare(runs, json.load(baselineFile)["runs"], args.tolerance)
+        if regressions:
+            logger.warning("%d regressions against %s" % (len(regressions), args.compare))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
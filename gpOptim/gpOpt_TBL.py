@@ -7,7 +7,9 @@
 #
 import sys
 import os
+import time
 import math as mt
+from contextlib import contextmanager
 import matplotlib
 
 matplotlib.use("PDF")
@@ -21,6 +23,7 @@ import numpy as np
 import GPy
 import GPyOpt
 from GPyOpt.methods import BayesianOptimization
+from GPyOpt.core.task.cost import CostModel
 
 # from GPyOpt import Design_space
 # from GPyOpt.experiment_design import initial_design
@@ -38,6 +41,7 @@ logger = logging.getLogger("Driver").getChild("gpOptim/gpOpt.py")
 sigma_d = 0.01  # sdev of the white noise in the measured data
 whichOptim = "min"  # find 'max' or 'min' of f(x)?
 kernelType = "RBF"  #'RBF', 'Matern52'
+acquisitionType = "EI"  #'EI', 'EIperSecond' (EI divided by the predicted runtime)
 # admissible range of parameters
 var_range = [
     [0.275, 0.725],
@@ -86,6 +90,24 @@ tol_b = (
 # note if err_d<tol_d and err_b<tol_b => convergence in (x_opt , f(x_opt))
 # tol_abs=0.05
 # ---------------------------------------------------------------------------
+# Wall and CPU seconds of the phases of the last nextGPsample or
+# BO_update_convergence call: phase -> (wall, cpu)
+last_timings = {}
+
+
+#
+@contextmanager
+def timed(phase):
+    wallStart, cpuStart = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        last_timings[phase] = (
+            time.perf_counter() - wallStart,
+            time.process_time() - cpuStart,
+        )
+
+
 #
 def read_available_GPsamples(gpInputFile, nPar_=nPar):
     """
@@ -113,34 +135,62 @@ def read_available_GPsamples(gpInputFile, nPar_=nPar):
     return xList, yList
 
 
+#
+def read_runtime_samples(databaseFile, nPar_=nPar):
+    """
+    Read the design variables and the CFD runtime (s) of the evaluated cases
+    from the database written by StarManager
+    """
+    import pandas as pd
+
+    if databaseFile is None or not os.path.isfile(databaseFile):
+        return np.zeros((0, nPar_)), np.zeros(0)
+    database = pd.read_csv(databaseFile)
+    if "runtime" not in database:
+        return np.zeros((0, nPar_)), np.zeros(0)
+    database = database.dropna(subset=var_names[:nPar_] + ["runtime"])
+    database = database[database["runtime"] > 0]
+    xList = database[var_names[:nPar_]].to_numpy(dtype=float)
+    tList = database["runtime"].to_numpy(dtype=float)
+    return xList, tList
+
+
 #
 def update_GPsamples(gpOutputFile, xList, yList, xNext, yNext):
     """
     Update the existing list of GP samples with the recent sample & response
     """
-    F2 = open(gpOutputFile, "w")
+    xList = np.vstack([np.reshape(xList, (-1, nPar)), np.reshape(xNext, (1, nPar))])
+    yList = np.append(np.ravel(yList), yNext)
+    write_GPsamples(gpOutputFile, xList, yList)
+    logger.info("**** %s is updated!" % gpOutputFile)
+
+
+#
+def write_GPsamples(gpOutputFile, xList, yList):
+    """
+    Write the list of GP samples; written next to gpOutputFile and renamed, so a
+    crash never leaves a partial list
+    """
+    tmpFile = str(gpOutputFile) + ".tmp"
+    F2 = open(tmpFile, "w")
     F2.write("#List of GP samples.\n")
     tmp = "#iter" + "\t"
     for variable in var_names:
         tmp += variable + "\t"
     tmp += "response\n"
     F2.write(tmp)
-    nData = xList.shape[0]
-    # write the datalist before observing the new sample
-    for i in range(nData):
+    yList = np.ravel(yList)
+    for i in range(len(yList)):
         tmpList = str(i + 1) + "\t"
         for j in range(nPar):
             tmpList += str(xList[i][j]) + "\t"
-        tmpList += str(yList[i][0]) + "\n"
+        tmpList += str(yList[i]) + "\n"
         F2.write(tmpList)
-    # write the most recent parameters and associated response
-    tmpList = str((nData + 1)) + "\t"
-    for j in range(nPar):
-        tmpList += str(xNext[j]) + "\t"
-    tmpList += str(yNext) + "\n"
-    F2.write(tmpList)
+    F2.flush()
+    os.fsync(F2.fileno())
     F2.close()
-    logger.info("**** %s is updated!" % gpOutputFile)
+    os.replace(tmpFile, gpOutputFile)
 
 
 #
@@ -572,7 +622,7 @@ def printSetting():
     """
     logger.info(
         "\nnPar = %d\nsigma_d = %f\nwhichOptim = %s\ntol_d = %f\ntol_b = %f"
-        "\nkernel = %s\nnGPinit = %d\nqBound = [%s]"
+        "\nkernel = %s\nacquisition = %s\nnGPinit = %d\nqBound = [%s]"
         % (
             nPar,
             sigma_d,
@@ -580,6 +630,7 @@ def printSetting():
             tol_d,
             tol_b,
             kernelType,
+            acquisitionType,
             nGPinit,
             ", ".join(map(str, qBound)),
         )
@@ -587,12 +638,31 @@ def printSetting():
 
 
 #
-def nextGPsample(path2gpList, kernelType_=kernelType):
+def nextGPsample(
+    path2gpList,
+    kernelType_=kernelType,
+    pendingX=None,
+    acquisitionType_=acquisitionType,
+    path2database=None,
+    hyperParams=None,
+    returnHyperParams=False,
+):
     """
     Take the next sample of the parameters from their admissible space.
     If the number of the available samples is less than a limit (=nGPinit),
     take the initial samples randomly. Otherwise, use the BO-GP algorithm.
+    pendingX: samples that are being evaluated. They are added to the GP data
+    with the best response so far (constant liar), which pushes the next
+    sample away from them.
+    acquisitionType_='EIperSecond': EI is divided by the runtime predicted by a
+    second GP on the log of the runtimes in path2database (database.csv).
+    hyperParams: kernel parameters of an earlier fit, reused instead of fitting
+    them again. With returnHyperParams the fitted ones are returned as well, as
+    (xNext, hyperParams).
+    The time spent reading, fitting and optimizing the acquisition is left in
+    last_timings.
     """
+    last_timings.clear()
     # >>>>Assignments (don't touch these!)
     if whichOptim == "max":
         maxFlag = True
@@ -618,11 +688,21 @@ def nextGPsample(path2gpList, kernelType_=kernelType):
         domain.append(domain_)
     # ---------------------------------------------------------------------------
 
-    [xList, yList] = read_available_GPsamples(path2gpList, nPar)
+    with timed("read"):
+        [xList, yList] = read_available_GPsamples(path2gpList, nPar)
     nData = len(yList)
     # xList=xList.reshape((nData,nPar))   #reshape as required by GPy and GPyOpt
     yList = yList.reshape((nData, 1))  # reshape as required by GPy and GPyOpt
 
+    if pendingX is not None and len(pendingX) > 0 and nData >= nGPinit:
+        logger.info("%d pending samples, fantasized as the best response" % len(pendingX))
+        if whichOptim == "min":
+            yLiar = np.min(yList)
+        else:
+            yLiar = np.max(yList)
+        xList = np.vstack([xList, np.asarray(pendingX).reshape((-1, nPar))])
+        yList = np.vstack([yList, np.full((len(pendingX), 1), yLiar)])
+
     if nData < nGPinit:  # take initial random samples
         logger.info("take the sample randomly")
         tmp = []
@@ -641,21 +721,38 @@ def nextGPsample(path2gpList, kernelType_=kernelType):
             K = GPy.kern.Matern52(input_dim=nPar, lengthscale=1.0, variance=1.0)
         elif kernelType_ == "RBF":
             K = GPy.kern.RBF(input_dim=nPar, lengthscale=1.0, variance=1.0)
+        if hyperParams is not None:
+            K[:] = hyperParams
 
         gpModel = GPyOpt.models.gpmodel.GPModel(
             kernel=K,
             noise_var=sigma_d**2.0,
             exact_feval=fevalFlag,
             optimizer="bfgs",  # MLE optimization of the Kernel hyper parameters
-            max_iters=200,
+            max_iters=200 if hyperParams is None else 0,  # 0: no refit
             optimize_restarts=5,
             verbose=False,
         )
 
+        # >>>> Runtime model for the cost-aware acquisition
+        costFunction = None  # constant cost, i.e. plain EI
+        if acquisitionType_ == "EIperSecond":
+            with timed("read_runtimes"):
+                xRuntime, tRuntime = read_runtime_samples(path2database, nPar)
+            if len(tRuntime) >= 2:
+                runtimeModel = CostModel("evaluation_time")  # GP on log(runtime)
+                with timed("fit_runtime"):
+                    runtimeModel.update_cost_model(xRuntime, tRuntime)
+                costFunction = runtimeModel.cost_withGradients
+                logger.info("runtime model fitted to %d cases" % len(tRuntime))
+            else:
+                logger.warning("too few runtimes recorded, plain EI is used")
+
         # >>>> Set-up the BO (Bayesian Optimization) problem
         gprOpt = BayesianOptimization(
             f="",  # empty f
             domain=domain,
+            cost_withGradients=costFunction,
             maximize=maxFlag,  # default:False => minimization
             model_type="GP",
             model=gpModel,
@@ -670,15 +767,103 @@ def nextGPsample(path2gpList, kernelType_=kernelType):
             verbosity=True,
         )
 
-        # Find the next x-sample
-        xNext = gprOpt.suggest_next_locations(
-            context=None, pending_X=None, ignored_X=None
-        )
+        # Find the next x-sample: the two steps of suggest_next_locations, the
+        # hyperparameter fit and the acquisition optimization, timed apiece
+        gprOpt.model_parameters_iterations = None
+        gprOpt.num_acquisitions = 0
+        gprOpt.context = None
+        with timed("fit"):
+            gprOpt._update_model(gprOpt.normalization_type)
+        with timed("acquisition"):
+            xNext = gprOpt._compute_next_evaluations(
+                pending_zipped_X=None, ignored_zipped_X=None
+            )
+        hyperParams = gprOpt.model.model.kern.param_array.copy()
 
     logger.info("**** New GP sample is: %s" % ", ".join(map(str, xNext[0])))
+    if returnHyperParams:
+        return np.array(xNext[0]), hyperParams
     return np.array(xNext[0])
 
 
+#
+def nextGPsample_timed(*args, **kwargs):
+    """
+    nextGPsample returning (xNext, last_timings), for a call in another process
+    whose last_timings the caller cannot see
+    """
+    xNext = nextGPsample(*args, **kwargs)
+    return xNext, dict(last_timings)
+
+
+#
+def initial_design(nSamples, method="maximin", qBound_=qBound, screen=None, seed=None, nTrials=100):
+    """
+    Space-filling samples over qBound_, to be evaluated in parallel before BO starts:
+      'sobol':   scrambled Sobol sequence (best balanced for nSamples = 2^m)
+      'lhs':     Latin hypercube
+      'maximin': of nTrials Latin hypercubes, the one with the largest smallest
+                 distance between two samples
+    screen(x) returns why the sample x is infeasible, or None. Infeasible
+    samples are replaced one by one by the feasible candidate (from a Sobol
+    sequence) farthest from the samples kept. Distances are taken in the unit
+    cube. The same seed gives the same design.
+    """
+    import warnings
+    from scipy.stats import qmc
+    from scipy.spatial.distance import cdist, pdist
+
+    nPar_ = len(qBound_)
+    lower = np.array([q[0] for q in qBound_], dtype=float)
+    upper = np.array([q[1] for q in qBound_], dtype=float)
+    rng = np.random.default_rng(seed)
+    if method == "sobol":
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # n not a power of 2
+            unit = qmc.Sobol(nPar_, scramble=True, seed=rng).random(nSamples)
+    elif method == "lhs":
+        unit = qmc.LatinHypercube(nPar_, seed=rng).random(nSamples)
+    elif method == "maximin":
+        unit, bestDistance = None, -1.0
+        for _ in range(nTrials):
+            trial = qmc.LatinHypercube(nPar_, seed=rng).random(nSamples)
+            distance = np.min(pdist(trial)) if nSamples > 1 else 0.0
+            if distance > bestDistance:
+                unit, bestDistance = trial, distance
+    else:
+        raise ValueError("unknown initial design: %s" % method)
+    logger.info("%s initial design of %d samples" % (method, nSamples))
+    if screen is None:
+        return qmc.scale(unit, lower, upper)
+
+    kept = []
+    for k, sample in enumerate(unit):
+        reason = screen(qmc.scale(sample[None, :], lower, upper)[0])
+        if reason is None:
+            kept.append(sample)
+        else:
+            logger.info("initial sample %d rejected: %s" % (k + 1, reason))
+
+    nMissing = nSamples - len(kept)
+    candidates = qmc.Sobol(nPar_, scramble=True, seed=rng).random_base2(
+        int(np.ceil(np.log2(max(64, 16 * nMissing))))
+    )
+    while len(kept) < nSamples and len(candidates) > 0:
+        if kept:
+            distance = np.min(cdist(candidates, np.array(kept)), axis=1)
+            k = int(np.argmax(distance))
+        else:
+            k = 0
+        sample, candidates = candidates[k], np.delete(candidates, k, axis=0)
+        if screen(qmc.scale(sample[None, :], lower, upper)[0]) is None:
+            kept.append(sample)
+    if nMissing > 0:
+        logger.info("%d infeasible initial samples replaced" % (len(kept) - nSamples + nMissing))
+    if len(kept) < nSamples:
+        logger.warning("only %d feasible initial samples found" % len(kept))
+    return qmc.scale(np.array(kept).reshape((-1, nPar_)), lower, upper)
+
+
 #
 def BO_update_convergence(
     xLast, yLast, path2gpList="./workDir/gpList.dat", path2figs="../figs"
@@ -688,26 +873,31 @@ def BO_update_convergence(
     2. Check if BO-GP is converged or not (criteria need to be decided)
 
     Note: return 1 is taken as the signal of the convergence
+    The time spent on the sample list and on each plot is left in last_timings.
     """
-    [xList, yList] = read_available_GPsamples(path2gpList, nPar)
-    nData = len(yList)  # overwritten later
-    # xList=xList.reshape((nData,nPar))   #reshape as required by GPy and GPyOpt
-    yList = yList.reshape((nData, 1))  # reshape as required by GPy and GPyOpt
-
-    # Update gpList.dat
-    update_GPsamples(path2gpList, xList, yList, xLast, yLast)
-    # read the updated gpList.dat
-    [xList_, yList_] = read_available_GPsamples(path2gpList, nPar)
+    last_timings.clear()
+    with timed("update_samples"):
+        [xList, yList] = read_available_GPsamples(path2gpList, nPar)
+        nData = len(yList)  # overwritten later
+        # xList=xList.reshape((nData,nPar))   #reshape as required by GPy and GPyOpt
+        yList = yList.reshape((nData, 1))  # reshape as required by GPy and GPyOpt
+
+        # Update gpList.dat
+        update_GPsamples(path2gpList, xList, yList, xLast, yLast)
+        # read the updated gpList.dat
+        [xList_, yList_] = read_available_GPsamples(path2gpList, nPar)
 
     # Check convergence of BO
     # >>>>> plot convergence
     nData = len(yList_)
     if nData > 1:
-        [xDistList, yBestList] = my_convergence_plot(
-            xList_, yList_, path2figs, "bo_convergence"
-        )
+        with timed("convergence_plot"):
+            [xDistList, yBestList] = my_convergence_plot(
+                xList_, yList_, path2figs, "bo_convergence"
+            )
 
-    gpSurface_plot(xList_, yList_, nData, path2figs=path2figs)
+    with timed("surface_plot"):
+        gpSurface_plot(xList_, yList_, nData, path2figs=path2figs, bounds=qBound)
 
     # check convergence: only for minimize !!!
     # logger.debug("check convergence")
@@ -0,0 +1,270 @@
+###################################################
+# Offline replay of the BO-GP suggestion loop on a
+#  recorded campaign, no CFD run needed
+###################################################
+#
+# The recorded samples (gpList.dat or cfd/database.csv) stand in for the CFD:
+#   'surrogate': a GP fitted to all recorded samples is the objective, the
+#                simulated regret is taken against its smallest mean
+#   'pool':      each suggestion is moved to the nearest recorded sample not
+#                used yet, whose recorded response (and runtime) is returned
+# nextGPsample is then run for every combination of kernel, acquisition,
+# batch size and refit schedule, as the drivers run it: the samples of a batch
+# are asked one after the other with the earlier ones pending. Per iteration
+# the best response, regret, optimizer wall time and simulated CFD time are
+# written to a csv:
+#   python -m gpOptim.replay --database cfd/database.csv --kernels RBF Matern52 \
+#       --acquisitions EI EIperSecond --batchSizes 1 4 --refitEvery 1 5
+#
+import argparse
+import itertools
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gpOptim import gpOpt_TBL as X
+
+logger = logging.getLogger("Driver").getChild("gpOptim/replay.py")
+
+
+# %% recorded campaigns
+def read_campaign(path2gpList=None, path2database=None, objective="overallDuctPressureLoss"):
+    """
+    (xList, yList, runtimes) of a recorded campaign. Runtimes (s) are only
+    known from a database, None otherwise.
+    """
+    if path2database is not None:
+        database = pd.read_csv(path2database)
+        database = database.dropna(subset=X.var_names[: X.nPar] + [objective])
+        xList = database[X.var_names[: X.nPar]].to_numpy(dtype=float)
+        yList = database[objective].to_numpy(dtype=float)
+        runtimes = None
+        if "runtime" in database and database["runtime"].notna().all():
+            runtimes = database["runtime"].to_numpy(dtype=float)
+        return xList, yList, runtimes
+    xList, yList = X.read_available_GPsamples(path2gpList, X.nPar)
+    return xList, yList, None
+
+
+def to_unit(xList, qBound_=X.qBound):
+    bounds = np.array(qBound_, dtype=float)
+    return (np.asarray(xList) - bounds[:, 0]) / (bounds[:, 1] - bounds[:, 0])
+
+
+class SurrogateOracle:
+    """Posterior mean of a GP fitted to the recorded samples."""
+
+    def __init__(self, xList, yList, runtimes=None, seed=0):
+        import GPy
+        from scipy.stats import qmc
+
+        self.xList, self.runtimes = xList, runtimes
+        self.yMean, self.yStd = np.mean(yList), np.std(yList) or 1.0
+        kernel = GPy.kern.Matern52(input_dim=X.nPar, ARD=True)
+        self.model = GPy.models.GPRegression(
+            to_unit(xList), ((yList - self.yMean) / self.yStd).reshape((-1, 1)), kernel
+        )
+        self.model.optimize_restarts(num_restarts=5, verbose=False)
+        # Smallest mean over the recorded samples and a dense Sobol set
+        candidates = np.vstack(
+            [to_unit(xList), qmc.Sobol(X.nPar, scramble=True, seed=seed).random_base2(14)]
+        )
+        self.optimum = float(np.min(self.__predict(candidates)))
+
+    def __predict(self, unit):
+        mean, _ = self.model.predict(unit)
+        return mean[:, 0] * self.yStd + self.yMean
+
+    def evaluate(self, x):
+        """(x evaluated, response, runtime or None)."""
+        y = float(self.__predict(to_unit(np.asarray(x).reshape((1, -1))))[0])
+        runtime = None
+        if self.runtimes is not None:
+            # Runtime of the closest recorded case
+            distance = np.linalg.norm(to_unit(self.xList) - to_unit(x), axis=1)
+            runtime = float(self.runtimes[np.argmin(distance)])
+        return np.asarray(x, dtype=float), y, runtime
+
+
+class PoolOracle:
+    """The recorded samples themselves, each one evaluated at most once."""
+
+    def __init__(self, xList, yList, runtimes=None):
+        self.xList, self.yList, self.runtimes = xList, yList, runtimes
+        self.unused = np.ones(len(yList), dtype=bool)
+        self.optimum = float(np.min(yList))
+
+    def evaluate(self, x):
+        if not np.any(self.unused):
+            return None
+        distance = np.linalg.norm(to_unit(self.xList) - to_unit(x), axis=1)
+        distance[~self.unused] = np.inf
+        k = int(np.argmin(distance))
+        self.unused[k] = False
+        runtime = None if self.runtimes is None else float(self.runtimes[k])
+        return self.xList[k], float(self.yList[k]), runtime
+
+
+# %% replay
+def replay(
+    oracle,
+    kernelType_="RBF",
+    acquisitionType_="EI",
+    batchSize=1,
+    refitEvery=1,
+    nIterations=30,
+    nInit=8,
+    seed=0,
+):
+    """
+    One simulated campaign: nInit maximin samples, then nIterations BO samples
+    in batches of batchSize. The kernel hyperparameters are fitted on every
+    refitEvery-th ask and reused in between. Returns one record per sample.
+    """
+    np.random.seed(seed)
+    records = []
+    with tempfile.TemporaryDirectory() as workDir:
+        path2gpList = Path(workDir) / "gpList.dat"
+        path2database = Path(workDir) / "database.csv"
+        xList, yList, runtimes = [], [], []
+
+        def tell(iteration, batch, result, optimizerTime, simulatedTime):
+            x, y, runtime = result
+            xList.append(x)
+            yList.append(y)
+            runtimes.append(np.nan if runtime is None else runtime)
+            best = min(yList)
+            records.append(
+                {
+                    "iteration": iteration,
+                    "batch": batch,
+                    "y": y,
+                    "best": best,
+                    "regret": best - oracle.optimum,
+                    "optimizer_time": optimizerTime,
+                    "simulated_time": simulatedTime,
+                }
+            )
+
+        simulatedTime = 0.0
+        initial = [oracle.evaluate(x) for x in X.initial_design(nInit, "maximin", seed=seed)]
+        initial = [result for result in initial if result is not None]
+        simulatedTime += max((result[2] or 0.0) for result in initial) if initial else 0.0
+        for k, result in enumerate(initial):
+            tell(k + 1, 0, result, 0.0, simulatedTime)
+
+        hyperParams, nAsked, batch = None, 0, 0
+        while nAsked < nIterations:
+            X.write_GPsamples(path2gpList, np.array(xList), np.array(yList))
+            pd.DataFrame(
+                np.column_stack([xList, runtimes]),
+                columns=X.var_names[: X.nPar] + ["runtime"],
+            ).to_csv(path2database, index=False)
+
+            batch += 1
+            pendingX, askTimes = [], []
+            for _ in range(min(batchSize, nIterations - nAsked)):
+                refit = hyperParams is None or nAsked % refitEvery == 0
+                startTime = time.perf_counter()
+                xNext, hyperParams = X.nextGPsample(
+                    path2gpList,
+                    kernelType_,
+                    pendingX=pendingX,
+                    acquisitionType_=acquisitionType_,
+                    path2database=path2database,
+                    hyperParams=None if refit else hyperParams,
+                    returnHyperParams=True,
+                )
+                askTimes.append(time.perf_counter() - startTime)
+                pendingX.append(xNext)
+                nAsked += 1
+
+            results = [oracle.evaluate(x) for x in pendingX]
+            results = [result for result in results if result is not None]
+            if not results:
+                logger.warning("recorded samples used up after %d asks" % nAsked)
+                break
+            # The batch runs in parallel, it takes as long as its slowest case
+            simulatedTime += max((result[2] or 0.0) for result in results)
+            for result, askTime in zip(results, askTimes):
+                tell(len(yList) + 1, batch, result, askTime, simulatedTime)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the BO loop on a recorded campaign")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--gpList", type=Path)
+    source.add_argument("--database", type=Path)
+    parser.add_argument("--objective", default="overallDuctPressureLoss")
+    parser.add_argument("--oracle", choices=["surrogate", "pool"], default="surrogate")
+    parser.add_argument("--kernels", nargs="+", default=["RBF", "Matern52"])
+    parser.add_argument("--acquisitions", nargs="+", default=["EI"])
+    parser.add_argument("--batchSizes", nargs="+", type=int, default=[1])
+    parser.add_argument("--refitEvery", nargs="+", type=int, default=[1])
+    parser.add_argument("--iterations", type=int, default=30, help="BO samples per run")
+    parser.add_argument("--nInit", type=int, default=8, help="initial design samples")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--out", type=Path, default=Path("replay.csv"))
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(name)s - %(levelname)s - %(message)s")
+    # The suggestion loop logs every sample, only the replay summary is wanted
+    logging.getLogger("Driver").setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    xList, yList, runtimes = read_campaign(args.gpList, args.database, args.objective)
+    logger.info("%d recorded samples, best response %g" % (len(yList), np.min(yList)))
+    if args.oracle == "surrogate":
+        surrogate = SurrogateOracle(xList, yList, runtimes)
+        logger.info("surrogate optimum %g" % surrogate.optimum)
+
+    records = []
+    for kernel, acquisition, batchSize, refitEvery, seed in itertools.product(
+        args.kernels, args.acquisitions, args.batchSizes, args.refitEvery, args.seeds
+    ):
+        if args.oracle == "surrogate":
+            oracle = surrogate
+        else:
+            oracle = PoolOracle(xList, yList, runtimes)
+        run = replay(
+            oracle,
+            kernel,
+            acquisition,
+            batchSize=batchSize,
+            refitEvery=refitEvery,
+            nIterations=args.iterations,
+            nInit=args.nInit,
+            seed=seed,
+        )
+        settings = {
+            "kernel": kernel,
+            "acquisition": acquisition,
+            "batch_size": batchSize,
+            "refit_every": refitEvery,
+            "seed": seed,
+        }
+        records += [{**settings, **record} for record in run]
+        logger.info(
+            "%s %s q=%d refit=%d seed=%d: regret %g, optimizer %.2f s/ask, simulated %.0f s"
+            % (
+                kernel,
+                acquisition,
+                batchSize,
+                refitEvery,
+                seed,
+                run[-1]["regret"],
+                np.mean([record["optimizer_time"] for record in run if record["batch"] > 0]),
+                run[-1]["simulated_time"],
+            )
+        )
+    pd.DataFrame(records).to_csv(args.out, index=False)
+    logger.info("per-iteration results written to %s" % args.out)
+
+
+if __name__ == "__main__":
+    main()
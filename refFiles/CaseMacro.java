@@ -0,0 +1,45 @@
+// STAR-CCM+ macro base class: CaseMacro.java
+// Case directory and case options, shared by the refFiles macros. Not played
+// itself: starRunner.macro_bundle compiles it into the bundle, and STAR finds
+// it there through -classpath when it compiles or loads the macros.
+package macro;
+
+import java.io.*;
+import java.util.*;
+import star.common.*;
+
+public abstract class CaseMacro extends StarMacro {
+
+  protected Map<String, String> readCaseOptions(Simulation simulation_0) {
+    // case_options.csv is written by StarManager, one "key, value" pair per line
+    Map<String, String> caseOptions = new HashMap<>();
+    File optionsFile = new File(resolvePath(getCaseDir(simulation_0) + "/" + "case_options.csv"));
+    if (!optionsFile.exists()) {
+      return caseOptions;
+    }
+    try (BufferedReader reader = new BufferedReader(new FileReader(optionsFile))) {
+      String line;
+      while ((line = reader.readLine()) != null) {
+        String[] entry = line.split(",", 2);
+        if (entry.length == 2) {
+          caseOptions.put(entry[0].trim(), entry[1].trim());
+        }
+      }
+    } catch (IOException iOException) {
+    }
+    return caseOptions;
+  }
+
+  protected String getCaseDir(Simulation simulation_0) {
+    // A persistent server session, the load strategy and scratch runs point
+    // the macros at the case directory
+    String casePointer = System.getenv("BOGP_CASE_POINTER");
+    if (casePointer != null && new File(casePointer).exists()) {
+      try (BufferedReader reader = new BufferedReader(new FileReader(casePointer))) {
+        return reader.readLine().trim();
+      } catch (IOException iOException) {
+      }
+    }
+    return simulation_0.getSessionDir();
+  }
+}
@@ -0,0 +1,44 @@
+// STAR-CCM+ macro: export_images.java
+// Deferred image export, run on the <case>_solved.sim kept by post_star.java
+package macro;
+
+import java.io.*;
+import java.util.*;
+import star.common.*;
+import star.vis.*;
+
+public class export_images extends CaseMacro {
+
+  public void execute() {
+    execute0();
+  }
+
+  private void execute0() {
+    Simulation simulation_0 = getActiveSimulation();
+    String outPutDir = getCaseDir(simulation_0);
+
+    // "all" (default) or a ";" separated list of plot and scene names
+    String exportImages = readCaseOptions(simulation_0).getOrDefault("export_images", "all");
+    List<String> imageNames = Arrays.asList(exportImages.split(";"));
+    boolean exportAll = exportImages.equals("all");
+
+    for (StarPlot plot : simulation_0.getPlotManager().getPlots()) {
+      if (!exportAll && !imageNames.contains(plot.getPresentationName())) {
+        continue;
+      }
+      plot.openInteractive();
+      String filePath = outPutDir + "/" + "plot_" + plot.getPresentationName() + ".png";
+      plot.encode(resolvePath(filePath), "png", 800, 600, true, true);
+      simulation_0.println("Saved: " + filePath);
+    }
+
+    for (Scene scene : simulation_0.getSceneManager().getScenes()) {
+      if (!exportAll && !imageNames.contains(scene.getPresentationName())) {
+        continue;
+      }
+      String filePath = outPutDir + "/" + scene.getPresentationName() + ".png";
+      scene.printAndWait(resolvePath(filePath), 1, 1280, 720);
+      simulation_0.println("Saved: " + filePath);
+    }
+  }
+}
@@ -0,0 +1,223 @@
+// Simcenter STAR-CCM+ macro: load_design.java
+// Written by Erik Hasselwander
+//
+// Fixed replacement for the per-case geometry and update_variables macros.
+// Reads design_data.csv (written by SGMG.star_geometry_data_writer) from the
+// case directory, updates the global parameters and builds one sketch,
+// extrusion and body per sketch listed in the file.
+package macro;
+
+import java.io.*;
+import java.util.*;
+import star.common.*;
+import star.base.neo.*;
+import star.cadmodeler.*;
+
+public class load_design extends CaseMacro {
+
+  class SketchData {
+    String name;
+    List<double[]> points = new ArrayList<>();
+    List<String> faceNames = new ArrayList<>();
+    List<int[]> curves = new ArrayList<>();
+  }
+
+  String modelName = null;
+  String modelTmpName = null;
+  String modelSupersededName = null;
+  Map<String, Double> parameters = new LinkedHashMap<>();
+  List<SketchData> sketches = new ArrayList<>();
+
+  public void execute() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    readDesignData(simulation_0, getCaseDir(simulation_0) + "/" + "design_data.csv");
+
+    execute0();
+    if (!sketches.isEmpty()) {
+      execute1();
+    }
+  }
+
+  private void execute0() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    for (Map.Entry<String, Double> parameter : parameters.entrySet()) {
+      ScalarGlobalParameter scalarGlobalParameter_0 = ((ScalarGlobalParameter) simulation_0.get(GlobalParameterManager.class).getObject(parameter.getKey()));
+      scalarGlobalParameter_0.getQuantity().setValue(parameter.getValue());
+    }
+  }
+
+  private void execute1() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    SolidModelManager solidModelManager_0 = simulation_0.get(SolidModelManager.class);
+    // Left over by a case that failed while building its model
+    if (solidModelManager_0.has(modelTmpName)) {
+      solidModelManager_0.removeObjects(solidModelManager_0.getObject(modelTmpName));
+    }
+    // The sim still holds the model of the base case or of the previous case,
+    // replace_geometry removes it once no part is bound to it any more
+    if (solidModelManager_0.has(modelName)) {
+      ((CadModel) solidModelManager_0.getObject(modelName)).setPresentationName(modelSupersededName);
+    }
+
+    CadModel cadModel_0 = solidModelManager_0.createSolidModel();
+
+    cadModel_0.resetSystemOptions();
+    cadModel_0.setPresentationName(modelTmpName);
+
+    for (SketchData sketchData : sketches) {
+      createSketch(simulation_0, cadModel_0, sketchData);
+    }
+
+    cadModel_0.resetSystemOptions();
+    cadModel_0.setPresentationName(modelName);
+  }
+
+  private void createSketch(Simulation simulation_0, CadModel cadModel_0, SketchData sketchData) {
+    cadModel_0.resetSystemOptions();
+    CanonicalSketchPlane canonicalSketchPlane_0 = ((CanonicalSketchPlane) cadModel_0.getFeature("XY"));
+    Units units_0 = simulation_0.getUnitsManager().getPreferredUnits(Dimensions.Builder().length(1).build());
+    Units units_1 = ((Units) simulation_0.getUnitsManager().getObject("deg"));
+    LabCoordinateSystem labCoordinateSystem_0 = simulation_0.getCoordinateSystemManager().getLabCoordinateSystem();
+    Sketch sketch_0 = cadModel_0.getFeatureManager().createSketch(canonicalSketchPlane_0);
+    cadModel_0.allowMakingPartDirty(false);
+    cadModel_0.getFeatureManager().startSketchEdit(sketch_0);
+
+    List<PointSketchPrimitive> points = new ArrayList<>();
+    for (double[] point : sketchData.points) {
+      points.add(sketch_0.createPoint(new DoubleVector(new double[] {point[0], point[1]})));
+    }
+
+    List<List<LineSketchPrimitive>> curveLines = new ArrayList<>();
+    for (int[] curve : sketchData.curves) {
+      List<LineSketchPrimitive> lines = new ArrayList<>();
+      for (int k = 0; k < curve.length - 1; k++) {
+        lines.add(sketch_0.createLine(points.get(curve[k]), points.get(curve[k + 1])));
+      }
+      curveLines.add(lines);
+    }
+
+    sketch_0.setIsUptoDate(true);
+    sketch_0.markFeatureForEdit();
+    cadModel_0.allowMakingPartDirty(true);
+    cadModel_0.getFeatureManager().stopSketchEdit(sketch_0, true);
+    cadModel_0.getFeatureManager().updateModelAfterFeatureEdited(sketch_0, null);
+
+    ExtrusionMerge extrusionMerge_0 = cadModel_0.getFeatureManager().createExtrusionMerge(sketch_0);
+    extrusionMerge_0.setAutoPreview(true);
+    cadModel_0.allowMakingPartDirty(false);
+    extrusionMerge_0.setDirectionOption(0);
+    extrusionMerge_0.setExtrudedBodyTypeOption(0);
+    extrusionMerge_0.getDistance().setValueAndUnits(0.1, units_0);
+    extrusionMerge_0.getDistanceAsymmetric().setValueAndUnits(0.1, units_0);
+    extrusionMerge_0.getOffsetDistance().setValueAndUnits(0.1, units_0);
+    extrusionMerge_0.setDistanceOption(0);
+    extrusionMerge_0.setCoordinateSystemOption(0);
+    extrusionMerge_0.getDraftAngle().setValueAndUnits(10.0, units_1);
+    extrusionMerge_0.setDraftOption(0);
+    extrusionMerge_0.setImportedCoordinateSystem(labCoordinateSystem_0);
+    extrusionMerge_0.getDirectionAxis().setCoordinateSystem(labCoordinateSystem_0);
+    extrusionMerge_0.getDirectionAxis().setUnits0(units_0);
+    extrusionMerge_0.getDirectionAxis().setUnits1(units_0);
+    extrusionMerge_0.getDirectionAxis().setUnits2(units_0);
+    extrusionMerge_0.getDirectionAxis().setDefinition("");
+    extrusionMerge_0.getDirectionAxis().setValue(new DoubleVector(new double[] {0.0, 0.0, 1.0}));
+    extrusionMerge_0.setFace(null);
+    extrusionMerge_0.setBody(null);
+    extrusionMerge_0.setPlane(null);
+    extrusionMerge_0.setFeatureInputType(0);
+    extrusionMerge_0.setInputFeatureEdges(new ArrayList<>(Collections.<Edge>emptyList()));
+    extrusionMerge_0.setSketch(sketch_0);
+    extrusionMerge_0.setInteractingBodies(new ArrayList<>(Collections.<Body>emptyList()));
+    extrusionMerge_0.setInteractingBodiesBodyGroups(new ArrayList<>(Collections.<BodyGroup>emptyList()));
+    extrusionMerge_0.setInteractingBodiesCadFilters(new ArrayList<>(Collections.<CadFilter>emptyList()));
+    extrusionMerge_0.setInteractingSelectedBodies(false);
+    extrusionMerge_0.setPostOption(0);
+    extrusionMerge_0.setExtrusionOption(0);
+    extrusionMerge_0.setIsBodyGroupCreation(false);
+    cadModel_0.getFeatureManager().markDependentNotUptodate(extrusionMerge_0);
+    cadModel_0.allowMakingPartDirty(true);
+    extrusionMerge_0.markFeatureForEdit();
+    cadModel_0.getFeatureManager().execute(extrusionMerge_0);
+
+    // Name the body and the 2D surfaces from any line of the sketch
+    LineSketchPrimitive anyLine = null;
+    for (List<LineSketchPrimitive> lines : curveLines) {
+      if (!lines.isEmpty()) {
+        anyLine = lines.get(0);
+        break;
+      }
+    }
+    star.cadmodeler.Body cadbody_0 = ((star.cadmodeler.Body) extrusionMerge_0.getBody(anyLine));
+    cadbody_0.setPresentationName(sketchData.name);
+
+    Face face_0 = ((Face) extrusionMerge_0.getEndCapFace(anyLine));
+    cadModel_0.setFaceNameAttributes(new ArrayList<>(Arrays.<Face>asList(face_0)), "2dsurf2", false);
+    Face face_1 = ((Face) extrusionMerge_0.getStartCapFace(anyLine));
+    cadModel_0.setFaceNameAttributes(new ArrayList<>(Arrays.<Face>asList(face_1)), "2dsurf1", false);
+
+    // Group the side faces by face name
+    Map<String, List<Face>> sideFaces = new LinkedHashMap<>();
+    for (int curveIndex = 0; curveIndex < curveLines.size(); curveIndex++) {
+      String faceName = sketchData.faceNames.get(curveIndex);
+      if (!sideFaces.containsKey(faceName)) {
+        sideFaces.put(faceName, new ArrayList<>());
+      }
+      for (LineSketchPrimitive line : curveLines.get(curveIndex)) {
+        sideFaces.get(faceName).add((Face) extrusionMerge_0.getSideFace(line, "True"));
+      }
+    }
+
+    for (Map.Entry<String, List<Face>> sideFace : sideFaces.entrySet()) {
+      cadModel_0.setFaceNameAttributes(new ArrayList<>(sideFace.getValue()), sideFace.getKey(), false);
+    }
+  }
+
+  private void readDesignData(Simulation simulation_0, String filePath) {
+    SketchData sketchData = null;
+    try (BufferedReader reader = new BufferedReader(new FileReader(resolvePath(filePath)))) {
+      String line;
+      while ((line = reader.readLine()) != null) {
+        String[] row = line.split(",");
+        for (int i = 0; i < row.length; i++) {
+          row[i] = row[i].trim();
+        }
+        switch (row[0]) {
+          case "model":
+            modelName = row[1];
+            modelTmpName = row[2];
+            modelSupersededName = row.length > 3 ? row[3] : modelName + "_superseded";
+            break;
+          case "parameter":
+            parameters.put(row[1], Double.parseDouble(row[2]));
+            break;
+          case "sketch":
+            sketchData = new SketchData();
+            sketchData.name = row[1];
+            sketches.add(sketchData);
+            break;
+          case "point":
+            sketchData.points.add(new double[] {Double.parseDouble(row[1]), Double.parseDouble(row[2])});
+            break;
+          case "curve":
+            String[] indices = row[2].split(" ");
+            int[] curve = new int[indices.length];
+            for (int i = 0; i < indices.length; i++) {
+              curve[i] = Integer.parseInt(indices[i]);
+            }
+            sketchData.faceNames.add(row[1]);
+            sketchData.curves.add(curve);
+            break;
+          default:
+            break;
+        }
+      }
+    } catch (IOException iOException) {
+      // Without the design the case would run the geometry of the loaded sim
+      simulation_0.println("Could not read " + filePath + ": " + iOException.getMessage());
+      throw new RuntimeException("Could not read " + filePath, iOException);
+    }
+  }
+}
@@ -11,20 +11,34 @@ import star.flow.*;
 import star.vis.*;
 import star.meshing.*;
 
-public class post_star extends StarMacro {
+public class post_star extends CaseMacro {
   BufferedWriter bwout = null;
 
   public void execute() {
-    execute0();
+    // Results first, the optimizer only needs results.csv
     execute1();
+    execute0();
+    execute3();
+    execute4();
     execute2();
   }
 
   private void execute0() {
     Simulation simulation_0 = getActiveSimulation();
-    String outPutDir = simulation_0.getSessionDir();
+    String outPutDir = getCaseDir(simulation_0);
+
+    // "all", "none" (default) or a ";" separated list of plot and scene names
+    String exportImages = readCaseOptions(simulation_0).getOrDefault("export_images", "none");
+    if (exportImages.equals("none")) {
+      return;
+    }
+    List<String> imageNames = Arrays.asList(exportImages.split(";"));
+    boolean exportAll = exportImages.equals("all");
 
     for (StarPlot plot : simulation_0.getPlotManager().getPlots()) {
+      if (!exportAll && !imageNames.contains(plot.getPresentationName())) {
+        continue;
+      }
       plot.openInteractive();
       String filePath = outPutDir + "/" + "plot_" + plot.getPresentationName() + ".png";
       plot.encode(resolvePath(filePath), "png", 800, 600, true, true);
@@ -32,6 +46,9 @@ public class post_star extends StarMacro {
     }
 
     for (Scene scene : simulation_0.getSceneManager().getScenes()) {
+      if (!exportAll && !imageNames.contains(scene.getPresentationName())) {
+        continue;
+      }
       String filePath = outPutDir + "/" + scene.getPresentationName() + ".png";
       scene.printAndWait(resolvePath(filePath), 1, 1280, 720);
       simulation_0.println("Saved: " + filePath);
@@ -48,7 +65,7 @@ public class post_star extends StarMacro {
 
       // Open Buffered Input and Output Readers
       // Creating file with name "<sim_file_name>+report.csv"
-      BufferedWriter bwout = new BufferedWriter(new FileWriter(resolvePath(simulation_0.getSessionDir() + "/" + "results.csv")));
+      BufferedWriter bwout = new BufferedWriter(new FileWriter(resolvePath(getCaseDir(simulation_0) + "/" + "results.csv")));
       bwout.write("Report Name, Value, Unit, \n");
 
       Collection<Report> reportCollection = simulation_0.getReportManager().getObjects();
@@ -82,6 +99,13 @@ public class post_star extends StarMacro {
         }
       }
 
+      // Cell count of the volume mesh, used to estimate the memory of later cases
+      ElementCountReport elementCountReport_0 = 
+        simulation_0.getReportManager().createReport(ElementCountReport.class);
+      elementCountReport_0.getParts().setObjects(simulation_0.getRegionManager().getRegions());
+      bwout.write("cell_count, " + elementCountReport_0.getReportMonitorValue() + ", \n");
+      simulation_0.getReportManager().removeObjects(elementCountReport_0);
+
       bwout.close();
 
     } catch (IOException iOException) {
@@ -98,10 +122,95 @@ public class post_star extends StarMacro {
 
     solution_0.clearSolution(Solution.Clear.History, Solution.Clear.Fields, Solution.Clear.LagrangianDem);
 
-    MeshPipelineController meshPipelineController_0 = 
-      simulation_0.get(MeshPipelineController.class);
+    // Mesh morphing: later designs morph this mesh instead of remeshing
+    Map<String, String> caseOptions = readCaseOptions(simulation_0);
+    String caseName = caseOptions.getOrDefault("case_name", simulation_0.getPresentationName());
+    if (caseOptions.getOrDefault("keep_mesh", "false").equals("true")) {
+      if (caseOptions.getOrDefault("save_mesh", "false").equals("true")) {
+        String filePath = getCaseDir(simulation_0) + "/" + caseName + "_meshed.sim";
+        simulation_0.saveState(resolvePath(filePath));
+        simulation_0.println("Saved: " + filePath);
+      }
+    } else {
+      MeshPipelineController meshPipelineController_0 = 
+        simulation_0.get(MeshPipelineController.class);
+
+      meshPipelineController_0.clearGeneratedMeshes();
+    }
 
-    meshPipelineController_0.clearGeneratedMeshes();
+    // First case of a campaign: the later cases load this geometry and only
+    // replace the sketches that differ from it
+    if (caseOptions.getOrDefault("save_base", "false").equals("true")) {
+      String filePath = getCaseDir(simulation_0) + "/" + caseName + "_base.sim";
+      simulation_0.saveState(resolvePath(filePath));
+      simulation_0.println("Saved: " + filePath);
+    }
   }
 
+  private void execute3() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    // Keep the solved state for a deferred image export with export_images.java
+    Map<String, String> caseOptions = readCaseOptions(simulation_0);
+    if (caseOptions.getOrDefault("keep_solution", "false").equals("true")) {
+      // Only a new best design is rendered, the others keep no solved sim
+      String bestObjective = caseOptions.get("keep_solution_below");
+      if (bestObjective != null && !(ductPressureLoss(simulation_0) < Double.parseDouble(bestObjective))) {
+        simulation_0.println("Not below the best objective " + bestObjective + ", solution not kept");
+        return;
+      }
+      // Named after the case, the loaded sim may be the shared base case
+      String caseName = caseOptions.getOrDefault("case_name", simulation_0.getPresentationName());
+      String filePath = getCaseDir(simulation_0) + "/" + caseName + "_solved.sim";
+      simulation_0.saveState(resolvePath(filePath));
+      simulation_0.println("Saved: " + filePath);
+    }
+  }
+
+  // overallDuctPressureLoss as StarManager computes it from results.csv, NaN
+  // without the reports
+  private double ductPressureLoss(Simulation simulation_0) {
+    ReportManager reportManager_0 = simulation_0.getReportManager();
+    if (!reportManager_0.has("inlet_total_pressure_mca") || !reportManager_0.has("outlet_total_pressure_mca")) {
+      return Double.NaN;
+    }
+    double inletPressure = ((Report) reportManager_0.getObject("inlet_total_pressure_mca")).getReportMonitorValue();
+    double outletPressure = ((Report) reportManager_0.getObject("outlet_total_pressure_mca")).getReportMonitorValue();
+    return (inletPressure - outletPressure) / inletPressure;
+  }
+
+  private void execute4() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    // Cell-centroid field snapshot, later cases near this design start from it (warm_start.java)
+    if (!readCaseOptions(simulation_0).getOrDefault("save_snapshot", "false").equals("true")) {
+      return;
+    }
+    FieldFunctionManager fieldFunctionManager = simulation_0.getFieldFunctionManager();
+    List<FieldFunction> fieldFunctions = new ArrayList<>();
+    for (String name : new String[] {"Pressure", "Temperature", "TurbulentKineticEnergy", "SpecificDissipationRate"}) {
+      if (fieldFunctionManager.has(name)) {
+        fieldFunctions.add(fieldFunctionManager.getFunction(name));
+      }
+    }
+    if (fieldFunctionManager.has("Velocity")) {
+      PrimitiveFieldFunction velocity = (PrimitiveFieldFunction) fieldFunctionManager.getFunction("Velocity");
+      for (int component = 0; component < 3; component++) {
+        fieldFunctions.add(velocity.getComponentFunction(component));
+      }
+    }
+
+    XyzInternalTable xyzInternalTable_0 =
+      simulation_0.getTableManager().createTable(XyzInternalTable.class);
+    xyzInternalTable_0.setPresentationName("bogp_snapshot");
+    xyzInternalTable_0.setRepresentation(
+      (FvRepresentation) simulation_0.getRepresentationManager().getObject("Volume Mesh"));
+    xyzInternalTable_0.getParts().setObjects(simulation_0.getRegionManager().getRegions());
+    xyzInternalTable_0.setFieldFunctions(fieldFunctions);
+    xyzInternalTable_0.extract();
+    String filePath = getCaseDir(simulation_0) + "/" + "solution_snapshot.csv";
+    xyzInternalTable_0.export(resolvePath(filePath), ",");
+    simulation_0.getTableManager().remove(xyzInternalTable_0);
+    simulation_0.println("Saved: " + filePath);
+  }
 }
@@ -2,17 +2,24 @@
 // Written by Simcenter STAR-CCM+ 19.02.013
 package macro;
 
+import java.io.*;
 import java.util.*;
 import star.base.neo.*;
+import star.base.report.*;
 import star.cadmodeler.*;
 import star.common.*;
 import star.meshing.*;
+import star.morpher.*;
+import star.motion.*;
 
 import java.text.SimpleDateFormat;
 import java.util.Date;
 
 
-public class replace_geometry extends StarMacro {
+public class replace_geometry extends CaseMacro {
+  // Bodies replaced when case_options.csv does not list the changed ones
+  static final List<String> ALL_BODIES = Arrays.asList("inlet_section", "hex_section", "outlet_section");
+
   public void execute() {
     execute0();
   }
@@ -20,79 +27,208 @@ public class replace_geometry extends StarMacro {
   private void execute0() {
     Simulation simulation_0 = getActiveSimulation();
 
-    CadModel cadModel_0 = ((CadModel) simulation_0.get(SolidModelManager.class).getObject("HEXTestrigDuctCurvedFinsGeometry"));
-
-    star.cadmodeler.Body cadmodelerBody_0 = ((star.cadmodeler.Body) cadModel_0.getBody("inlet_section"));
+    Map<String, String> caseOptions = readCaseOptions(simulation_0);
+
+    // Small design changes: morph the mesh of the previous design instead of remeshing
+    if (caseOptions.containsKey("morph_mesh") && morphMesh(simulation_0, caseOptions)) {
+      return;
+    }
+
+    List<String> bodyNames = ALL_BODIES;
+    if (caseOptions.containsKey("replace_bodies")) {
+      bodyNames = new ArrayList<>();
+      for (String bodyName : caseOptions.get("replace_bodies").split(";")) {
+        if (!bodyName.trim().isEmpty()) {
+          bodyNames.add(bodyName.trim());
+        }
+      }
+    }
+
+    if (!bodyNames.isEmpty()) {
+      replaceParts(simulation_0, bodyNames, caseOptions);
+    } else {
+      simulation_0.println("Geometry unchanged, keeping the existing parts");
+    }
 
-    star.cadmodeler.Body cadmodelerBody_1 = ((star.cadmodeler.Body) cadModel_0.getBody("hex_section"));
+    AutoMeshOperation2d autoMeshOperation2d_0 = ((AutoMeshOperation2d) simulation_0.get(MeshOperationManager.class).getObject("Automated Mesh (2D)"));
 
-    star.cadmodeler.Body cadmodelerBody_2 = ((star.cadmodeler.Body) cadModel_0.getBody("outlet_section"));
+    autoMeshOperation2d_0.execute();
 
-    cadModel_0.createParts(new ArrayList<>(Arrays.<Body>asList(cadmodelerBody_0, cadmodelerBody_1, cadmodelerBody_2)), new ArrayList<>(Collections.<BodyGroup>emptyList()), true, false, 1, false, false, 3, "SharpEdges", 30.0, 4, true, 1.0E-5, false);
+    String timeStamp = new SimpleDateFormat("HH:mm").format(new Date());
 
-    CompositePart compositePart_0 = ((CompositePart) simulation_0.get(SimulationPartManager.class).getPart("Composite"));
+    System.out.println("[" + timeStamp + "] " + simulation_0.getPresentationName() + ": Meshing successful");
+  }
 
-    SolidModelPart solidModelPart_0 = ((SolidModelPart) compositePart_0.getChildParts().getPart("hex_section"));
+  private boolean morphMesh(Simulation simulation_0, Map<String, String> caseOptions) {
+    double minCellQuality = Double.parseDouble(caseOptions.getOrDefault("morph_min_quality", "0.01"));
+    double maxSkewness = Double.parseDouble(caseOptions.getOrDefault("morph_max_skewness", "85.0"));
+    Collection<Region> regions = simulation_0.getRegionManager().getRegions();
+
+    if (reportValue(simulation_0, ElementCountReport.class, null, regions) <= 0) {
+      writeMorphStatus(simulation_0, "remesh", "no mesh to morph");
+      return false;
+    }
+
+    // Boundary displacements (dx, dy, dz) at the curve points of the previous design
+    FileTable fileTable_0 =
+      (FileTable) simulation_0.getTableManager().createFromFile(resolvePath(caseOptions.get("morph_mesh")));
+    MotionManager motionManager_0 = simulation_0.get(MotionManager.class);
+    Motion stationary_0 = motionManager_0.getObject("Stationary");
+    MorphingMotion morphingMotion_0 = motionManager_0.createMotion(MorphingMotion.class, "Morphing");
+    Map<Solver, Boolean> frozenSolvers = new HashMap<>();
+    String failure = null;
+    try {
+      for (Region region : regions) {
+        region.getValues().get(MotionSpecification.class).setMotion(morphingMotion_0);
+        for (Boundary boundary : region.getBoundaryManager().getBoundaries()) {
+          boundary.getConditions().get(MorphingBoundaryOption.class).setSelected(MorphingBoundaryOption.Type.DISPLACEMENT);
+          DisplacementProfile displacementProfile_0 = boundary.getValues().get(DisplacementProfile.class);
+          displacementProfile_0.setMethod(XyzTabularVectorProfileMethod.class);
+          XyzTabularVectorProfileMethod method = displacementProfile_0.getMethod(XyzTabularVectorProfileMethod.class);
+          method.setTable(fileTable_0);
+          method.setXData("dx");
+          method.setYData("dy");
+          method.setZData("dz");
+        }
+      }
+
+      // One iteration with everything but the morpher frozen only moves the mesh
+      for (Solver solver : simulation_0.getSolverManager().getObjects()) {
+        if (!(solver instanceof MorpherSolver)) {
+          frozenSolvers.put(solver, solver.isFrozen());
+          solver.setFrozen(true);
+        }
+      }
+      simulation_0.getSimulationIterator().step(1);
+    } catch (Exception exception) {
+      failure = "morph failed: " + exception.getMessage();
+    } finally {
+      for (Map.Entry<Solver, Boolean> entry : frozenSolvers.entrySet()) {
+        entry.getKey().setFrozen(entry.getValue());
+      }
+      for (Region region : regions) {
+        region.getValues().get(MotionSpecification.class).setMotion(stationary_0);
+      }
+      motionManager_0.removeObjects(morphingMotion_0);
+      simulation_0.getTableManager().removeObjects(fileTable_0);
+      simulation_0.getSolution().clearSolution(Solution.Clear.History, Solution.Clear.Fields);
+    }
+
+    if (failure == null) {
+      double cellQuality = reportValue(simulation_0, MinReport.class, "CellQuality", regions);
+      double skewness = reportValue(simulation_0, MaxReport.class, "SkewnessAngle", regions);
+      if (cellQuality < minCellQuality) {
+        failure = "cell quality " + cellQuality + " < " + minCellQuality;
+      } else if (skewness > maxSkewness) {
+        failure = "skewness angle " + skewness + " > " + maxSkewness;
+      }
+    }
 
-    CadPart solidModelPart_01 = ((CadPart) compositePart_0.getChildParts().getPart("hex_section_cold"));
+    String timeStamp = new SimpleDateFormat("HH:mm").format(new Date());
+    if (failure != null) {
+      // The remesh starts from the parts, the morphed mesh is simply replaced
+      writeMorphStatus(simulation_0, "remesh", failure);
+      System.out.println("[" + timeStamp + "] " + simulation_0.getPresentationName() + ": Remeshing, " + failure);
+      return false;
+    }
+    writeMorphStatus(simulation_0, "morph", "");
+    System.out.println("[" + timeStamp + "] " + simulation_0.getPresentationName() + ": Morphing successful");
+    return true;
+  }
 
-    SolidModelPart solidModelPart_1 = ((SolidModelPart) compositePart_0.getChildParts().getPart("inlet_section"));
+  private double reportValue(Simulation simulation_0, Class<? extends Report> reportClass,
+      String fieldName, Collection<Region> regions) {
+    // Value of a temporary report over all regions
+    Report report_0 = simulation_0.getReportManager().createReport(reportClass);
+    if (fieldName != null) {
+      ((ScalarReport) report_0).setFieldFunction(simulation_0.getFieldFunctionManager().getFunction(fieldName));
+    }
+    ((PartsReport) report_0).getParts().setObjects(regions);
+    double value = report_0.getReportMonitorValue();
+    simulation_0.getReportManager().removeObjects(report_0);
+    return value;
+  }
 
-    SolidModelPart solidModelPart_2 = ((SolidModelPart) compositePart_0.getChildParts().getPart("outlet_section"));
+  private void writeMorphStatus(Simulation simulation_0, String meshUpdate, String reason) {
+    // morph_status.csv is read back by StarManager, same format as case_options.csv
+    try (BufferedWriter writer = new BufferedWriter(new FileWriter(resolvePath(getCaseDir(simulation_0) + "/" + "morph_status.csv")))) {
+      writer.write("mesh_update, " + meshUpdate + "\n");
+      writer.write("reason, " + reason + "\n");
+    } catch (IOException iOException) {
+    }
+  }
 
-    compositePart_0.getChildParts().removeObjects(solidModelPart_0, solidModelPart_01, solidModelPart_1, solidModelPart_2);
+  private void replaceParts(Simulation simulation_0, List<String> bodyNames, Map<String, String> caseOptions) {
+    CadModel cadModel_0 = ((CadModel) simulation_0.get(SolidModelManager.class).getObject("HEXTestrigDuctCurvedFinsGeometry"));
 
-    SolidModelPart solidModelPart_3 = ((SolidModelPart) simulation_0.get(SimulationPartManager.class).getPart("hex_section"));
+    List<Body> cadmodelerBodies = new ArrayList<>();
+    for (String bodyName : bodyNames) {
+      cadmodelerBodies.add((star.cadmodeler.Body) cadModel_0.getBody(bodyName));
+    }
 
-    SolidModelPart solidModelPart_4 = ((SolidModelPart) simulation_0.get(SimulationPartManager.class).getPart("inlet_section"));
+    cadModel_0.createParts(cadmodelerBodies, new ArrayList<>(Collections.<BodyGroup>emptyList()), true, false, 1, false, false, 3, "SharpEdges", 30.0, 4, true, 1.0E-5, false);
 
-    SolidModelPart solidModelPart_5 = ((SolidModelPart) simulation_0.get(SimulationPartManager.class).getPart("outlet_section"));
+    CompositePart compositePart_0 = ((CompositePart) simulation_0.get(SimulationPartManager.class).getPart("Composite"));
 
-    compositePart_0.getChildParts().reparentParts(new ArrayList<>(Arrays.<GeometryPart>asList(solidModelPart_3, solidModelPart_4, solidModelPart_5)), compositePart_0.getChildParts());
+    // The cold duplicate of the hex only has to follow when the hex itself changed
+    boolean replaceHex = bodyNames.contains("hex_section");
 
-    SolidModelPart solidModelPart_6 = ((SolidModelPart) compositePart_0.getChildParts().getPart("hex_section"));
+    List<GeometryPart> oldParts = new ArrayList<>();
+    for (String bodyName : bodyNames) {
+      oldParts.add(compositePart_0.getChildParts().getPart(bodyName));
+    }
+    if (replaceHex) {
+      oldParts.add(compositePart_0.getChildParts().getPart("hex_section_cold"));
+    }
 
-    CadPart cadPart_1 = (CadPart) solidModelPart_6.duplicatePart(compositePart_0.getChildParts());
+    compositePart_0.getChildParts().removeObjects(oldParts.toArray(new GeometryPart[0]));
 
-    cadPart_1.setPresentationName("hex_section_cold");
+    List<GeometryPart> newParts = new ArrayList<>();
+    for (String bodyName : bodyNames) {
+      newParts.add(simulation_0.get(SimulationPartManager.class).getPart(bodyName));
+    }
 
-    PrepareFor2dOperation prepareFor2dOperation_0 = ((PrepareFor2dOperation) simulation_0.get(MeshOperationManager.class).getObject("Badge for 2D Meshing"));
+    compositePart_0.getChildParts().reparentParts(newParts, compositePart_0.getChildParts());
 
-    prepareFor2dOperation_0.execute();
+    CadPart cadPart_1 = null;
+    if (replaceHex) {
+      SolidModelPart solidModelPart_6 = ((SolidModelPart) compositePart_0.getChildParts().getPart("hex_section"));
 
-    Region region_0 = simulation_0.getRegionManager().getRegion("Composite.hex_section");
+      cadPart_1 = (CadPart) solidModelPart_6.duplicatePart(compositePart_0.getChildParts());
 
-    region_0.getPartGroup().setQuery(null);
+      cadPart_1.setPresentationName("hex_section_cold");
+    }
 
-    region_0.getPartGroup().setObjects(solidModelPart_3);
+    PrepareFor2dOperation prepareFor2dOperation_0 = ((PrepareFor2dOperation) simulation_0.get(MeshOperationManager.class).getObject("Badge for 2D Meshing"));
 
-    Region region_1 = simulation_0.getRegionManager().getRegion("Composite.inlet_section");
+    prepareFor2dOperation_0.execute();
 
-    region_1.getPartGroup().setQuery(null);
+    for (String bodyName : bodyNames) {
+      Region region_0 = simulation_0.getRegionManager().getRegion("Composite." + bodyName);
 
-    region_1.getPartGroup().setObjects(solidModelPart_4);
+      region_0.getPartGroup().setQuery(null);
 
-    Region region_2 = simulation_0.getRegionManager().getRegion("Composite.outlet_section");
+      region_0.getPartGroup().setObjects(compositePart_0.getChildParts().getPart(bodyName));
+    }
 
-    region_2.getPartGroup().setQuery(null);
+    if (replaceHex) {
+      Region region_3 = simulation_0.getRegionManager().getRegion("Composite.hex_section_cold");
 
-    region_2.getPartGroup().setObjects(solidModelPart_5);
-  
-    Region region_3 = simulation_0.getRegionManager().getRegion("Composite.hex_section_cold");
+      region_3.getPartGroup().setQuery(null);
 
-    region_3.getPartGroup().setQuery(null);
+      region_3.getPartGroup().setObjects(cadPart_1);
+    }
 
-    region_3.getPartGroup().setObjects(cadPart_1);
+    // CAD models of earlier designs none of whose bodies backs a part any more,
+    // listed by StarManager, which follows the models of the sim
+    SolidModelManager solidModelManager_0 = simulation_0.get(SolidModelManager.class);
+    for (String modelName : caseOptions.getOrDefault("remove_models", "").split(";")) {
+      if (!modelName.trim().isEmpty() && solidModelManager_0.has(modelName.trim())) {
+        solidModelManager_0.removeObjects(solidModelManager_0.getObject(modelName.trim()));
+      }
+    }
 
     execute1();
-
-    AutoMeshOperation2d autoMeshOperation2d_0 = ((AutoMeshOperation2d) simulation_0.get(MeshOperationManager.class).getObject("Automated Mesh (2D)"));
-
-    autoMeshOperation2d_0.execute();
-    
-    String timeStamp = new SimpleDateFormat("HH:mm").format(new Date());
-
-    System.out.println("[" + timeStamp + "] " + simulation_0.getPresentationName() + ": Meshing successful");
   }
 
   private void execute1() {
@@ -144,5 +280,4 @@ public class replace_geometry extends StarMacro {
 
     surfaceCustomMeshControl_0.getGeometryObjects().setObjects(partSurface_0, partSurface_1, partSurface_2, partSurface_3, partSurface_4, partSurface_5);
   }
-
 }
@@ -0,0 +1,144 @@
+// STAR-CCM+ macro: warm_start.java
+// Initial conditions from the solution snapshot of a nearby converged design,
+// the snapshot is interpolated onto the new mesh by initializeSolution()
+package macro;
+
+import java.io.*;
+import java.util.*;
+import star.common.*;
+import star.energy.*;
+import star.flow.*;
+import star.kwturb.*;
+import star.turbulence.*;
+
+public class warm_start extends CaseMacro {
+
+  static final String TABLE_NAME = "bogp_warm_start";
+
+  public void execute() {
+    execute0();
+  }
+
+  private void execute0() {
+    Simulation simulation_0 = getActiveSimulation();
+
+    // A server session keeps the sim between cases: the table and the
+    // table-driven initial conditions of the previous case go first
+    resetInitialConditions(simulation_0);
+
+    // Path of the solution_snapshot.csv, written by StarManager
+    String snapshotPath = readCaseOptions(simulation_0).get("warm_start");
+    if (snapshotPath == null || !new File(resolvePath(snapshotPath)).exists()) {
+      simulation_0.println("No snapshot, constant initial conditions");
+      return;
+    }
+    List<String> columns = readColumns(resolvePath(snapshotPath));
+    FileTable fileTable_0 =
+      (FileTable) simulation_0.getTableManager().createFromFile(resolvePath(snapshotPath));
+    fileTable_0.setPresentationName(TABLE_NAME);
+
+    for (Object object : simulation_0.getContinuumManager().getObjects()) {
+      if (!(object instanceof PhysicsContinuum)) {
+        continue;
+      }
+      ConditionManager initialConditions = ((PhysicsContinuum) object).getInitialConditions();
+      setScalarProfile(initialConditions, InitialPressureProfile.class, fileTable_0, columns, "Pressure");
+      setScalarProfile(initialConditions, StaticTemperatureProfile.class, fileTable_0, columns, "Temperature");
+      setScalarProfile(initialConditions, TurbulentKineticEnergyProfile.class, fileTable_0, columns, "TurbulentKineticEnergy");
+      setScalarProfile(initialConditions, SpecificDissipationRateProfile.class, fileTable_0, columns, "SpecificDissipationRate");
+      setVelocityProfile(initialConditions, fileTable_0, columns);
+    }
+    simulation_0.println("Warm start from: " + snapshotPath);
+  }
+
+  private void resetInitialConditions(Simulation simulation_0) {
+    for (Object object : simulation_0.getContinuumManager().getObjects()) {
+      if (!(object instanceof PhysicsContinuum)) {
+        continue;
+      }
+      ConditionManager initialConditions = ((PhysicsContinuum) object).getInitialConditions();
+      for (Class<? extends ScalarProfile> profileClass : Arrays.asList(InitialPressureProfile.class,
+          StaticTemperatureProfile.class, TurbulentKineticEnergyProfile.class, SpecificDissipationRateProfile.class)) {
+        try {
+          ScalarProfile profile = initialConditions.get(profileClass);
+          if (profile.getMethod() instanceof XyzTabularScalarProfileMethod) {
+            profile.setMethod(ConstantScalarProfileMethod.class);
+          }
+        } catch (Exception exception) {
+          // The physics of this continuum has no such initial condition
+        }
+      }
+      try {
+        VelocityProfile profile = initialConditions.get(VelocityProfile.class);
+        if (profile.getMethod() instanceof XyzTabularVectorProfileMethod) {
+          profile.setMethod(ConstantVectorProfileMethod.class);
+        }
+      } catch (Exception exception) {
+      }
+    }
+    TableManager tableManager_0 = simulation_0.getTableManager();
+    if (tableManager_0.has(TABLE_NAME)) {
+      tableManager_0.removeObjects(tableManager_0.getObject(TABLE_NAME));
+    }
+  }
+
+  private void setScalarProfile(ConditionManager initialConditions, Class<? extends ScalarProfile> profileClass,
+      FileTable fileTable_0, List<String> columns, String fieldName) {
+    String column = findColumn(columns, fieldName);
+    if (column == null) {
+      return;
+    }
+    try {
+      ScalarProfile profile = initialConditions.get(profileClass);
+      profile.setMethod(XyzTabularScalarProfileMethod.class);
+      XyzTabularScalarProfileMethod method = profile.getMethod(XyzTabularScalarProfileMethod.class);
+      method.setTable(fileTable_0);
+      method.setData(column);
+    } catch (Exception exception) {
+      // The physics of this continuum has no such initial condition
+    }
+  }
+
+  private void setVelocityProfile(ConditionManager initialConditions, FileTable fileTable_0, List<String> columns) {
+    String[] components = {
+      findColumn(columns, "Velocity[i]"), findColumn(columns, "Velocity[j]"), findColumn(columns, "Velocity[k]")
+    };
+    if (components[0] == null || components[1] == null || components[2] == null) {
+      return;
+    }
+    try {
+      VelocityProfile profile = initialConditions.get(VelocityProfile.class);
+      profile.setMethod(XyzTabularVectorProfileMethod.class);
+      XyzTabularVectorProfileMethod method = profile.getMethod(XyzTabularVectorProfileMethod.class);
+      method.setTable(fileTable_0);
+      method.setXData(components[0]);
+      method.setYData(components[1]);
+      method.setZData(components[2]);
+    } catch (Exception exception) {
+    }
+  }
+
+  private String findColumn(List<String> columns, String fieldName) {
+    // Exported column names carry the unit, e.g. "Pressure (Pa)"
+    for (String column : columns) {
+      if (column.equals(fieldName) || column.startsWith(fieldName + " ")) {
+        return column;
+      }
+    }
+    return null;
+  }
+
+  private List<String> readColumns(String filePath) {
+    List<String> columns = new ArrayList<>();
+    try (BufferedReader reader = new BufferedReader(new FileReader(filePath))) {
+      String header = reader.readLine();
+      if (header != null) {
+        for (String column : header.split(",")) {
+          columns.add(column.replace("\"", "").trim());
+        }
+      }
+    } catch (IOException iOException) {
+    }
+    return columns;
+  }
+}
@@ -0,0 +1,120 @@
+###################################################
+# Runs a case as an asyncio subprocess with
+#  streamed, rotating logs
+###################################################
+#
+# Runs the STAR command of a case as an asyncio subprocess (no shell), so
+# one process can follow many cases. stdout and stderr are streamed line by
+# line into rotating, gzipped and indexed logs (starRunner.case_log). Its
+# peak memory and CPU time are sampled from /proc as by the local executor.
+#
+
+import asyncio
+import os
+import signal
+import time
+from pathlib import Path
+
+from starRunner.case_log import CaseLogWriter
+from starRunner.executors import CaseJob, recordUsage, stopProcessGroup
+from starRunner.memory_model import processGroupsUsage
+
+LOG_BACKUP_COUNT = 3
+
+
+async def streamToLog(stream: asyncio.StreamReader, logPath: Path, **logOptions):
+    logOptions.setdefault("backupCount", LOG_BACKUP_COUNT)
+    writer = CaseLogWriter(logPath, **logOptions)
+    try:
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            writer.write(line)
+    finally:
+        writer.close()
+
+
+async def runCaseJob(
+    job: CaseJob, watchdog=None, watchInterval=30.0, sampleInterval=0.25, **logOptions
+):
+    """
+    Run the job to completion, the CaseJob fields are updated as by the executors.
+    With a watchdog (starRunner.watchdog.Watchdog) the run is stopped when it
+    times out, hangs or waits for a license, and retried with a backoff.
+    """
+    while True:
+        job.reason = None
+        await runCaseOnce(job, watchdog, watchInterval, sampleInterval, **logOptions)
+        if job.returncode != 0 and watchdog is not None:
+            if job.reason is None:
+                job.reason = watchdog.classifyFailure(job)
+            if watchdog.shouldRetry(job, job.reason):
+                delay = watchdog.retryDelay(job)
+                job.attempt += 1
+                job.status = "pending"
+                await asyncio.sleep(delay)
+                continue
+        return job
+
+
+async def runCaseOnce(job: CaseJob, watchdog, watchInterval, sampleInterval, **logOptions):
+    env = None
+    if job.env is not None:
+        env = os.environ.copy()
+        env.update(job.env)
+    job.startTime = time.time()
+    job.status = "running"
+    proc = await asyncio.create_subprocess_exec(
+        *job.command,
+        cwd=job.cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=os.name == "posix",
+    )
+    job.info["pid"] = proc.pid
+
+    async def stop():
+        # The whole group, children of STAR would otherwise keep the pipes open
+        stopProcessGroup(proc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(proc.wait(), 30)
+        except asyncio.TimeoutError:
+            stopProcessGroup(proc, signal.SIGKILL)
+            await proc.wait()
+
+    async def watch():
+        while True:
+            await asyncio.sleep(watchInterval)
+            reason = watchdog.check(job)
+            if reason is not None:
+                job.reason = reason
+                await stop()
+                return
+
+    async def sample():
+        # The process high-water marks keep the peak reached between two samples
+        while True:
+            recordUsage(job, *processGroupsUsage([proc.pid]).get(proc.pid, (0, 0, 0.0)))
+            await asyncio.sleep(sampleInterval)
+
+    watcher = asyncio.create_task(watch()) if watchdog is not None else None
+    sampler = asyncio.create_task(sample()) if os.name == "posix" else None
+    try:
+        await asyncio.gather(
+            streamToLog(proc.stdout, job.stdoutPath, **logOptions),
+            streamToLog(proc.stderr, job.stderrPath, **logOptions),
+        )
+        job.returncode = await proc.wait()
+    except asyncio.CancelledError:
+        await stop()
+        job.returncode = proc.returncode
+        job.reason = "cancelled"
+        raise
+    finally:
+        for task in (watcher, sampler):
+            if task is not None:
+                task.cancel()
+        job.endTime = time.time()
+        job.status = "done" if job.returncode == 0 else "failed"
@@ -0,0 +1,158 @@
+###################################################
+# Calibration of the cores per case against the
+#  number of concurrent cases
+###################################################
+#
+# Calibration of the core split: for each -np value a full node's worth of
+# representative designs (coreBudget // np cases) is run concurrently, and
+# the split with the most designs per hour is written to calibration.json,
+# which driver_BOGP.py picks up:
+#   python -m starRunner.calibration --cores 16 --np 1 2 4 8
+#
+
+import argparse
+import json
+import time
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from starRunner.executors import LocalPoolExecutor
+
+
+def representativeDesigns(path2gpList: Path, nDesigns: int, seed=0):
+    """Evaluated designs from gpList.dat, topped up with random ones."""
+    from gpOptim import gpOpt_TBL as X
+
+    designs = []
+    if Path(path2gpList).is_file():
+        xList, _ = X.read_available_GPsamples(path2gpList, X.nPar)
+        designs = list(xList[:nDesigns])
+    rng = np.random.default_rng(seed)
+    while len(designs) < nDesigns:
+        designs.append(np.array([rng.uniform(low, high) for low, high in X.qBound]))
+    return designs
+
+
+class CoreCalibration:
+    def __init__(
+        self,
+        coreBudget: int,
+        npValues: list[int],
+        calibrationPath: Path,
+        refFilesPath: Path,
+        designs: list,
+        STARCCMPath=None,
+    ):
+        self.coreBudget = coreBudget
+        self.npValues = [nProcs for nProcs in npValues if nProcs <= coreBudget]
+        self.calibrationPath = Path(calibrationPath)
+        self.refFilesPath = Path(refFilesPath)
+        self.designs = designs
+        self.STARCCMPath = STARCCMPath
+        self.runs = []
+
+    def run(self):
+        from case_config import StarManager
+
+        self.calibrationPath.mkdir(parents=True, exist_ok=True)
+        splits = []
+        for nProcs in self.npValues:
+            nCases = self.coreBudget // nProcs
+            self.__print(f"-np {nProcs}: {nCases} concurrent cases")
+            executor = LocalPoolExecutor(nCases * nProcs)
+            managers = []
+            for k in range(nCases):
+                manager = StarManager()
+                manager.nCPUs = nProcs
+                manager.executor = executor
+                if self.STARCCMPath is not None:
+                    manager.STARCCMPath = self.STARCCMPath
+                manager.prepareCase(
+                    f"calib_np{nProcs}_{k}",
+                    self.designs[k % len(self.designs)],
+                    self.calibrationPath,
+                    self.refFilesPath,
+                )
+                managers.append(manager)
+            startTime = time.time()
+            for manager in managers:
+                manager.submitCase()
+            while executor.activeJobs():
+                executor.waitAny()
+            makespan = time.time() - startTime
+
+            nConverged = 0
+            for manager in managers:
+                objective = manager.collectResults()
+                converged = manager.job.status == "done" and objective != 1
+                nConverged += converged
+                self.runs.append(
+                    {
+                        "np": nProcs,
+                        "case": manager.caseName,
+                        "runtime": manager.job.runtime(),
+                        "converged": converged,
+                    }
+                )
+            designsPerHour = nConverged * 3600.0 / makespan
+            splits.append(
+                {
+                    "nCPUs": nProcs,
+                    "nConcurrentCases": nCases,
+                    "makespan": makespan,
+                    "designsPerHour": designsPerHour,
+                }
+            )
+            self.__print(f"-np {nProcs}: {designsPerHour:.2f} designs/h")
+
+        best = max(splits, key=lambda split: split["designsPerHour"])
+        result = {
+            "coreBudget": self.coreBudget,
+            "nCPUs": best["nCPUs"],
+            "nConcurrentCases": best["nConcurrentCases"],
+            "designsPerHour": best["designsPerHour"],
+            "splits": splits,
+        }
+        pd.DataFrame(self.runs).to_csv(self.calibrationPath / "runs.csv", index=False)
+        with open(self.calibrationPath.parent / "calibration.json", "w") as resultFile:
+            json.dump(result, resultFile, indent=2)
+        self.__print(
+            f"Best split: {best['nConcurrentCases']} cases x {best['nCPUs']} cores"
+        )
+        return result
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] CoreCalibration: {string}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure designs per hour for several core splits"
+    )
+    parser.add_argument("--cores", type=int, required=True, help="core budget")
+    parser.add_argument("--np", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--designs", type=int, default=2, help="distinct designs")
+    parser.add_argument("--cfd", type=Path, default=Path.cwd() / "cfd")
+    parser.add_argument("--refFiles", type=Path, default=Path.cwd() / "refFiles")
+    parser.add_argument(
+        "--gpList", type=Path, default=Path.cwd() / "gpOptim/workDir/gpList.dat"
+    )
+    parser.add_argument("--starccm", default=None, help="starccm+ command")
+    args = parser.parse_args()
+
+    CoreCalibration(
+        args.cores,
+        args.np,
+        args.cfd / "calibration",
+        args.refFiles,
+        representativeDesigns(args.gpList, args.designs),
+        STARCCMPath=args.starccm,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+###################################################
+# Streaming, rotating and indexed case logs
+###################################################
+#
+# Streaming case logs. The solver output is written to CFD_out.txt until it
+# reaches maxBytes, then that part is gzipped to CFD_out.txt.<n>.gz and
+# CFD_out.txt starts over, so the live file only holds the latest output.
+# The byte offset of every monitor header and iteration row goes to
+# CFD_out.txt.idx, which lets iterMonitorRecords / tailMonitorRecords
+# yield parsed residual and report values without reading the whole log.
+# StarManager runs STAR behind the command line form. It writes to its own
+# stdout file, so executors, batch scripts and scratch.py work unchanged:
+#   case_log.py --log cfd/case_1/CFD_out.txt -- starccm+ -load ...
+# Standard library only, it runs on the compute node as is.
+#
+
+import argparse
+import gzip
+import os
+import re
+import signal
+import stat
+import subprocess
+import sys
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+LOG_MAX_BYTES = 50 * 1024**2
+INDEX_SUFFIX = ".idx"
+HEADER_KEY = "H"
+
+# STAR prints the monitors as a table: a header line "Iteration  Continuity
+# ..." repeated now and then, and one row of numbers per iteration
+MONITOR_HEADER = re.compile(rb"^\s*Iteration\s")
+MONITOR_ROW = re.compile(rb"^\s*\d+(\s+[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?)+\s*$")
+
+
+@dataclass
+class MonitorRecord:
+    iteration: int
+    # Column name of the monitor table -> value, residuals and reports alike
+    values: dict
+
+
+class CaseLogWriter:
+    """
+    Writes log lines to logPath, or to fd if it is an open file of logPath
+    (the stdout of the wrapper). Rotation needs a regular file, other fds
+    (pipes) just get the lines. backupCount limits the gzipped segments kept.
+    """
+
+    def __init__(self, logPath: Path, maxBytes=LOG_MAX_BYTES, backupCount=None, fd=None):
+        self.logPath = Path(logPath)
+        self.maxBytes = maxBytes
+        self.backupCount = backupCount
+        self.ownsFd = fd is None
+        if fd is None:
+            fd = os.open(self.logPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.fd = fd
+        fdStat = os.fstat(fd)
+        self.rotating = (
+            stat.S_ISREG(fdStat.st_mode)
+            and self.logPath.exists()
+            and os.path.samestat(fdStat, os.stat(self.logPath))
+        )
+        self.segment = 1
+        self.size = 0
+        self.indexFile = None
+        if self.rotating:
+            # Left from an earlier attempt of the case
+            for segmentPath in self.logPath.parent.glob(self.logPath.name + ".*.gz"):
+                segmentPath.unlink()
+            Path(str(self.logPath) + INDEX_SUFFIX).unlink(missing_ok=True)
+
+    def write(self, line: bytes):
+        if not self.rotating:
+            os.write(self.fd, line)
+            return
+        if self.size > 0 and self.size + len(line) > self.maxBytes:
+            self.__rollover()
+        if MONITOR_HEADER.match(line):
+            self.__index(HEADER_KEY)
+        elif MONITOR_ROW.match(line):
+            self.__index(int(line.split(None, 1)[0]))
+        os.write(self.fd, line)
+        self.size += len(line)
+
+    def close(self):
+        if self.indexFile is not None:
+            self.indexFile.close()
+            self.indexFile = None
+        if self.ownsFd:
+            os.close(self.fd)
+
+    def __index(self, key):
+        if self.indexFile is None:
+            self.indexFile = open(str(self.logPath) + INDEX_SUFFIX, "w")
+        # Flushed per entry, readers follow a running case
+        self.indexFile.write(f"{key},{self.segment},{self.size}\n")
+        self.indexFile.flush()
+
+    def __rollover(self):
+        segmentPath = Path(f"{self.logPath}.{self.segment}.gz")
+        tmpPath = segmentPath.with_name(segmentPath.name + ".part")
+        with open(self.logPath, "rb") as source, gzip.open(tmpPath, "wb") as target:
+            while chunk := source.read(1024**2):
+                target.write(chunk)
+        os.replace(tmpPath, segmentPath)
+        # Same open file as the executor's, its offset goes back to the start too
+        os.ftruncate(self.fd, 0)
+        os.lseek(self.fd, 0, os.SEEK_SET)
+        self.segment += 1
+        self.size = 0
+        if self.backupCount is not None:
+            oldPath = Path(f"{self.logPath}.{self.segment - 1 - self.backupCount}.gz")
+            oldPath.unlink(missing_ok=True)
+
+
+def logSegments(logPath: Path) -> dict:
+    """Segment number -> path, the gzipped parts and the live log last."""
+    logPath = Path(logPath)
+    segments = {}
+    for segmentPath in logPath.parent.glob(logPath.name + ".*.gz"):
+        number = segmentPath.name[len(logPath.name) + 1 : -len(".gz")]
+        if number.isdigit():
+            segments[int(number)] = segmentPath
+    live = logPath if logPath.is_file() else Path(str(logPath) + ".gz")
+    if live.is_file():
+        segments[max(segments, default=0) + 1] = live
+    return dict(sorted(segments.items()))
+
+
+def openSegment(segmentPath: Path):
+    if segmentPath.suffix == ".gz":
+        return gzip.open(segmentPath, "rb")
+    return open(segmentPath, "rb")
+
+
+def parseRow(header: bytes, row: bytes) -> MonitorRecord:
+    """Columns are right aligned: each name ends where its value ends."""
+    header = header.decode(errors="replace").rstrip()
+    row = row.decode(errors="replace").rstrip()
+    tokens = list(re.finditer(r"\S+", row))
+    names, start = [], 0
+    for token in tokens:
+        names.append(header[start : token.end()].strip())
+        start = token.end()
+    if len(set(names)) != len(names) or "" in names:
+        # Not aligned after all, names without spaces split as well
+        names = header.split()
+    values = {}
+    for name, token in zip(names[1:], tokens[1:]):
+        values[name] = float(token.group())
+    return MonitorRecord(int(tokens[0].group()), values)
+
+
+def readIndex(logPath: Path):
+    """(key, segment, offset) entries of the index, none if there is no index."""
+    indexPath = Path(str(logPath) + INDEX_SUFFIX)
+    if not indexPath.is_file():
+        return
+    with open(indexPath) as indexFile:
+        for line in indexFile:
+            entry = line.strip().split(",")
+            if len(entry) == 3:
+                key = entry[0] if entry[0] == HEADER_KEY else int(entry[0])
+                yield key, int(entry[1]), int(entry[2])
+
+
+def iterMonitorRecords(logPath: Path, fromIteration=None):
+    """
+    Yield the MonitorRecords of the log in order, from fromIteration on if
+    given: reading starts at the header before it, found through the index.
+    """
+    segments = logSegments(logPath)
+    startSegment, startOffset = min(segments, default=1), 0
+    if fromIteration is not None:
+        header = None
+        for key, segment, offset in readIndex(logPath):
+            if key == HEADER_KEY:
+                header = (segment, offset)
+            elif key >= fromIteration:
+                break
+        if header is not None and header[0] in segments:
+            startSegment, startOffset = header
+
+    header = None
+    for number, segmentPath in segments.items():
+        if number < startSegment:
+            continue
+        with openSegment(segmentPath) as segmentFile:
+            if number == startSegment:
+                segmentFile.seek(startOffset)
+            for line in segmentFile:
+                if MONITOR_HEADER.match(line):
+                    header = line
+                elif header is not None and MONITOR_ROW.match(line):
+                    record = parseRow(header, line)
+                    if fromIteration is None or record.iteration >= fromIteration:
+                        yield record
+
+
+def tailMonitorRecords(logPath: Path, n=10) -> list[MonitorRecord]:
+    """The last n MonitorRecords, each read at its indexed offset."""
+    segments = logSegments(logPath)
+    entries = deque(maxlen=n)
+    header = None
+    for key, segment, offset in readIndex(logPath):
+        if key == HEADER_KEY:
+            header = (segment, offset)
+        elif header is not None:
+            entries.append((header, (segment, offset)))
+    if not entries:
+        # No index (e.g. an old log): stream it all
+        return list(deque(iterMonitorRecords(logPath), maxlen=n))
+
+    records, headerCache = [], {}
+    for header, row in entries:
+        if header[0] not in segments or row[0] not in segments:
+            continue
+        if header not in headerCache:
+            headerCache[header] = readLineAt(segments[header[0]], header[1])
+        records.append(parseRow(headerCache[header], readLineAt(segments[row[0]], row[1])))
+    return records
+
+
+def readLineAt(segmentPath: Path, offset: int) -> bytes:
+    with openSegment(segmentPath) as segmentFile:
+        segmentFile.seek(offset)
+        return segmentFile.readline()
+
+
+def run(args) -> int:
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    writer = CaseLogWriter(
+        args.log, maxBytes=args.maxBytes, backupCount=args.backupCount, fd=sys.stdout.fileno()
+    )
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE)
+
+    def stop(signum, frame):
+        # Reading goes on until STAR has closed its output
+        if proc.poll() is None:
+            proc.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for line in proc.stdout:
+            writer.write(line)
+    finally:
+        writer.close()
+    return proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rotate, compress and index a case log")
+    parser.add_argument("--log", required=True, help="path of the stdout file")
+    parser.add_argument("--maxBytes", type=int, default=LOG_MAX_BYTES)
+    parser.add_argument("--backupCount", type=int, default=None)
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
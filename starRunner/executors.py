@@ -0,0 +1,583 @@
+###################################################
+# Case executors: local process pool and batch
+#  scheduler backends
+###################################################
+#
+# Case executors: run the STAR-CCM+ command of a case either as local
+# processes under a total-core limit, or as jobs on a batch scheduler.
+#
+
+import math
+import os
+import re
+import shlex
+import signal
+import socket
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from datetime import datetime
+
+from starRunner.memory_model import processGroupsUsage
+
+
+def stopProcessGroup(proc, sig):
+    """Signal the process group started with start_new_session, or the process."""
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+    elif sig == signal.SIGTERM:
+        proc.terminate()
+    else:
+        proc.kill()
+
+
+def recordUsage(job, rss, peak, cpu):
+    """Fold a usage sample of processGroupsUsage into the job."""
+    if rss:
+        job.info["rss"] = rss
+    if peak:
+        job.peakRSS = max(job.peakRSS or 0, peak)
+    if cpu:
+        job.cpuTime = max(job.cpuTime or 0.0, cpu)
+
+
+@dataclass(eq=False)
+class CaseJob:
+    name: str
+    command: list[str]
+    cwd: Path
+    stdoutPath: Path
+    stderrPath: Path
+    nCPUs: int = 1
+    env: dict = None
+    # Set by the executor
+    # pending, queued (batch job waiting for its nodes), running, done, failed
+    status: str = "pending"
+    # Why the job was stopped or failed: timeout, hung, license, transient, cancelled
+    reason: str = None
+    attempt: int = 1
+    # Largest resident memory of the case's processes, bytes
+    peakRSS: int = None
+    # CPU seconds of the case's processes at the last sample
+    cpuTime: float = None
+    returncode: int = None
+    startTime: float = None
+    endTime: float = None
+    info: dict = field(default_factory=dict)
+
+    def isFinished(self):
+        return self.status in ("done", "failed")
+
+    def runtime(self):
+        if self.startTime is None or self.endTime is None:
+            return None
+        return self.endTime - self.startTime
+
+
+class CaseExecutor:
+    """
+    Base class. submit() queues a job and returns immediately, poll() advances the
+    executor and returns the jobs that finished since the last call.
+    With a watchdog (starRunner.watchdog.Watchdog) running jobs are stopped when
+    they time out, hang or wait for a license, and retried with a backoff.
+    """
+
+    pollInterval = 5.0
+
+    def __init__(self, watchdog=None):
+        self.jobs = []
+        self.reported = set()
+        self.watchdog = watchdog
+        # Called with the job each time it is started, e.g. to journal its pid
+        self.onStart = None
+
+    def submit(self, job: CaseJob) -> CaseJob:
+        self.jobs.append(job)
+        self._update()
+        return job
+
+    def adopt(self, job: CaseJob) -> CaseJob:
+        """
+        Track a running job started by an earlier driver process, e.g. after a
+        restart. job.info holds what the executor needs to find it (pid, jobId).
+        """
+        job.status = "running"
+        if job.startTime is None:
+            job.startTime = time.time()
+        self.jobs.append(job)
+        self._print(f"{job.name} reattached")
+        return job
+
+    def isAlive(self, job: CaseJob) -> bool:
+        """Is the run described by job.info still going on?"""
+        return False
+
+    def poll(self) -> list[CaseJob]:
+        self._update()
+        finished = [
+            job
+            for job in self.jobs
+            if job.isFinished() and id(job) not in self.reported
+        ]
+        self.reported.update(id(job) for job in finished)
+        return finished
+
+    def waitAny(self) -> list[CaseJob]:
+        """Block until at least one job finishes, or nothing is left to wait for."""
+        while True:
+            finished = self.poll()
+            if finished or not self.activeJobs():
+                return finished
+            time.sleep(self.pollInterval)
+
+    def wait(self, job: CaseJob) -> int:
+        while not job.isFinished():
+            self._update()
+            if not job.isFinished():
+                time.sleep(self.pollInterval)
+        self.reported.add(id(job))
+        return job.returncode
+
+    def cancel(self, job: CaseJob):
+        """
+        Stop the job, it finishes as cancelled and is not retried. Only flags it,
+        so it may be called from another thread: the next update stops it.
+        """
+        job.info["cancelRequested"] = True
+
+    def activeJobs(self) -> list[CaseJob]:
+        return [job for job in self.jobs if not job.isFinished()]
+
+    def shutdown(self):
+        pass
+
+    def _update(self):
+        raise NotImplementedError
+
+    def _kill(self, job: CaseJob):
+        raise NotImplementedError
+
+    def _applyCancels(self):
+        for job in self.jobs:
+            if job.isFinished() or not job.info.pop("cancelRequested", False):
+                continue
+            if job.status != "pending":
+                self._kill(job)
+            self._finish(job, -15, "cancelled")
+
+    def _isReady(self, job: CaseJob):
+        """A pending job waiting for its retry backoff is not started yet."""
+        return time.time() >= job.info.get("notBefore", 0.0)
+
+    def _watch(self, job: CaseJob):
+        """Returns True if the watchdog stopped the running job."""
+        if self.watchdog is None:
+            return False
+        reason = self.watchdog.check(job)
+        if reason is None:
+            return False
+        self._print(f"{job.name} stopped by the watchdog: {reason}")
+        self._kill(job)
+        self._finish(job, -9, reason)
+        return True
+
+    def _finish(self, job: CaseJob, returncode, reason=None, endTime=None):
+        job.returncode = returncode
+        job.endTime = time.time() if endTime is None else endTime
+        if returncode != 0 and reason is None and self.watchdog is not None:
+            reason = self.watchdog.classifyFailure(job)
+        job.reason = reason
+        if (
+            returncode != 0
+            and self.watchdog is not None
+            and self.watchdog.shouldRetry(job, reason)
+        ):
+            delay = self.watchdog.retryDelay(job)
+            self._print(
+                f"{job.name} failed ({reason}), retry {job.attempt} in {delay:.0f} s"
+            )
+            job.attempt += 1
+            job.info["notBefore"] = time.time() + delay
+            job.status = "pending"
+            return
+        job.status = "done" if returncode == 0 else "failed"
+        self._print(
+            f"{job.name} finished with code {returncode}"
+            + (f" ({reason})" if reason else "")
+        )
+
+    def _started(self, job: CaseJob):
+        if self.onStart is not None:
+            self.onStart(job)
+
+    def _print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] {type(self).__name__}: {string}")
+
+
+class LocalPoolExecutor(CaseExecutor):
+    """
+    Runs up to totalCores worth of cases concurrently as local processes, each
+    case taking job.nCPUs cores. A case larger than totalCores runs alone.
+    With a memoryModel (starRunner.memory_model.MemoryModel) a case is only
+    started if its estimated peak memory fits in what the node has available,
+    less what the running cases may still grow to. A job.info["cellCount"], where
+    the mesh size is known beforehand, sharpens that estimate.
+    """
+
+    pollInterval = 1.0
+    # Memory and CPU of the running cases are sampled in a thread of their own, so
+    # short cases and cases ending while the driver is busy are not missed
+    sampleInterval = 0.25
+
+    def __init__(self, totalCores: int, watchdog=None, memoryModel=None):
+        super().__init__(watchdog)
+        self.totalCores = totalCores
+        self.memoryModel = memoryModel
+        self.procs = {}
+        self.__stopSampling = threading.Event()
+        self.__samplerLock = threading.Lock()
+        self.__sampler = None
+
+    def usedCores(self):
+        return sum(job.nCPUs for job in self.jobs if job.status == "running")
+
+    def _canStart(self, job: CaseJob):
+        usedCores = self.usedCores()
+        if usedCores == 0:
+            return True
+        return usedCores + job.nCPUs <= self.totalCores and self._fitsInMemory(job)
+
+    def _fitsInMemory(self, job: CaseJob):
+        if self.memoryModel is None:
+            return True
+        running = [other for other in self.jobs if other.status == "running"]
+        return self.memoryModel.fits(job, running)
+
+    def __startSampling(self):
+        # One thread while cases run, it ends when none is left
+        if os.name != "posix":
+            return
+        with self.__samplerLock:
+            if self.__sampler is None:
+                self.__sampler = threading.Thread(target=self.__sampleLoop, daemon=True)
+                self.__sampler.start()
+
+    def __sampleLoop(self):
+        while not self.__stopSampling.wait(self.sampleInterval):
+            with self.__samplerLock:
+                if not any(job.status == "running" for job in list(self.jobs)):
+                    self.__sampler = None
+                    return
+            self.__sampleMemory()
+
+    def __sampleMemory(self):
+        running = [job for job in list(self.jobs) if job.status == "running"]
+        usage = processGroupsUsage([job.info["pid"] for job in running])
+        for job in running:
+            recordUsage(job, *usage.get(job.info["pid"], (0, 0, 0.0)))
+
+    def adopt(self, job: CaseJob) -> CaseJob:
+        job.info.setdefault("rss", 0)
+        if self.memoryModel is not None:
+            self.memoryModel.jobEstimate(job)
+        super().adopt(job)
+        self.__startSampling()
+        return job
+
+    def isAlive(self, job: CaseJob) -> bool:
+        if job.info.get("host") != socket.gethostname() or "pid" not in job.info:
+            return False
+        try:
+            os.kill(job.info["pid"], 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _update(self):
+        self._applyCancels()
+        for job in self.jobs:
+            if job.status == "running":
+                if id(job) in self.procs:
+                    returncode = self.__reap(job)
+                else:
+                    returncode = self.__adoptedReturncode(job)
+                if returncode is not None:
+                    self.__close(job)
+                    self._finish(job, returncode)
+                else:
+                    self._watch(job)
+
+        # Start pending jobs in submission order while cores are free
+        for job in self.jobs:
+            if job.status == "pending" and self._isReady(job):
+                if not self._canStart(job):
+                    break
+                self.__start(job)
+
+    def __start(self, job: CaseJob):
+        stdout = open(job.stdoutPath, "w")
+        stderr = open(job.stderrPath, "w")
+        env = None
+        if job.env is not None:
+            env = os.environ.copy()
+            env.update(job.env)
+        # A process group of its own, so stopping the case reaches the MPI ranks
+        proc = subprocess.Popen(
+            job.command,
+            stdout=stdout,
+            stderr=stderr,
+            cwd=job.cwd,
+            env=env,
+            start_new_session=os.name == "posix",
+        )
+        self.procs[id(job)] = proc
+        job.info["files"] = (stdout, stderr)
+        job.info["pid"] = proc.pid
+        job.info["host"] = socket.gethostname()
+        job.info["rss"] = 0
+        if self.memoryModel is not None:
+            # Fixed at the start, later estimates may differ
+            self.memoryModel.jobEstimate(job)
+        job.startTime = time.time()
+        job.status = "running"
+        self._print(f"{job.name} started on {job.nCPUs} cores (pid {proc.pid})")
+        self.__startSampling()
+        self._started(job)
+
+    def __reap(self, job: CaseJob):
+        """Exit code of the case, None while it runs. Records its CPU time on exit."""
+        proc = self.procs[id(job)]
+        if os.name != "posix" or proc.returncode is not None:
+            return proc.poll()
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            return proc.poll()
+        if pid == 0:
+            return None
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        # All CPU time of the case, MPI ranks included. Not ru_maxrss: it also
+        # counts the driver's memory the child had before its exec
+        recordUsage(job, 0, 0, rusage.ru_utime + rusage.ru_stime)
+        return proc.returncode
+
+    def __adoptedReturncode(self, job: CaseJob):
+        # Not our child, so its exit status is unknown: judge by the results
+        if self.isAlive(job):
+            return None
+        resultsPath = Path(job.cwd) / "results.csv"
+        if resultsPath.is_file() and resultsPath.stat().st_mtime >= job.startTime:
+            return 0
+        return 1
+
+    def __close(self, job: CaseJob):
+        for file in job.info.pop("files", ()):
+            file.close()
+        self.procs.pop(id(job), None)
+
+    def _kill(self, job: CaseJob):
+        if id(job) not in self.procs:
+            # Adopted, only its process group is known
+            for sig in (signal.SIGTERM, signal.SIGKILL):
+                try:
+                    os.killpg(job.info["pid"], sig)
+                except ProcessLookupError:
+                    break
+                deadline = time.time() + 30
+                while self.isAlive(job) and time.time() < deadline:
+                    time.sleep(0.5)
+            self.__close(job)
+            return
+        proc = self.procs[id(job)]
+        stopProcessGroup(proc, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            stopProcessGroup(proc, signal.SIGKILL)
+            proc.wait()
+        self.__close(job)
+
+    def shutdown(self):
+        self.__stopSampling.set()
+        for job in self.jobs:
+            if job.status == "running":
+                self._kill(job)
+                self._finish(job, -15, "cancelled")
+
+
+class BatchSchedulerExecutor(CaseExecutor):
+    """
+    Submits each case as a job script and polls for completion, so no process is
+    held per case. The job script writes its start and end times to job.started and
+    job.finished and its exit code to job.exitcode in the case directory; a job that
+    left the queue without writing the exit code has failed. Until job.started
+    appears the job is only queued: the watchdog limits count from the actual start,
+    and the runtime is the solver time alone, neither queue wait nor poll delay.
+
+    With a memoryModel the job requests its estimated peak memory from the
+    scheduler (memoryDirective), which then only places it where that is free.
+
+    The defaults are for Slurm. For PBS use e.g.
+        submitCommand="qsub", statusCommand="qstat {jobId}",
+        memoryDirective="#PBS -l mem={memoryMB}mb"
+    """
+
+    pollInterval = 30.0
+    jobScriptTemplate = """#!/bin/bash
+{directives}
+cd {cwd}
+date +%s.%N > {startedPath}
+{exports}{command} > {stdout} 2> {stderr}
+exitcode=$?
+date +%s.%N > {finishedPath}
+echo $exitcode > {exitcodePath}
+"""
+
+    def __init__(
+        self,
+        submitCommand="sbatch",
+        statusCommand="squeue -h -j {jobId}",
+        cancelCommand="scancel {jobId}",
+        directives="#SBATCH --job-name={name}\n#SBATCH --ntasks={nCPUs}",
+        watchdog=None,
+        memoryModel=None,
+        memoryDirective="#SBATCH --mem={memoryMB}M",
+    ):
+        super().__init__(watchdog)
+        self.submitCommand = submitCommand
+        self.statusCommand = statusCommand
+        self.cancelCommand = cancelCommand
+        self.directives = directives
+        self.memoryModel = memoryModel
+        self.memoryDirective = memoryDirective
+
+    def _update(self):
+        self._applyCancels()
+        for job in self.jobs:
+            if job.status == "pending" and self._isReady(job):
+                self.__submitJob(job)
+            elif job.status in ("queued", "running"):
+                exitcodePath = Path(job.cwd) / "job.exitcode"
+                if job.status == "queued":
+                    self.__checkStarted(job)
+                if exitcodePath.is_file():
+                    content = exitcodePath.read_text().strip()
+                    self._finish(
+                        job,
+                        int(content) if content else 1,
+                        endTime=self.__readTimestamp(Path(job.cwd) / "job.finished"),
+                    )
+                elif not self.__isQueued(job):
+                    # Check once more, the job may have finished since the first look
+                    if not exitcodePath.is_file():
+                        self._finish(job, -1)
+                elif job.status == "running":
+                    self._watch(job)
+
+    def __readTimestamp(self, markerPath: Path):
+        """Time written by the job script, None if the marker is missing."""
+        try:
+            content = markerPath.read_text().strip()
+        except FileNotFoundError:
+            return None
+        try:
+            return float(content)
+        except ValueError:
+            # Written but not flushed yet, or a date without %N
+            return time.time()
+
+    def __checkStarted(self, job: CaseJob):
+        startTime = self.__readTimestamp(Path(job.cwd) / "job.started")
+        if startTime is None:
+            return
+        job.startTime = startTime
+        job.status = "running"
+        queueTime = job.startTime - job.info.get("submitTime", job.startTime)
+        self._print(f"{job.name} started after {queueTime:.0f} s in the queue")
+
+    def adopt(self, job: CaseJob) -> CaseJob:
+        # The journaled time is the submission, the start is read from job.started
+        job.info["submitTime"] = job.startTime or time.time()
+        job.startTime = None
+        job.status = "queued"
+        self.jobs.append(job)
+        self._print(f"{job.name} reattached")
+        self.__checkStarted(job)
+        return job
+
+    def __submitJob(self, job: CaseJob):
+        exitcodePath = Path(job.cwd) / "job.exitcode"
+        startedPath = Path(job.cwd) / "job.started"
+        finishedPath = Path(job.cwd) / "job.finished"
+        for markerPath in (exitcodePath, startedPath, finishedPath):
+            if markerPath.is_file():
+                markerPath.unlink()
+        exports = "".join(
+            f"export {key}={shlex.quote(str(value))}\n"
+            for key, value in (job.env or {}).items()
+        )
+        directives = self.directives.format(name=job.name, nCPUs=job.nCPUs)
+        if self.memoryModel is not None:
+            memoryMB = math.ceil(self.memoryModel.jobEstimate(job) / 1024**2)
+            directives += "\n" + self.memoryDirective.format(memoryMB=memoryMB)
+        jobScriptPath = Path(job.cwd) / "job.sh"
+        with open(jobScriptPath, "w") as jobScript:
+            jobScript.write(
+                self.jobScriptTemplate.format(
+                    directives=directives,
+                    cwd=shlex.quote(str(job.cwd)),
+                    exports=exports,
+                    command=shlex.join(job.command),
+                    stdout=shlex.quote(str(job.stdoutPath)),
+                    stderr=shlex.quote(str(job.stderrPath)),
+                    exitcodePath=shlex.quote(str(exitcodePath)),
+                    startedPath=shlex.quote(str(startedPath)),
+                    finishedPath=shlex.quote(str(finishedPath)),
+                )
+            )
+        result = subprocess.run(
+            shlex.split(self.submitCommand) + [str(jobScriptPath)],
+            capture_output=True,
+            text=True,
+            cwd=job.cwd,
+        )
+        jobIds = re.findall(r"\d+", result.stdout)
+        if result.returncode != 0 or not jobIds:
+            self._print(f"{job.name} could not be submitted: {result.stderr.strip()}")
+            job.startTime = None
+            self._finish(job, -1)
+            return
+        job.info["jobId"] = jobIds[-1]
+        job.info["host"] = socket.gethostname()
+        job.info["submitTime"] = time.time()
+        job.startTime = None
+        job.status = "queued"
+        self._print(f"{job.name} submitted as job {job.info["jobId"]}")
+        self._started(job)
+
+    def isAlive(self, job: CaseJob) -> bool:
+        return "jobId" in job.info and self.__isQueued(job)
+
+    def __isQueued(self, job: CaseJob):
+        result = subprocess.run(
+            shlex.split(self.statusCommand.format(jobId=job.info["jobId"])),
+            capture_output=True,
+            text=True,
+        )
+        return result.returncode == 0 and result.stdout.strip() != ""
+
+    def _kill(self, job: CaseJob):
+        subprocess.run(shlex.split(self.cancelCommand.format(jobId=job.info["jobId"])))
+
+    def shutdown(self):
+        for job in self.jobs:
+            if job.status in ("queued", "running"):
+                self._kill(job)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+###################################################
+# Stand-in for a batch scheduler
+###################################################
+#
+# Minimal stand-in for a batch scheduler, used to exercise
+# BatchSchedulerExecutor without a cluster:
+#   BatchSchedulerExecutor(
+#       submitCommand=f"{sys.executable} fake_scheduler.py submit",
+#       statusCommand=f"{sys.executable} fake_scheduler.py status {jobId}",
+#       cancelCommand=f"{sys.executable} fake_scheduler.py cancel {jobId}",
+#   )
+# Jobs run as detached local processes, the job id is the pid. They wait
+# FAKE_QUEUE_DELAY seconds (default 0) as if queued before the script runs.
+#
+
+import os
+import signal
+import subprocess
+import sys
+
+
+def submit(jobScriptPath):
+    queueDelay = float(os.environ.get("FAKE_QUEUE_DELAY", "0"))
+    proc = subprocess.Popen(
+        ["bash", "-c", f'sleep {queueDelay} && exec bash "$0"', jobScriptPath],
+        cwd=os.path.dirname(os.path.abspath(jobScriptPath)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    print(f"Submitted batch job {proc.pid}")
+    return 0
+
+
+def status(jobId):
+    try:
+        os.kill(int(jobId), 0)
+    except ProcessLookupError:
+        return 1
+    print(f"{jobId} RUNNING")
+    return 0
+
+
+def cancel(jobId):
+    try:
+        os.killpg(int(jobId), signal.SIGTERM)
+    except ProcessLookupError:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    commands = {"submit": submit, "status": status, "cancel": cancel}
+    sys.exit(commands[sys.argv[1]](sys.argv[2]))
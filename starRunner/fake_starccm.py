@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+###################################################
+# Stand-in for starccm+, for end-to-end and load
+#  tests without a license
+###################################################
+#
+# Local stand-in for the starccm+ command, no license needed. Supports the
+# modes used by StarManager and StarSession:
+#   fake_starccm.py -load case.sim -batch a.java,b.java -np 2
+#   fake_starccm.py -server -port 47827 -np 2 -load base.sim
+#   fake_starccm.py -host localhost -port 47827 -batch a.java,b.java
+# The design is read as STAR would get it: geometry.json of the case, then
+# the sketches of design_data.csv or of the generated geometry macro, and
+# the global parameters of design_data.csv or update_variables.java. An
+# analytic loss model (wall curvature per section, fin angle, mass flow)
+# gives the total pressures that post_star writes to results.csv, so
+# overallDuctPressureLoss is a smooth function of the design variables.
+# A solution_snapshot.csv, <case>_solved.sim, <case>_meshed.sim or
+# <case>_base.sim is written if the case options ask for them, and
+# replace_geometry accepts a requested morph.
+# The 3D-CAD models and the parts bound to them, and the warm start table
+# and initial conditions, are followed as STAR would (kept across cases by a
+# server), so stale or colliding models fail.
+#
+# The behavior is set in the environment, the command line stays the one
+# StarManager builds:
+#   FAKE_ITERATIONS     rows of the monitor table printed by run_star (20)
+#   FAKE_COMPILE_TIME   s spent compiling each .java macro played (0), the
+#                       .class files of a macro bundle are not compiled
+#   FAKE_RUNTIME        s spent in run_star (0), spread over the rows
+#   FAKE_RUNTIME_JITTER relative standard deviation of the runtime (0)
+#   FAKE_RESIDUALS      "converge", "stall" (ends above the residual limit)
+#                       or "diverge" (floating point exception), or:
+#   FAKE_STALL_RATE     probability of a stalling case (0)
+#   FAKE_DIVERGE_RATE   probability of a diverging case (0)
+#   FAKE_FAILURE_RATE   probability of an MPI abort during run_star (0)
+#   FAKE_LICENSE_RATE   probability of a license checkout failure (0)
+#   FAKE_HANG_RATE      probability of run_star hanging without output (0)
+#   FAKE_NOISE          relative standard deviation of the losses (0)
+#   FAKE_SEED           makes the draws repeatable per case directory
+# useFakeStar in driver_BOGP.py runs all cases with this command.
+#
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import shlex
+import socket
+import socketserver
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+REPORTS = {
+    "inlet_total_pressure_mca": (101325.0, "Pa"),
+    "outlet_total_pressure_mca": (101000.0, "Pa"),
+    "HEX_inlet_total_pressure_mca": (101250.0, "Pa"),
+    "HEX_outlet_total_pressure_mca": (101100.0, "Pa"),
+    "HEX_inlet_velocity_uniformity": (0.9, ""),
+    "cell_count": (250000.0, ""),
+}
+RESIDUALS = {
+    "Continuity": 1e-5,
+    "X-momentum": 1e-6,
+    "Y-momentum": 1e-6,
+    "Energy": 1e-7,
+    "Tke": 1e-6,
+    "Sdr": 1e-6,
+}
+
+# Loss model
+MDOT_REF = 12.866  # kg/s, mass flow of the base case
+DYNAMIC_PRESSURE = 1500.0  # Pa at MDOT_REF
+ALPHA_OPT = 35.0  # deg, fin angle of the smallest HEX loss
+CURVATURE_REF = 50.0  # 1/m, wall bending energy of a typical section
+# Larger turns between two lines are corners of the sketch, not wall curvature
+MAX_TURN = math.radians(45)
+
+# Generated macros, see SGMG/star_geometry_macro_generator.py and
+# StarManager.__generateVariableMacro
+MACRO_POINT = re.compile(
+    r"PointSketchPrimitive (\w+)Point(\d+) = \1\.createPoint\("
+    r"new DoubleVector\(new double\[\] \{([^,]+), ([^}]+)\}\)\)"
+)
+MACRO_LINE = re.compile(r"(\w+)\.createLine\(\1Point(\d+), \1Point(\d+)\)")
+MACRO_PARAMETER = re.compile(
+    r'getObject\("(\w+)"\)\);\s*scalarGlobalParameter_\d+\.getQuantity\(\)\.setValue\(([^)]+)\)'
+)
+
+
+def fakeCommand() -> str:
+    """STARCCMPath that runs this stand-in with the current interpreter."""
+    return shlex.join([sys.executable, str(Path(__file__).resolve())])
+
+
+def setting(name: str, default=0.0) -> float:
+    return float(os.environ.get(f"FAKE_{name}", default))
+
+
+def getCaseDir(simFilePath: Path) -> Path:
+    # Same lookup as getCaseDir() in the refFiles macros
+    casePointer = os.environ.get("BOGP_CASE_POINTER")
+    if casePointer is not None and os.path.exists(casePointer):
+        with open(casePointer) as pointerFile:
+            return Path(pointerFile.readline().strip())
+    return simFilePath.parent
+
+
+def writeResults(caseDir: Path, reports: dict, residuals: dict):
+    with open(caseDir / "results.csv", "w") as resultsFile:
+        resultsFile.write("Report Name, Value, Unit, \n")
+        for name, (value, unit) in reports.items():
+            resultsFile.write(f"{name}, {value}, {unit}\n")
+        for name, value in residuals.items():
+            resultsFile.write(f"{name}, {value}, \n")
+
+
+def readCaseOptions(caseDir: Path) -> dict:
+    # Same format as readCaseOptions() in the refFiles macros
+    caseOptions = {}
+    optionsPath = caseDir / "case_options.csv"
+    if optionsPath.is_file():
+        with open(optionsPath) as optionsFile:
+            for line in optionsFile:
+                entry = line.split(",", 1)
+                if len(entry) == 2:
+                    caseOptions[entry[0].strip()] = entry[1].strip()
+    return caseOptions
+
+
+def writeSnapshot(caseDir: Path):
+    with open(caseDir / "solution_snapshot.csv", "w") as snapshotFile:
+        snapshotFile.write(
+            "X (m),Y (m),Z (m),Pressure (Pa),Velocity[i] (m/s),Velocity[j] (m/s),Velocity[k] (m/s)\n"
+        )
+        snapshotFile.write("0.0,0.0,0.0,101325.0,10.0,0.0,0.0\n")
+
+
+class Design:
+    """
+    Geometry and global parameters the simulation holds. sketches: name ->
+    (points, lines), points index -> (x, y) and lines pairs of point indices.
+    reports and residuals are what post_star writes, set by run_star.
+    """
+
+    def __init__(self):
+        self.sketches = {}
+        self.parameters = {}
+        self.reports = dict(REPORTS)
+        self.residuals = dict(RESIDUALS)
+
+    def loadGeometry(self, geometryPath: Path):
+        # Full geometry of the case, the macros may only carry the changed sketches
+        if not geometryPath.is_file():
+            return
+        with open(geometryPath) as geometryFile:
+            geometry = json.load(geometryFile)
+        for sketch in geometry["sketches"]:
+            points, lines = {}, []
+            for curve in sketch["curves"]:
+                indices = []
+                for point in curve["points"]:
+                    pointTuple = (float(point[0]), float(point[1]))
+                    indices.append(points.setdefault(pointTuple, len(points)))
+                lines += zip(indices[:-1], indices[1:])
+            self.sketches[sketch["name"]] = (
+                {index: point for point, index in points.items()},
+                lines,
+            )
+
+    def loadDesignData(self, dataPath: Path):
+        # Row types as written by StarGeometryDataWriter
+        sketchName = None
+        with open(dataPath) as dataFile:
+            for line in dataFile:
+                row = [item.strip() for item in line.split(",")]
+                if row[0] == "parameter":
+                    self.parameters[row[1]] = float(row[2])
+                elif row[0] == "sketch":
+                    sketchName = row[1]
+                    self.sketches[sketchName] = ({}, [])
+                elif row[0] == "point":
+                    points = self.sketches[sketchName][0]
+                    points[len(points)] = (float(row[1]), float(row[2]))
+                elif row[0] == "curve":
+                    indices = [int(index) for index in row[2].split()]
+                    self.sketches[sketchName][1].extend(zip(indices[:-1], indices[1:]))
+
+    def loadMacro(self, macroPath: Path):
+        source = macroPath.read_text()
+        sketches = {}
+        for name, index, x, y in MACRO_POINT.findall(source):
+            sketches.setdefault(name, ({}, []))[0][int(index)] = (float(x), float(y))
+        for name, first, second in MACRO_LINE.findall(source):
+            sketches.setdefault(name, ({}, []))[1].append((int(first), int(second)))
+        self.sketches.update(sketches)
+        for key, value in MACRO_PARAMETER.findall(source):
+            self.parameters[key] = float(value)
+
+
+class CadModels:
+    """
+    3D-CAD models of the sim, as load_design and replace_geometry change them:
+    models, name -> bodies, and parts, body -> name of the model it is bound
+    to. The base sim holds one model with all bodies, bound to the parts.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.parts = {}
+        self.modelName = None
+
+    def build(self, dataPath: Path, baseBodies: list, emit) -> int:
+        """load_design: the changed sketches become a new model."""
+        model, bodies = None, []
+        with open(dataPath) as dataFile:
+            for line in dataFile:
+                row = [item.strip() for item in line.split(",")]
+                if row[0] == "model":
+                    model = row[1:]
+                elif row[0] == "sketch":
+                    bodies.append(row[1])
+        modelName, tmpName = model[0], model[1]
+        supersededName = model[2] if len(model) > 2 else f"{modelName}_superseded"
+        self.__loadBase(modelName, baseBodies)
+        if not bodies:
+            return 0
+        self.models.pop(tmpName, None)
+        if modelName in self.models:
+            if supersededName in self.models:
+                emit(f"error: A CAD model named {supersededName} already exists")
+                return 1
+            self.__rename(modelName, supersededName)
+        self.models[modelName] = set(bodies)
+        return 0
+
+    def bind(self, caseOptions: dict, baseBodies: list, emit) -> int:
+        """replace_geometry: parts of the replaced bodies, then the model removal."""
+        if self.modelName is None:
+            # Generated geometry macros, their models are not followed
+            return 0
+        bodies = baseBodies
+        if "replace_bodies" in caseOptions:
+            bodies = [body for body in caseOptions["replace_bodies"].split(";") if body]
+        if not bodies:
+            return 0
+        for body in bodies:
+            if body not in self.models.get(self.modelName, ()):
+                emit(f"error: Body {body} not found in CAD model {self.modelName}")
+                return 1
+            self.parts[body] = self.modelName
+        for name in caseOptions.get("remove_models", "").split(";"):
+            if name not in self.models:
+                continue
+            bound = sorted(body for body, model in self.parts.items() if model == name)
+            if bound:
+                emit(f"error: CAD model {name} is used by the parts {", ".join(bound)}")
+                return 1
+            del self.models[name]
+        emit(f"CAD models: {", ".join(sorted(self.models))}")
+        return 0
+
+    def __loadBase(self, modelName: str, baseBodies: list):
+        if self.modelName is None and modelName is not None:
+            self.modelName = modelName
+            self.models[modelName] = set(baseBodies)
+            self.parts = {body: modelName for body in baseBodies}
+
+    def __rename(self, name: str, newName: str):
+        self.models[newName] = self.models.pop(name)
+        for body, model in self.parts.items():
+            if model == name:
+                self.parts[body] = newName
+
+
+class WarmStartTables:
+    """
+    Tables of the sim and where its initial conditions come from, as
+    warm_start changes them: the snapshot table, or constant values.
+    """
+
+    TABLE_NAME = "bogp_warm_start"
+
+    def __init__(self):
+        self.tables = []
+        self.initialConditions = "constant"
+
+    def apply(self, caseOptions: dict, emit):
+        # The previous case's table and table-driven conditions go first
+        if self.TABLE_NAME in self.tables:
+            self.tables.remove(self.TABLE_NAME)
+        self.initialConditions = "constant"
+        snapshotPath = caseOptions.get("warm_start")
+        if snapshotPath is not None and Path(snapshotPath).is_file():
+            self.tables.append(self.TABLE_NAME)
+            self.initialConditions = "table"
+            emit(f"Warm start from: {snapshotPath}")
+        emit(f"Initial conditions: {self.initialConditions}")
+        emit(f"Tables: {", ".join(self.tables) or "none"}")
+
+
+def bendingEnergy(points: dict, lines: list) -> float:
+    """Sum of turn angle² / line length at the points joining two lines, 1/m."""
+    neighbours = defaultdict(set)
+    for first, second in lines:
+        if first != second:
+            neighbours[first].add(second)
+            neighbours[second].add(first)
+    energy = 0.0
+    for index, ends in neighbours.items():
+        if len(ends) != 2:
+            continue
+        (x0, y0), (x1, y1), (x2, y2) = (points[k] for k in (min(ends), index, max(ends)))
+        ux, uy, vx, vy = x1 - x0, y1 - y0, x2 - x1, y2 - y1
+        length = 0.5 * (math.hypot(ux, uy) + math.hypot(vx, vy))
+        turn = math.atan2(ux * vy - uy * vx, ux * vx + uy * vy)
+        if length > 0 and abs(turn) < MAX_TURN:
+            energy += turn**2 / length
+    return energy
+
+
+def evaluateDesign(design: Design, rng: random.Random) -> dict:
+    """Reports of post_star for the design, from the analytic loss model."""
+    energy = {name: bendingEnergy(*sketch) for name, sketch in design.sketches.items()}
+    noise = setting("NOISE")
+    mdot = design.parameters.get("mdot", MDOT_REF)
+    alpha = design.parameters.get("alpha", ALPHA_OPT)
+    dynamicPressure = DYNAMIC_PRESSURE * (mdot / MDOT_REF) ** 2
+
+    def loss(coefficient):
+        return dynamicPressure * coefficient * max(0.0, 1.0 + rng.gauss(0.0, noise))
+
+    inletCurvature = energy.get("inlet_section", 0.0) / CURVATURE_REF
+    outletCurvature = energy.get("outlet_section", 0.0) / CURVATURE_REF
+    # A curved inlet diffuser spreads the flow unevenly over the HEX
+    uniformity = 1.0 / (1.0 + 0.2 * inletCurvature)
+    inletLoss = loss(0.05 * (1.0 + inletCurvature))
+    hexLoss = loss(
+        0.3
+        * (1.0 + energy.get("hex_section", 0.0) / CURVATURE_REF)
+        * (1.0 + ((alpha - ALPHA_OPT) / 25.0) ** 2)
+        / uniformity
+    )
+    outletLoss = loss(0.05 * (1.0 + outletCurvature))
+
+    inletPressure = REPORTS["inlet_total_pressure_mca"][0]
+    reports = dict(REPORTS)
+    reports["HEX_inlet_total_pressure_mca"] = (inletPressure - inletLoss, "Pa")
+    reports["HEX_outlet_total_pressure_mca"] = (inletPressure - inletLoss - hexLoss, "Pa")
+    reports["outlet_total_pressure_mca"] = (
+        inletPressure - inletLoss - hexLoss - outletLoss,
+        "Pa",
+    )
+    reports["HEX_inlet_velocity_uniformity"] = (uniformity, "")
+    return reports
+
+
+def residualBehavior(rng: random.Random) -> str:
+    behavior = os.environ.get("FAKE_RESIDUALS")
+    if behavior is not None:
+        return behavior
+    draw = rng.random()
+    if draw < setting("DIVERGE_RATE"):
+        return "diverge"
+    if draw < setting("DIVERGE_RATE") + setting("STALL_RATE"):
+        return "stall"
+    return "converge"
+
+
+def finalResiduals(behavior: str) -> dict:
+    if behavior == "stall":
+        # Stuck three decades higher, above StarManager.residual_limit
+        return {name: residual * 1e3 for name, residual in RESIDUALS.items()}
+    return dict(RESIDUALS)
+
+
+def monitorTable(iterations: int, residuals=RESIDUALS, pressureDrop=325.0, headerEvery=10):
+    """Residual and report lines as STAR prints them, decaying to residuals."""
+    names = list(residuals) + ["Pressure Drop Monitor"]
+    for iteration in range(1, iterations + 1):
+        if (iteration - 1) % headerEvery == 0:
+            yield "Iteration" + "".join(f"{name:>24}" for name in names)
+        decay = (iteration / iterations) ** 2
+        values = [residual**decay for residual in residuals.values()] + [pressureDrop]
+        yield f"{iteration:9d}" + "".join(f"{value:24.6e}" for value in values)
+
+
+def runStar(caseDir: Path, design: Design, behavior: str, rng: random.Random, emit) -> int:
+    iterations = max(1, int(setting("ITERATIONS", 20)))
+    runtime = setting("RUNTIME") * max(0.0, 1.0 + rng.gauss(0.0, setting("RUNTIME_JITTER")))
+    if rng.random() < setting("HANG_RATE"):
+        # Left to the watchdog's inactivity limit
+        while True:
+            time.sleep(3600)
+    failAt = None
+    if rng.random() < setting("FAILURE_RATE"):
+        failAt = rng.randint(1, iterations)
+    elif behavior == "diverge":
+        failAt = max(1, int(0.7 * iterations))
+
+    reports = evaluateDesign(design, rng)
+    pressureDrop = (
+        reports["inlet_total_pressure_mca"][0] - reports["outlet_total_pressure_mca"][0]
+    )
+    residuals = finalResiduals(behavior)
+    if behavior == "diverge":
+        residuals = {name: 1e3 for name in RESIDUALS}
+    for line in monitorTable(iterations, residuals, pressureDrop):
+        emit(line)
+        if not line.startswith("Iteration"):
+            time.sleep(runtime / iterations)
+            iteration = int(line.split(None, 1)[0])
+            if iteration == failAt:
+                if behavior == "diverge":
+                    emit("Floating point exception: the solver diverged")
+                else:
+                    emit("MPI_ABORT was invoked on rank 0 in communicator MPI_COMM_WORLD")
+                return 1
+    design.reports = reports
+    design.residuals = residuals
+    return 0
+
+
+def playMacros(
+    macroPaths: list[str], simFilePath: Path, emit, cadModels=None, warmStartTables=None
+) -> int:
+    """
+    Plays the macros, their output goes to emit; returns the return code.
+    cadModels, warmStartTables: those of the loaded sim, the base sim's if None.
+    """
+    caseDir = getCaseDir(simFilePath)
+    seed = os.environ.get("FAKE_SEED")
+    rng = random.Random(None if seed is None else f"{seed}:{caseDir}")
+    if rng.random() < setting("LICENSE_RATE"):
+        emit("Unable to checkout license for STAR-CCM+ (stand-in)")
+        return 1
+    behavior = residualBehavior(rng)
+
+    design = Design()
+    design.loadGeometry(caseDir / "geometry.json")
+    baseBodies = list(design.sketches)
+    if cadModels is None:
+        cadModels = CadModels()
+    if warmStartTables is None:
+        warmStartTables = WarmStartTables()
+    for macroPath in macroPaths:
+        macroName = Path(macroPath).stem
+        if not Path(macroPath).is_file():
+            emit(f"Macro file not found: {macroPath}")
+            return 1
+        if Path(macroPath).suffix == ".java":
+            # STAR compiles a source macro on every launch
+            time.sleep(setting("COMPILE_TIME"))
+        emit(f"Playing macro: {macroName}")
+        caseOptions = readCaseOptions(caseDir)
+        if macroName == "post_star":
+            writeResults(caseDir, design.reports, design.residuals)
+            emit(f"Saved: {caseDir / "results.csv"}")
+            if caseOptions.get("keep_solution") == "true":
+                caseName = caseOptions.get("case_name", simFilePath.stem)
+                inletPressure = design.reports["inlet_total_pressure_mca"][0]
+                loss = (
+                    inletPressure - design.reports["outlet_total_pressure_mca"][0]
+                ) / inletPressure
+                bestObjective = float(caseOptions.get("keep_solution_below", "inf"))
+                if loss < bestObjective:
+                    solvedSimPath = caseDir / (caseName + "_solved.sim")
+                    solvedSimPath.write_bytes(simFilePath.read_bytes())
+                    emit(f"Saved: {solvedSimPath}")
+                else:
+                    emit(
+                        f"Not below the best objective {bestObjective}, "
+                        "solution not kept"
+                    )
+            if caseOptions.get("save_mesh") == "true":
+                caseName = caseOptions.get("case_name", simFilePath.stem)
+                meshedSimPath = caseDir / (caseName + "_meshed.sim")
+                meshedSimPath.write_bytes(simFilePath.read_bytes())
+                emit(f"Saved: {meshedSimPath}")
+            if caseOptions.get("save_base") == "true":
+                caseName = caseOptions.get("case_name", simFilePath.stem)
+                baseSimPath = caseDir / (caseName + "_base.sim")
+                baseSimPath.write_bytes(simFilePath.read_bytes())
+                emit(f"Saved: {baseSimPath}")
+            if caseOptions.get("save_snapshot") == "true":
+                writeSnapshot(caseDir)
+                emit(f"Saved: {caseDir / "solution_snapshot.csv"}")
+        elif macroName == "load_design":
+            dataPath = caseDir / "design_data.csv"
+            if not dataPath.is_file():
+                # The macro aborts the batch
+                emit(f"Could not read {dataPath}")
+                return 1
+            design.loadDesignData(dataPath)
+            returncode = cadModels.build(dataPath, baseBodies, emit)
+            if returncode != 0:
+                return returncode
+        elif macroName == "replace_geometry" and "morph_mesh" in caseOptions:
+            with open(caseDir / "morph_status.csv", "w") as statusFile:
+                statusFile.write("mesh_update, morph\nreason, \n")
+            emit("Morphing successful")
+        elif macroName == "replace_geometry":
+            returncode = cadModels.bind(caseOptions, baseBodies, emit)
+            if returncode != 0:
+                return returncode
+        elif macroName == "run_star":
+            returncode = runStar(caseDir, design, behavior, rng, emit)
+            if returncode != 0:
+                return returncode
+        elif macroName == "warm_start":
+            warmStartTables.apply(caseOptions, emit)
+        elif Path(macroPath).suffix == ".java":
+            # Generated per case: geometry or global parameters
+            design.loadMacro(Path(macroPath))
+    return 0
+
+
+def emitLine(line: str):
+    # Flushed per line, the log streamers and the watchdog follow the run
+    print(line, flush=True)
+
+
+class SessionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connection check from StarSession
+            return
+        request = json.loads(line)
+        output = []
+        returncode = playMacros(
+            request["macros"],
+            self.server.simFilePath,
+            output.append,
+            self.server.cadModels,
+            self.server.warmStartTables,
+        )
+        reply = {"output": output, "returncode": returncode}
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+def runServer(port: int, simFilePath: Path):
+    with socketserver.TCPServer(("localhost", port), SessionHandler) as server:
+        server.simFilePath = simFilePath
+        # The server keeps its sim, and so its CAD models and tables, from case
+        # to case
+        server.cadModels = CadModels()
+        server.warmStartTables = WarmStartTables()
+        print(f"Server::start -host localhost:{port}", flush=True)
+        server.serve_forever()
+
+
+def runClient(host: str, port: int, macroPaths: list[str]) -> int:
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall((json.dumps({"macros": macroPaths}) + "\n").encode())
+        reply = json.loads(sock.makefile().readline())
+    for line in reply["output"]:
+        print(line)
+    return reply["returncode"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for starccm+")
+    parser.add_argument("-load", type=Path)
+    parser.add_argument("-batch", default="")
+    parser.add_argument("-np", type=int, default=1)
+    parser.add_argument("-server", action="store_true")
+    parser.add_argument("-host")
+    parser.add_argument("-port", type=int)
+    parser.add_argument("-classpath")
+    args = parser.parse_args()
+
+    macroPaths = [macroPath for macroPath in args.batch.split(",") if macroPath]
+    if args.server:
+        runServer(args.port, args.load.resolve())
+        return 0
+    if args.host is not None:
+        return runClient(args.host, args.port, macroPaths)
+    return playMacros(macroPaths, args.load.resolve(), emitLine)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+###################################################
+# Lock file shared across processes and nodes
+###################################################
+#
+# Lock file usable across processes and nodes sharing a filesystem. The
+# lock is taken by creating the file exclusively, which is atomic on local
+# filesystems and on NFSv3+. A lock older than staleAfter is broken.
+#
+
+import os
+import socket
+import time
+from pathlib import Path
+
+
+class FileLock:
+    def __init__(self, lockPath: Path, timeout=600.0, staleAfter=300.0, pollInterval=0.1):
+        self.lockPath = Path(lockPath)
+        self.timeout = timeout
+        self.staleAfter = staleAfter
+        self.pollInterval = pollInterval
+
+    def acquire(self):
+        startTime = time.time()
+        while True:
+            try:
+                fd = os.open(self.lockPath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                self.__breakIfStale()
+                if time.time() - startTime > self.timeout:
+                    raise TimeoutError(f"Could not lock {self.lockPath}")
+                time.sleep(self.pollInterval)
+                continue
+            with os.fdopen(fd, "w") as lockFile:
+                lockFile.write(f"{socket.gethostname()} {os.getpid()}\n")
+            return self
+
+    def release(self):
+        try:
+            self.lockPath.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __breakIfStale(self):
+        try:
+            age = time.time() - self.lockPath.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if age > self.staleAfter:
+            self.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
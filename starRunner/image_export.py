@@ -0,0 +1,68 @@
+###################################################
+# Image export of the best design
+###################################################
+#
+# With imageExport = "best" a case only keeps its solved sim when it may
+# become the new best, and the driver hands each new best to
+# BestImageExport. The images are rendered by one STAR process at a time
+# (StarManager.exportImages): a best superseded before its export started
+# is skipped, the exit code of every export is reported, and the solved sim
+# of the former best is deleted once the export of a newer one starts. The
+# drivers call poll() from their main loop and wait() at the end.
+#
+
+from datetime import datetime
+
+
+class BestImageExport:
+    def __init__(self, images="all"):
+        self.images = images
+        self.__running = None  # (manager, process)
+        self.__waiting = None  # manager of the newest best, export not started
+        self.__exported = None  # manager of the current best, its sim is kept
+
+    def submit(self, manager):
+        """Export the images of a new best case once the running export is done."""
+        if self.__waiting is not None:
+            # Superseded before its export started
+            self.__waiting.discardSolution()
+        self.__waiting = manager
+        self.poll()
+
+    def poll(self):
+        """Reap a finished export and start the waiting one, without blocking."""
+        if self.__running is not None:
+            manager, process = self.__running
+            if process.poll() is None:
+                return
+            self.__running = None
+            self.__exported = manager
+            if process.returncode != 0:
+                self.__print(
+                    f"{manager.caseName}: export failed with code "
+                    f"{process.returncode}, see {manager.casePath / "CFD_export_out.txt"}"
+                )
+            else:
+                self.__print(f"{manager.caseName}: images exported")
+        if self.__waiting is not None:
+            manager, self.__waiting = self.__waiting, None
+            if self.__exported is not None:
+                self.__exported.discardSolution()
+            self.__exported = manager
+            process = manager.exportImages(self.images)
+            if process is not None:
+                self.__running = (manager, process)
+
+    def isRunning(self):
+        return self.__running is not None or self.__waiting is not None
+
+    def wait(self):
+        """Until the waiting and running exports are done."""
+        while self.isRunning():
+            if self.__running is not None:
+                self.__running[1].wait()
+            self.poll()
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] BestImageExport: {string}")
@@ -0,0 +1,125 @@
+###################################################
+# Crash-safe optimizer journal
+###################################################
+#
+# Optimizer journal: every ask (design handed out), submit (how the case
+# was started) and tell (objective recorded) is appended to journal.jsonl
+# as one fsync'd line. After a crash or preemption the driver replays it
+# to rebuild gpList.dat and the best design so far, and to find the cases
+# that were asked but never told: those still running are reattached,
+# finished ones are harvested and only the rest is run again.
+#
+
+import json
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class JournalState:
+    # Rows of gpList.dat before the journal was started
+    baseline: int = 0
+    # case name -> {"i", "x"}, in ask order
+    asked: dict = field(default_factory=dict)
+    # case name -> last submit record
+    submitted: dict = field(default_factory=dict)
+    # case name -> {"i", "x", "y"}, in tell order
+    told: dict = field(default_factory=dict)
+
+    def pending(self) -> dict:
+        """Cases asked but not told."""
+        return {
+            caseName: ask
+            for caseName, ask in self.asked.items()
+            if caseName not in self.told
+        }
+
+    def nextIndex(self) -> int:
+        return max([ask["i"] for ask in self.asked.values()], default=0) + 1
+
+    def best(self):
+        """(i, y, x) of the smallest objective told, None if nothing was told."""
+        if not self.told:
+            return None
+        best = min(self.told.values(), key=lambda tell: tell["y"])
+        return best["i"], best["y"], best["x"]
+
+
+class OptimizerJournal:
+    """
+    Append-only, one JSON record per line. A line cut short by a crash is
+    ignored when the journal is read back, and ended when it is reopened.
+    """
+
+    def __init__(self, journalPath: Path, baseline=0):
+        self.journalPath = Path(journalPath)
+        if not self.journalPath.is_file():
+            self.__append({"event": "start", "baseline": baseline})
+        else:
+            self.__endTornLine()
+
+    def ask(self, caseName: str, i: int, x):
+        self.__append(
+            {"event": "ask", "case": caseName, "i": i, "x": [float(v) for v in x]}
+        )
+
+    def submit(self, caseName: str, **handle):
+        """handle: what is needed to find the run again, e.g. pid or jobId."""
+        self.__append(
+            {"event": "submit", "case": caseName, "host": socket.gethostname(), **handle}
+        )
+
+    def tell(self, caseName: str, i: int, x, y):
+        self.__append(
+            {
+                "event": "tell",
+                "case": caseName,
+                "i": i,
+                "x": [float(v) for v in x],
+                "y": float(y),
+            }
+        )
+
+    def recover(self) -> JournalState:
+        state = JournalState()
+        with open(self.journalPath) as journalFile:
+            for line in journalFile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                event = record.pop("event", None)
+                if event == "start":
+                    state.baseline = record["baseline"]
+                elif event == "ask":
+                    state.asked[record["case"]] = record
+                elif event == "submit":
+                    state.submitted[record["case"]] = record
+                elif event == "tell":
+                    state.told[record["case"]] = record
+        return state
+
+    def __endTornLine(self):
+        # Otherwise the next record would be glued to the line cut short
+        with open(self.journalPath, "rb+") as journalFile:
+            if journalFile.seek(0, os.SEEK_END) == 0:
+                return
+            journalFile.seek(-1, os.SEEK_END)
+            if journalFile.read(1) != b"\n":
+                journalFile.write(b"\n")
+                journalFile.flush()
+                os.fsync(journalFile.fileno())
+
+    def __append(self, record: dict):
+        record["time"] = time.time()
+        line = json.dumps(record) + "\n"
+        # A single O_APPEND write, synced before the caller goes on
+        fd = os.open(self.journalPath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
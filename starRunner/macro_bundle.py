@@ -0,0 +1,130 @@
+###################################################
+# Precompiled bundle of the static STAR-CCM+
+#  macros
+###################################################
+#
+# Compiles the static STAR-CCM+ macros once per campaign, so that STAR does
+# not recompile the same .java sources on every launch. The macros extend
+# macro.CaseMacro (refFiles/CaseMacro.java), which STAR only finds compiled
+# on the -classpath: it is always part of the bundle, also when the macros
+# themselves are left for STAR to compile (macroNames=[]). The time saved per
+# launch is only measured against the fake STAR (FAKE_COMPILE_TIME, see
+# tests/test_macro_bundle.py), not against STAR-CCM+ itself.
+#
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+STATIC_MACROS = [
+    "replace_geometry.java",
+    "load_design.java",
+    "run_star.java",
+    "post_star.java",
+    "export_images.java",
+    "warm_start.java",
+]
+# Compiled into every bundle, the macros depend on them
+SHARED_CLASSES = ["CaseMacro.java"]
+
+
+class MacroBundle:
+    def __init__(
+        self,
+        refFilesPath: Path,
+        bundlePath: Path,
+        macroNames: list[str] = STATIC_MACROS,
+        javacPath="javac",
+        starHome=None,
+    ):
+        self.refFilesPath = Path(refFilesPath)
+        self.bundlePath = Path(bundlePath)
+        self.macroNames = macroNames
+        self.javacPath = javacPath
+        # Root of the STAR-CCM+ installation, the macros compile against its jars
+        self.starHome = starHome or os.environ.get("STARCCM_HOME")
+        if self.starHome is None and shutil.which("starccm+") is not None:
+            self.starHome = Path(shutil.which("starccm+")).resolve().parents[2]
+
+    def getClasspath(self) -> str:
+        if self.starHome is None:
+            return ""
+        jars = glob.glob(
+            str(Path(self.starHome) / "star" / "lib" / "java" / "**" / "*.jar"),
+            recursive=True,
+        )
+        return os.pathsep.join(jars)
+
+    def getClassFile(self, macroName: str) -> Path:
+        # All static macros are in the "macro" package
+        return self.bundlePath / "macro" / (Path(macroName).stem + ".class")
+
+    def isUpToDate(self, macroName: str) -> bool:
+        classFile = self.getClassFile(macroName)
+        sourcePath = self.refFilesPath / macroName
+        return (
+            classFile.is_file()
+            and classFile.stat().st_mtime >= sourcePath.stat().st_mtime
+        )
+
+    def build(self, force=False):
+        """
+        Compile the shared classes and macros that are missing or older than
+        their source. Returns the sources that were compiled.
+        """
+        self.bundlePath.mkdir(parents=True, exist_ok=True)
+        toCompile = [
+            macroName
+            for macroName in SHARED_CLASSES + list(self.macroNames)
+            if force or not self.isUpToDate(macroName)
+        ]
+        if toCompile:
+            self.__print(f"Compiling {", ".join(toCompile)}...")
+            self.__compile(
+                [self.refFilesPath / macroName for macroName in toCompile],
+                self.bundlePath,
+            )
+        return toCompile
+
+    def getMacro(self, macroPath) -> Path:
+        """
+        The compiled class of macroPath if it is part of the bundle and up to date,
+        otherwise the source so that STAR compiles it as before.
+        """
+        macroName = Path(macroPath).name
+        if macroName in self.macroNames and self.isUpToDate(macroName):
+            return self.getClassFile(macroName)
+        return Path(macroPath)
+
+    def __compile(self, sources: list[Path], outputPath: Path):
+        outputPath.mkdir(parents=True, exist_ok=True)
+        command = [self.javacPath, "-nowarn", "-d", str(outputPath)]
+        # The shared classes already in the bundle
+        classpath = [self.getClasspath(), str(outputPath)]
+        command += ["-cp", os.pathsep.join(filter(None, classpath))]
+        command += [str(source) for source in sources]
+        subprocess.run(command, check=True)
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] MacroBundle: {string}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the static STAR-CCM+ macros into a bundle"
+    )
+    parser.add_argument("--refFiles", type=Path, default=Path.cwd() / "refFiles")
+    parser.add_argument("--bundle", type=Path, default=Path.cwd() / "cfd" / "macros")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    MacroBundle(args.refFiles, args.bundle).build(force=args.force)
+
+
+if __name__ == "__main__":
+    main()
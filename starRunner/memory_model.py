@@ -0,0 +1,175 @@
+###################################################
+# Peak memory of the cases, measured and
+#  estimated
+###################################################
+#
+# Peak memory of the cases: sampled from /proc while a case runs, recorded
+# in database.csv (peak_rss_mb, cell_count from post_star), and estimated
+# for new cases from that history. A case is only started when it fits in
+# the free memory of the node (LocalPoolExecutor, driver_async.py), and a
+# batch job requests its estimate from the scheduler.
+#
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MB = 1024**2
+
+
+def processGroupsUsage(pgids):
+    """
+    Resident memory in bytes, its peak and CPU seconds (user and system,
+    children that were waited for included) of all processes of each process
+    group, {pgid: (rss, peak, cpu)}, empty off Linux. The peak is the sum of
+    the processes' own high-water marks (VmHWM), so it holds the peak of a
+    process reached between two samples, as long as it still runs.
+    """
+    usage = {pgid: (0, 0, 0.0) for pgid in pgids}
+    if not usage or not os.path.isdir("/proc"):
+        return {}
+    pageSize = os.sysconf("SC_PAGE_SIZE")
+    clockTicks = os.sysconf("SC_CLK_TCK")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as statFile:
+                stat = statFile.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, the fields follow its closing ")"
+        fields = stat[stat.rfind(")") + 2 :].split()
+        pgid = int(fields[2])
+        if pgid in usage:
+            rss, peak, cpu = usage[pgid]
+            processRSS = int(fields[21]) * pageSize
+            usage[pgid] = (
+                rss + processRSS,
+                peak + max(processRSS, highWaterMark(entry)),
+                cpu + sum(int(ticks) for ticks in fields[11:15]) / clockTicks,
+            )
+    return usage
+
+
+def highWaterMark(pid):
+    """Peak resident memory of the process in bytes, 0 if gone or a zombie."""
+    try:
+        with open(f"/proc/{pid}/status") as statusFile:
+            for line in statusFile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def availableMemory():
+    """MemAvailable of the node in bytes, None off Linux."""
+    try:
+        with open("/proc/meminfo") as meminfoFile:
+            for line in meminfoFile:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemoryModel:
+    """
+    Estimates the peak RSS of a new case from the recorded cases: a linear fit
+    of peak RSS on cell count, shifted up by the largest residual and evaluated
+    at the cell count of the new case, or at the largest recent one if that is
+    not known. Without cell counts, or if the peaks do not grow with them, it is
+    the largest recent peak.
+    """
+
+    def __init__(
+        self, databasePath: Path, defaultPeak=8 * 1024 * MB, safetyFactor=1.2, nRecent=20
+    ):
+        self.databasePath = Path(databasePath)
+        # Estimate until the first case has been recorded
+        self.defaultPeak = defaultPeak
+        self.safetyFactor = safetyFactor
+        self.nRecent = nRecent
+        self.__cache = (None, None)
+
+    def estimate(self, nCPUs=None, cellCount=None):
+        history = self.__history()
+        if history is None or history.empty:
+            return self.defaultPeak
+        if nCPUs is not None and "nCPUs" in history:
+            # Each MPI rank carries some memory of its own
+            sameNCPUs = history[history["nCPUs"] == nCPUs]
+            if not sameNCPUs.empty:
+                history = sameNCPUs
+        history = history.tail(self.nRecent)
+        peaks = history["peak_rss_mb"].to_numpy() * MB
+
+        if "cell_count" in history:
+            withCells = history.dropna(subset=["cell_count"])
+            if len(withCells) >= 3 and withCells["cell_count"].nunique() > 1:
+                cells = withCells["cell_count"].to_numpy(dtype=float)
+                cellPeaks = withCells["peak_rss_mb"].to_numpy() * MB
+                slope, intercept = np.polyfit(cells, cellPeaks, 1)
+                if slope > 0:
+                    # Above every recorded case, not through their middle
+                    margin = np.max(cellPeaks - (intercept + slope * cells))
+                    if cellCount is None:
+                        cellCount = np.max(cells)
+                    return self.safetyFactor * (intercept + slope * cellCount + margin)
+        return self.safetyFactor * np.max(peaks)
+
+    def jobEstimate(self, job) -> float:
+        """Estimated peak of a CaseJob, kept in job.info["memoryEstimate"]."""
+        if "memoryEstimate" not in job.info:
+            job.info["memoryEstimate"] = self.estimate(
+                job.nCPUs, job.info.get("cellCount")
+            )
+        return job.info["memoryEstimate"]
+
+    def fits(self, job, runningJobs) -> bool:
+        """
+        Whether the job's estimated peak fits in the available memory of the
+        node, less what the running jobs may still grow to. True off Linux.
+        """
+        available = availableMemory()
+        if available is None:
+            return True
+        # Memory the running cases may still claim up to their estimated peak
+        reserved = sum(
+            max(0, self.jobEstimate(other) - other.info.get("rss", 0))
+            for other in runningJobs
+        )
+        free = available - reserved
+        fits = self.jobEstimate(job) <= free
+        if not fits and not job.info.get("waitingForMemory"):
+            job.info["waitingForMemory"] = True
+            self.__print(
+                f"{job.name} waits for memory: needs "
+                f"{self.jobEstimate(job) / 1024**3:.1f} GB, "
+                f"{max(0, free) / 1024**3:.1f} GB free"
+            )
+        return fits
+
+    def __history(self):
+        try:
+            mtime = self.databasePath.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if self.__cache[0] != mtime:
+            database = pd.read_csv(self.databasePath)
+            if "peak_rss_mb" not in database:
+                history = None
+            else:
+                history = database.dropna(subset=["peak_rss_mb"])
+            self.__cache = (mtime, history)
+        return self.__cache[1]
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] MemoryModel: {string}")
@@ -0,0 +1,70 @@
+###################################################
+# Mesh morphing for small design changes
+###################################################
+#
+# Mesh morphing for small design changes: the displacements of the wall
+# curves between the geometry held by the mesh and the new design are
+# written to morph_displacements.csv, and replace_geometry.java morphs the
+# existing mesh with them instead of remeshing. It remeshes when the mesh
+# quality after morphing is too low, and records what it did in
+# morph_status.csv.
+#
+
+from pathlib import Path
+
+import numpy as np
+
+from SGMG.geometry_storage import GeometryStorage
+
+DISPLACEMENTS_FILE_NAME = "morph_displacements.csv"
+STATUS_FILE_NAME = "morph_status.csv"
+MESHED_SIM_SUFFIX = "_meshed.sim"
+
+
+def writeDisplacements(path: Path, displacements: np.ndarray) -> Path:
+    """Table for the tabular displacement profile of the morpher (2D, z = 0)."""
+    filePath = Path(path) / DISPLACEMENTS_FILE_NAME
+    # Curves share their end points
+    displacements = np.unique(displacements, axis=0)
+    with open(filePath, "w") as displacementFile:
+        displacementFile.write("X,Y,Z,dx,dy,dz\n")
+        for x, y, dx, dy in displacements:
+            displacementFile.write(f"{x},{y},0.0,{dx},{dy},0.0\n")
+    return filePath
+
+
+def maxDisplacement(displacements: np.ndarray) -> float:
+    return float(np.max(np.linalg.norm(displacements[:, 2:4], axis=1)))
+
+
+def readMorphStatus(casePath: Path) -> dict:
+    """{"mesh_update": "morph" | "remesh", "reason": ...}, empty if not morphed."""
+    status = {}
+    statusPath = Path(casePath) / STATUS_FILE_NAME
+    if statusPath.is_file():
+        with open(statusPath) as statusFile:
+            for line in statusFile:
+                entry = line.split(",", 1)
+                if len(entry) == 2:
+                    status[entry[0].strip()] = entry[1].strip()
+    return status
+
+
+def findMorphReference(dataPath: Path, geometry: GeometryStorage, excludeCase=None):
+    """
+    Case directory in dataPath with a saved mesh (<case>_meshed.sim) whose
+    geometry is closest to geometry, with the displacements to it, or None.
+    """
+    best = None
+    for meshedSimPath in Path(dataPath).glob(f"*/*{MESHED_SIM_SUFFIX}"):
+        casePath = meshedSimPath.parent
+        geometryPath = casePath / "geometry.json"
+        if casePath.name == excludeCase or not geometryPath.is_file():
+            continue
+        displacements = geometry.displacements(GeometryStorage.load(geometryPath))
+        if displacements is None:
+            continue
+        distance = maxDisplacement(displacements)
+        if best is None or distance < best[2]:
+            best = (casePath, displacements, distance)
+    return best
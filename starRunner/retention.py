@@ -0,0 +1,167 @@
+###################################################
+# Retention of the case directories
+###################################################
+#
+# Retention of the case directories. Full artifacts are kept for the top-k
+# designs and the most recent cases; for the others the logs and macros are
+# gzipped and the .sim files of failed or dominated designs are deleted.
+# The best design is always kept. Only cases recorded in database.csv are
+# touched, and never the protected ones: a case run again after a crash may
+# have a row from its first run. A pass runs in a background thread
+# (schedule()) or from the command line:
+#   python -m starRunner.retention --cfd cfd --topK 10 --recent 20
+#
+
+import argparse
+import gzip
+import shutil
+import threading
+from pathlib import Path
+from datetime import datetime
+
+import pandas as pd
+
+from starRunner.file_lock import FileLock
+
+# Relative to the case directory, the rotated logs included
+COMPRESS_PATTERNS = ["CFD_*.txt*", "*.java", "design_data.csv", "job.sh"]
+SIM_PATTERNS = ["*.sim"]
+
+
+class RetentionPolicy:
+    def __init__(
+        self,
+        dataPath: Path,
+        topK=10,
+        keepRecent=20,
+        objectiveColumn="overallDuctPressureLoss",
+        residualLimit=1e-3,
+    ):
+        self.dataPath = Path(dataPath)
+        self.databasePath = self.dataPath / "database.csv"
+        self.topK = topK
+        self.keepRecent = keepRecent
+        self.objectiveColumn = objectiveColumn
+        self.residualLimit = residualLimit
+        self.__thread = None
+        self.__rerun = False
+        self.__protected = set()
+        self.__lock = threading.Lock()
+
+    def classify(self):
+        """(cases kept in full, converged cases to compress, failed cases)."""
+        if not self.databasePath.is_file():
+            return [], [], []
+        with FileLock(self.dataPath / "database.csv.lock"):
+            database = pd.read_csv(self.databasePath)
+        # A case collected twice keeps its last row
+        database = database.drop_duplicates("casename", keep="last")
+
+        converged = pd.Series(True, index=database.index)
+        if "status" in database:
+            converged &= database["status"] == "done"
+        if "maxAveResidual" in database:
+            converged &= database["maxAveResidual"] <= self.residualLimit
+        if self.objectiveColumn in database:
+            converged &= database[self.objectiveColumn].notna()
+        else:
+            converged &= False
+
+        best = database[converged].nsmallest(max(1, self.topK), self.objectiveColumn)
+        kept = set(best["casename"]) | set(database["casename"].tail(self.keepRecent))
+        others = database[~database["casename"].isin(kept)]
+        dominated = list(others[converged[others.index]]["casename"])
+        failed = list(others[~converged[others.index]]["casename"])
+        return sorted(kept), dominated, failed
+
+    def apply(self, protected=()):
+        """
+        One pass, the cases named in protected (the running ones) are left alone.
+        Returns the bytes freed.
+        """
+        kept, dominated, failed = self.classify()
+        freed = 0
+        for caseName in dominated + failed:
+            casePath = self.dataPath / caseName
+            if caseName in protected or not casePath.is_dir():
+                continue
+            # Neither top-k nor recent: the .sim is never loaded again
+            for pattern in SIM_PATTERNS:
+                for simPath in casePath.glob(pattern):
+                    freed += simPath.stat().st_size
+                    simPath.unlink()
+            for pattern in COMPRESS_PATTERNS:
+                for filePath in casePath.glob(pattern):
+                    if filePath.suffix != ".gz":
+                        freed += self.__compress(filePath)
+        if freed:
+            self.__print(
+                f"{freed / 1024**2:.1f} MB freed, {len(kept)} cases kept in full"
+            )
+        return freed
+
+    def schedule(self, protected=()):
+        """Run a pass in the background; a request during a pass runs another one after it."""
+        with self.__lock:
+            self.__protected = set(protected)
+            if self.__thread is not None and self.__thread.is_alive():
+                self.__rerun = True
+                return
+            self.__thread = threading.Thread(target=self.__run, daemon=True)
+            self.__thread.start()
+
+    def wait(self):
+        thread = self.__thread
+        if thread is not None:
+            thread.join()
+
+    def __run(self):
+        while True:
+            with self.__lock:
+                protected = self.__protected
+            try:
+                self.apply(protected)
+            except Exception as error:
+                # Never take the optimization down for the housekeeping
+                self.__print(f"pass failed: {error}")
+            with self.__lock:
+                if not self.__rerun:
+                    self.__thread = None
+                    return
+                self.__rerun = False
+
+    @staticmethod
+    def __compress(filePath: Path):
+        size = filePath.stat().st_size
+        gzipPath = filePath.with_name(filePath.name + ".gz")
+        with open(filePath, "rb") as source, gzip.open(gzipPath, "wb") as target:
+            shutil.copyfileobj(source, target)
+        shutil.copystat(filePath, gzipPath)
+        filePath.unlink()
+        return size - gzipPath.stat().st_size
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] RetentionPolicy: {string}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune and compress case directories")
+    parser.add_argument("--cfd", type=Path, default=Path.cwd() / "cfd")
+    parser.add_argument("--topK", type=int, default=10, help="best designs kept in full")
+    parser.add_argument("--recent", type=int, default=20, help="latest cases kept in full")
+    parser.add_argument("--objective", default="overallDuctPressureLoss")
+    parser.add_argument("--residualLimit", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    RetentionPolicy(
+        args.cfd,
+        topK=args.topK,
+        keepRecent=args.recent,
+        objectiveColumn=args.objective,
+        residualLimit=args.residualLimit,
+    ).apply()
+
+
+if __name__ == "__main__":
+    main()
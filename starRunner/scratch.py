@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+###################################################
+# Runs a case in node-local scratch
+###################################################
+#
+# Runs a case in node-local scratch instead of the shared case directory:
+#   scratch.py --case cfd/case_1 --scratch '$TMPDIR' --sync results.csv \
+#              --sync 'CFD_*.txt' -- starccm+ -load ... -batch ...
+# The case directory is copied to scratch, arguments pointing into it are
+# rewritten, STAR runs there with BOGP_CASE_POINTER set to the scratch
+# directory, and only the --sync patterns are copied back. Meanwhile a
+# progress line is printed whenever the solver log grows, so the watchdog
+# still sees activity. Scratch directories left by killed runs on this
+# host are removed on the next start.
+# Standard library only, it runs on the compute node as is.
+#
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+OWNER_FILE_NAME = ".bogp_scratch_owner.json"
+SCRATCH_PREFIX = "bogp_"
+
+
+def isAlive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def cleanStale(scratchRoot: Path):
+    """Remove scratch directories of runs on this host whose process is gone."""
+    for scratchPath in scratchRoot.glob(f"{SCRATCH_PREFIX}*"):
+        try:
+            with open(scratchPath / OWNER_FILE_NAME) as ownerFile:
+                owner = json.load(ownerFile)
+        except (OSError, ValueError):
+            continue
+        if owner.get("host") == socket.gethostname() and not isAlive(owner["pid"]):
+            shutil.rmtree(scratchPath, ignore_errors=True)
+            log(f"removed stale {scratchPath}")
+
+
+def stageIn(casePath: Path, scratchRoot: Path) -> Path:
+    scratchPath = Path(
+        tempfile.mkdtemp(prefix=f"{SCRATCH_PREFIX}{casePath.name}_", dir=scratchRoot)
+    )
+    with open(scratchPath / OWNER_FILE_NAME, "w") as ownerFile:
+        json.dump({"host": socket.gethostname(), "pid": os.getpid()}, ownerFile)
+    for path in casePath.iterdir():
+        if path.is_file():
+            shutil.copy2(path, scratchPath / path.name)
+    with open(scratchPath / "case_pointer.txt", "w") as pointerFile:
+        pointerFile.write(str(scratchPath) + "\n")
+    return scratchPath
+
+
+def syncBack(scratchPath: Path, casePath: Path, patterns: list[str], retries=3):
+    """Copy the outputs matching patterns back, True if all of them made it."""
+    paths = sorted({path for pattern in patterns for path in scratchPath.glob(pattern)})
+    for attempt in range(retries):
+        failed = []
+        for path in paths:
+            try:
+                # Next to the target and renamed, a reader never sees half a file
+                tmpPath = casePath / f".{path.name}.sync"
+                shutil.copy2(path, tmpPath)
+                os.replace(tmpPath, casePath / path.name)
+            except OSError as error:
+                failed.append((path, error))
+        if not failed:
+            return True
+        paths = [path for path, _ in failed]
+        log(f"sync back failed for {len(failed)} files: {failed[0][1]}")
+        time.sleep(5 * 2**attempt)
+    return False
+
+
+def tail(path: Path, nBytes=200):
+    try:
+        with open(path, "rb") as logFile:
+            logFile.seek(0, 2)
+            logFile.seek(max(0, logFile.tell() - nBytes))
+            lines = logFile.read().decode(errors="replace").strip().splitlines()
+        return lines[-1] if lines else ""
+    except OSError:
+        return ""
+
+
+def log(message):
+    print(f"[scratch] {message}", flush=True)
+
+
+def run(args) -> int:
+    casePath = Path(args.case).resolve()
+    scratchRoot = Path(os.path.expandvars(args.scratch)).expanduser()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    scratchPath = None
+    try:
+        scratchRoot.mkdir(parents=True, exist_ok=True)
+        cleanStale(scratchRoot)
+        scratchPath = stageIn(casePath, scratchRoot)
+    except OSError as error:
+        # No usable scratch (full, missing): run in the case directory as usual
+        log(f"staging failed, running in {casePath}: {error}")
+        if scratchPath is not None:
+            shutil.rmtree(scratchPath, ignore_errors=True)
+        return subprocess.call(command, cwd=casePath)
+    log(f"running in {scratchPath}")
+
+    # Arguments pointing into the case directory now point into scratch
+    command = [
+        argument.replace(str(casePath), str(scratchPath)) for argument in command
+    ]
+    env = os.environ.copy()
+    env["BOGP_CASE_POINTER"] = str(scratchPath / "case_pointer.txt")
+    stdoutPath = scratchPath / args.stdout
+    stderrPath = scratchPath / args.stderr
+
+    stopSignal = []
+
+    def stop(signum, frame):
+        # Stopped by the watchdog or a cancel: the outputs are still synced back
+        stopSignal.append(signum)
+        if proc is not None and proc.poll() is None:
+            proc.send_signal(signum)
+
+    proc = None
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    with open(stdoutPath, "w") as stdout, open(stderrPath, "w") as stderr:
+        proc = subprocess.Popen(
+            command, stdout=stdout, stderr=stderr, cwd=scratchPath, env=env
+        )
+        lastSize = 0
+        while True:
+            try:
+                returncode = proc.wait(timeout=args.heartbeat)
+                break
+            except subprocess.TimeoutExpired:
+                size = stdoutPath.stat().st_size
+                if size != lastSize:
+                    lastSize = size
+                    log(f"{size / 1024**2:.1f} MB of output, last: {tail(stdoutPath)}")
+
+    synced = syncBack(scratchPath, casePath, args.sync)
+    if synced or args.keepOnFailure is False:
+        shutil.rmtree(scratchPath, ignore_errors=True)
+    else:
+        log(f"outputs not synced back, left in {scratchPath}")
+    if stopSignal:
+        return 128 + stopSignal[0]
+    return returncode if synced else (returncode or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a case in node-local scratch")
+    parser.add_argument("--case", required=True, help="case directory")
+    parser.add_argument("--scratch", required=True, help="scratch root, may use $VARS")
+    parser.add_argument(
+        "--sync", action="append", default=[], help="glob of outputs to copy back"
+    )
+    parser.add_argument("--stdout", default="CFD_out.txt")
+    parser.add_argument("--stderr", default="CFD_err.txt")
+    parser.add_argument(
+        "--heartbeat", type=float, default=60.0, help="seconds between progress lines"
+    )
+    parser.add_argument(
+        "--noKeepOnFailure",
+        dest="keepOnFailure",
+        action="store_false",
+        help="remove the scratch directory even if the sync back failed",
+    )
+    parser.add_argument("command", nargs=argparse.REMAINDER)
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
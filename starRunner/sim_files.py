@@ -0,0 +1,112 @@
+###################################################
+# Staging of the .sim file a case loads
+###################################################
+#
+# Staging of the .sim file a case loads, without a full copy per design:
+#   reflink   copy-on-write clone, on filesystems that support it
+#             (btrfs, XFS, ...), falls back to hardlink
+#   hardlink  a second name for the same file, nothing may save over it;
+#             falls back to copy (e.g. across filesystems)
+#   load      no file in the case directory, STAR loads the shared base
+#             read-only and the macros find the case directory through
+#             BOGP_CASE_POINTER; files are saved there only when asked for
+#             (keep_solution, save_mesh)
+#   copy      a full copy
+#   auto      reflink, else load
+#
+# The campaign base: the geometry of the base .sim is not known, so the
+# first case of a campaign rebuilds all sketches and saves its sim
+# (save_base), which later cases load and compare their geometry against.
+#
+
+import os
+import shutil
+from pathlib import Path
+
+# FICLONE from linux/fs.h
+FICLONE = 0x40049409
+CASE_POINTER_FILE_NAME = "case_pointer.txt"
+CAMPAIGN_BASE_DIR_NAME = "campaign_base"
+BASE_SIM_SUFFIX = "_base.sim"
+
+
+def reflink(sourcePath: Path, targetPath: Path) -> bool:
+    """Clone sourcePath to targetPath, False if the filesystem cannot."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(sourcePath, "rb") as source, open(targetPath, "wb") as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        Path(targetPath).unlink(missing_ok=True)
+        return False
+    shutil.copystat(sourcePath, targetPath)
+    return True
+
+
+def stageSimFile(sourcePath: Path, targetPath: Path, strategy="auto"):
+    """
+    Returns (path STAR should load, strategy used). With "load" the returned
+    path is sourcePath and nothing is written. A strategy that asks for a file
+    in the case directory falls back to one that still writes it.
+    """
+    sourcePath, targetPath = Path(sourcePath), Path(targetPath)
+    targetPath.unlink(missing_ok=True)
+    if strategy in ("auto", "reflink"):
+        if reflink(sourcePath, targetPath):
+            return targetPath, "reflink"
+        strategy = "load" if strategy == "auto" else "hardlink"
+    if strategy == "hardlink":
+        try:
+            os.link(sourcePath, targetPath)
+            return targetPath, "hardlink"
+        except OSError:
+            strategy = "copy"
+    if strategy == "load":
+        return sourcePath, "load"
+    shutil.copy2(sourcePath, targetPath)
+    return targetPath, "copy"
+
+
+def writeCasePointer(casePath: Path) -> Path:
+    """Pointer file naming casePath, for the BOGP_CASE_POINTER of a case."""
+    pointerPath = Path(casePath) / CASE_POINTER_FILE_NAME
+    with open(pointerPath, "w") as pointerFile:
+        pointerFile.write(str(Path(casePath).resolve()) + "\n")
+    return pointerPath
+
+
+def findCampaignBase(dataPath: Path):
+    """(sim, geometry.json) of the campaign base, None until a case saved one."""
+    basePath = Path(dataPath) / CAMPAIGN_BASE_DIR_NAME
+    simPath, geometryPath = basePath / "base.sim", basePath / "geometry.json"
+    if simPath.is_file() and geometryPath.is_file():
+        return simPath, geometryPath
+    return None
+
+
+def publishCampaignBase(casePath: Path, caseName: str, dataPath: Path) -> bool:
+    """
+    Move the sim the case saved with save_base and its geometry.json to the
+    campaign base. Cases may finish concurrently: False if another case was
+    first, its sim is then deleted.
+    """
+    casePath, dataPath = Path(casePath), Path(dataPath)
+    savedPath = casePath / (caseName + BASE_SIM_SUFFIX)
+    basePath = dataPath / CAMPAIGN_BASE_DIR_NAME
+    if basePath.exists():
+        savedPath.unlink(missing_ok=True)
+        return False
+    tmpPath = dataPath / f".{CAMPAIGN_BASE_DIR_NAME}.{caseName}"
+    tmpPath.mkdir(exist_ok=True)
+    shutil.copy2(casePath / "geometry.json", tmpPath / "geometry.json")
+    os.replace(savedPath, tmpPath / "base.sim")
+    try:
+        # Atomic, fails if the directory exists
+        os.rename(tmpPath, basePath)
+    except OSError:
+        shutil.rmtree(tmpPath, ignore_errors=True)
+        return False
+    return True
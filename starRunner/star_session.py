@@ -0,0 +1,195 @@
+###################################################
+# Persistent STAR-CCM+ server session reused
+#  across cases
+###################################################
+#
+# A STAR-CCM+ server that is started once per worker and reused for
+# successive cases, so the license checkout and the .sim load are paid
+# once instead of for every design.
+#
+
+import os
+import shlex
+import socket
+import subprocess
+import time
+from pathlib import Path
+from datetime import datetime
+
+from starRunner.sim_files import stageSimFile
+
+
+def supersedeCadModels(
+    cadModels: dict, modelName: str, caseName: str, bodies, bound=True
+):
+    """
+    CAD models of the sim after a case: the model named modelName is renamed
+    when the case builds a new one with the given bodies, and a model is removed
+    once none of its bodies backs a part. cadModels: model name -> bodies whose
+    parts it backs. bound=False when the parts were kept (a morphed mesh), the
+    new model then backs nothing and nothing is removed.
+    Returns (cadModels after the case, new name of the previous model, models
+    to remove after the parts are bound).
+    """
+    supersededName = f"{modelName}_before_{caseName}"
+    if not bodies:
+        # No sketch changed, no model is built
+        unchanged = {name: set(modelBodies) for name, modelBodies in cadModels.items()}
+        return unchanged, None, []
+    after, removed = {}, []
+    for name, modelBodies in cadModels.items():
+        if name == modelName:
+            name = supersededName
+        modelBodies = set(modelBodies) - set(bodies) if bound else set(modelBodies)
+        if bound and not modelBodies:
+            removed.append(name)
+        else:
+            after[name] = modelBodies
+    after[modelName] = set(bodies) if bound else set()
+    return after, supersededName, removed
+
+
+def getFreePort(host="localhost"):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class StarSession:
+    """
+    The macros in refFiles read and write their files in the directory named in
+    the BOGP_CASE_POINTER file, which is updated before each case is driven
+    through the server.
+    """
+
+    def __init__(
+        self,
+        simFilePath: Path,
+        sessionPath: Path,
+        STARCCMPath="starccm+",
+        nCPUs=2,
+        host="localhost",
+        port=None,
+        classpath=None,
+        startTimeout=600,
+        simFileStrategy="auto",
+    ):
+        self.baseSimFilePath = Path(simFilePath)
+        self.sessionPath = Path(sessionPath)
+        self.STARCCMPath = STARCCMPath
+        self.nCPUs = nCPUs
+        self.host = host
+        self.port = port
+        self.classpath = classpath
+        self.startTimeout = startTimeout
+        # How the base sim is staged, see starRunner.sim_files
+        self.simFileStrategy = simFileStrategy
+        self.casePointerPath = self.sessionPath / "current_case.txt"
+        self.proc = None
+        # geometry.json of the design currently held by the loaded sim
+        self.geometryPath = None
+        # geometry.json the kept mesh was generated or morphed for (mesh morphing)
+        self.meshGeometryPath = None
+        # CAD model name -> bodies whose parts it backs, None for the base sim
+        # (see supersedeCadModels)
+        self.cadModels = None
+
+    def start(self):
+        self.sessionPath.mkdir(parents=True, exist_ok=True)
+        self.simFilePath, _ = stageSimFile(
+            self.baseSimFilePath,
+            self.sessionPath / self.baseSimFilePath.name,
+            self.simFileStrategy,
+        )
+        if self.port is None:
+            self.port = getFreePort(self.host)
+
+        env = os.environ.copy()
+        env["BOGP_CASE_POINTER"] = str(self.casePointerPath)
+        command = shlex.split(self.STARCCMPath) + [
+            "-server",
+            "-port",
+            str(self.port),
+            "-np",
+            str(self.nCPUs),
+        ]
+        if self.classpath is not None:
+            command += ["-classpath", str(self.classpath)]
+        command += ["-load", str(self.simFilePath)]
+
+        self.__print(f"Starting server on {self.host}:{self.port}...")
+        self.logFile = open(self.sessionPath / "server_out.txt", "w")
+        self.proc = subprocess.Popen(
+            command,
+            stdout=self.logFile,
+            stderr=subprocess.STDOUT,
+            cwd=self.sessionPath,
+            env=env,
+        )
+        self.__waitForServer()
+        self.__print("Server ready")
+        return self
+
+    def isAlive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def runMacros(self, macroPaths: list, casePath: Path, stdout, stderr) -> int:
+        """Play the macros in the server for the case in casePath."""
+        if not self.isAlive():
+            raise RuntimeError("STAR-CCM+ server is not running")
+
+        # Replace atomically so a macro never reads a half written path
+        tmpPointerPath = self.casePointerPath.with_suffix(".tmp")
+        with open(tmpPointerPath, "w") as pointerFile:
+            pointerFile.write(str(Path(casePath).resolve()) + "\n")
+        os.replace(tmpPointerPath, self.casePointerPath)
+
+        command = shlex.split(self.STARCCMPath) + [
+            "-host",
+            self.host,
+            "-port",
+            str(self.port),
+            "-batch",
+            ",".join(str(macroPath) for macroPath in macroPaths),
+        ]
+        proc = subprocess.Popen(command, stdout=stdout, stderr=stderr, cwd=casePath)
+        return proc.wait()
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self.__print("Stopping server...")
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.logFile.close()
+        self.proc = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __waitForServer(self):
+        startTime = time.time()
+        while time.time() - startTime < self.startTimeout:
+            if self.proc.poll() is not None:
+                raise RuntimeError(
+                    f"STAR-CCM+ server exited with code {self.proc.returncode}, "
+                    f"see {self.sessionPath / "server_out.txt"}"
+                )
+            try:
+                with socket.create_connection((self.host, self.port), timeout=1):
+                    return
+            except OSError:
+                time.sleep(1)
+        self.stop()
+        raise RuntimeError(f"STAR-CCM+ server did not start in {self.startTimeout} s")
+
+    def __print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] StarSession: {string}")
@@ -0,0 +1,238 @@
+###################################################
+# Per-phase time and resource telemetry of the
+#  cases
+###################################################
+#
+# Where the time of a case goes: wall and CPU seconds of every phase, from
+# the GP fit and acquisition through geometry, macros, .sim staging, the
+# STAR run and post-processing to the database update and GP plots, plus
+# STAR's peak memory. The driver appends one JSON record per case to
+# cfd/telemetry.jsonl. The summary gives percentiles per phase, the trend
+# over the campaign and the Python-side time against the solver time:
+#   python -m starRunner.telemetry cfd/telemetry.jsonl [--last 50] [--json]
+#
+
+import argparse
+import json
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+TELEMETRY_FILE_NAME = "telemetry.jsonl"
+
+# Phases in the order of a case, for the summary
+PHASES = [
+    "gp_read",
+    "gp_fit",
+    "acquisition",
+    "geometry_build",
+    "geometry_plot",
+    "morph_preparation",
+    "warm_start_lookup",
+    "macro_generation",
+    "sim_staging",
+    "star_run",
+    "results_parsing",
+    "database_update",
+    "gp_update",
+    "convergence_plot",
+    "gp_surface_plot",
+]
+SOLVER_PHASES = ["star_run"]
+
+# gpOpt_TBL.last_timings phase -> telemetry phase
+GP_PHASES = {
+    "read": "gp_read",
+    "read_runtimes": "gp_read",
+    "fit": "gp_fit",
+    "fit_runtime": "gp_fit",
+    "acquisition": "acquisition",
+    "update_samples": "gp_update",
+    "convergence_plot": "convergence_plot",
+    "surface_plot": "gp_surface_plot",
+}
+
+
+class PhaseTimer:
+    """Wall and CPU seconds per phase, a phase timed again adds up."""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        # CPU of the calling thread: the async driver prepares cases in threads
+        wallStart, cpuStart = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wallStart, time.thread_time() - cpuStart)
+
+    def add(self, name: str, wall, cpu=None):
+        if wall is None:
+            return
+        entry = self.phases.setdefault(name, {"wall": 0.0, "cpu": None})
+        entry["wall"] += wall
+        if cpu is not None:
+            entry["cpu"] = (entry["cpu"] or 0.0) + cpu
+
+    def addTimings(self, timings: dict, names=GP_PHASES):
+        """timings: phase -> (wall, cpu), as gpOpt_TBL.last_timings."""
+        for phase, (wall, cpu) in timings.items():
+            self.add(names.get(phase, phase), wall, cpu)
+
+    def toDict(self) -> dict:
+        return {name: dict(entry) for name, entry in self.phases.items()}
+
+
+def appendRecord(telemetryPath: Path, record: dict):
+    record = {"time": time.time(), **record}
+    line = json.dumps(record) + "\n"
+    # A single O_APPEND write, a crash never leaves half a record behind others
+    fd = os.open(telemetryPath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def readRecords(telemetryPath: Path) -> list[dict]:
+    records = []
+    with open(telemetryPath) as telemetryFile:
+        for line in telemetryFile:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def percentile(values: list, q: float) -> float:
+    """q-th percentile (0-100), linear between the closest ranks."""
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def trend(values: list):
+    """Median of the last third over the median of the first, None if too few."""
+    if len(values) < 6:
+        return None
+    third = len(values) // 3
+    first = statistics.median(values[:third])
+    if first <= 0:
+        return None
+    return statistics.median(values[-third:]) / first
+
+
+def summarize(records: list[dict]) -> dict:
+    """Percentiles of wall and CPU time per phase, trends and the overhead ratio."""
+    names = PHASES + sorted(
+        {name for record in records for name in record["phases"]} - set(PHASES)
+    )
+    phases = {}
+    for name in names:
+        walls = [
+            record["phases"][name]["wall"] for record in records if name in record["phases"]
+        ]
+        if not walls:
+            continue
+        cpus = [
+            record["phases"][name]["cpu"]
+            for record in records
+            if name in record["phases"] and record["phases"][name]["cpu"] is not None
+        ]
+        phases[name] = {
+            "n": len(walls),
+            "p50": percentile(walls, 50),
+            "p90": percentile(walls, 90),
+            "p99": percentile(walls, 99),
+            "max": max(walls),
+            "total": sum(walls),
+            "cpu_p50": percentile(cpus, 50) if cpus else None,
+            "trend": trend(walls),
+        }
+
+    pythonTimes, solverTimes, ratios = [], [], []
+    for record in records:
+        python = sum(
+            entry["wall"] for name, entry in record["phases"].items() if name not in SOLVER_PHASES
+        )
+        solver = sum(
+            entry["wall"] for name, entry in record["phases"].items() if name in SOLVER_PHASES
+        )
+        pythonTimes.append(python)
+        solverTimes.append(solver)
+        if solver > 0:
+            ratios.append(python / solver)
+    peaks = [record["star_peak_rss_mb"] for record in records if record.get("star_peak_rss_mb")]
+    return {
+        "cases": len(records),
+        "phases": phases,
+        "python_time_p50": percentile(pythonTimes, 50) if records else None,
+        "solver_time_p50": percentile(solverTimes, 50) if records else None,
+        "overhead_ratio_p50": percentile(ratios, 50) if ratios else None,
+        "overhead_ratio_trend": trend(ratios),
+        "star_peak_rss_mb_p50": percentile(peaks, 50) if peaks else None,
+        "star_peak_rss_mb_max": max(peaks) if peaks else None,
+    }
+
+
+def formatSummary(summary: dict) -> str:
+    def seconds(value):
+        return "-" if value is None else f"{value:.3g}"
+
+    lines = [
+        f"{summary['cases']} cases",
+        f"{'phase':<20}{'n':>6}{'p50 s':>10}{'p90 s':>10}{'p99 s':>10}"
+        f"{'max s':>10}{'cpu p50':>10}{'share':>8}{'trend':>8}",
+    ]
+    total = sum(phase["total"] for phase in summary["phases"].values()) or 1.0
+    for name, phase in summary["phases"].items():
+        lines.append(
+            f"{name:<20}{phase['n']:>6}{seconds(phase['p50']):>10}{seconds(phase['p90']):>10}"
+            f"{seconds(phase['p99']):>10}{seconds(phase['max']):>10}"
+            f"{seconds(phase['cpu_p50']):>10}{phase['total'] / total:>8.1%}"
+            f"{'-' if phase['trend'] is None else f'x{phase['trend']:.2f}':>8}"
+        )
+    if summary["overhead_ratio_p50"] is not None:
+        lines.append(
+            f"Python-side time per case {seconds(summary['python_time_p50'])} s (p50), "
+            f"{summary['overhead_ratio_p50']:.1%} of the solver time"
+            + (
+                ""
+                if summary["overhead_ratio_trend"] is None
+                else f", trend x{summary['overhead_ratio_trend']:.2f}"
+            )
+        )
+    if summary["star_peak_rss_mb_max"] is not None:
+        lines.append(
+            f"STAR peak memory {summary['star_peak_rss_mb_p50']:.0f} MB (p50), "
+            f"{summary['star_peak_rss_mb_max']:.0f} MB (max)"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the per-case telemetry")
+    parser.add_argument("telemetry", type=Path, help="telemetry.jsonl of the campaign")
+    parser.add_argument("--last", type=int, default=None, help="only the latest cases")
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    args = parser.parse_args()
+
+    records = readRecords(args.telemetry)
+    if args.last is not None:
+        records = records[-args.last :]
+    summary = summarize(records)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(formatSummary(summary))
+
+
+if __name__ == "__main__":
+    main()
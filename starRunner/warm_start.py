@@ -0,0 +1,60 @@
+###################################################
+# Warm start from the nearest converged solution
+###################################################
+#
+# Warm start: converged cases keep a field snapshot (solution_snapshot.csv,
+# written by post_star), and a new case is initialized by warm_start.java
+# from the snapshot of the nearest converged design in the normalized
+# design space.
+#
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_FILE_NAME = "solution_snapshot.csv"
+
+
+def findNearestSnapshot(
+    databasePath: Path,
+    dataPath: Path,
+    design,
+    variableNames: list[str],
+    designSpace=None,
+    residualLimit=None,
+):
+    """
+    Returns (caseName, snapshotPath, distance) of the nearest converged case that
+    has a snapshot, or None. designSpace: [low, high] per variable for the
+    normalization, the span of the evaluated designs if None.
+    """
+    if not Path(databasePath).is_file():
+        return None
+    database = pd.read_csv(databasePath)
+    if any(name not in database for name in variableNames):
+        return None
+    if "status" in database:
+        database = database[database["status"] == "done"]
+    if residualLimit is not None and "maxAveResidual" in database:
+        database = database[database["maxAveResidual"] <= residualLimit]
+    snapshotPaths = [
+        Path(dataPath) / caseName / SNAPSHOT_FILE_NAME for caseName in database["casename"]
+    ]
+    hasSnapshot = np.array([path.is_file() for path in snapshotPaths], dtype=bool)
+    if not hasSnapshot.any():
+        return None
+    database = database[hasSnapshot]
+    snapshotPaths = [path for path, has in zip(snapshotPaths, hasSnapshot) if has]
+
+    designs = database[variableNames].to_numpy(dtype=float)
+    if designSpace is not None:
+        low, high = np.asarray(designSpace, dtype=float).T
+    else:
+        low, high = designs.min(axis=0), designs.max(axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    distances = np.linalg.norm(
+        (designs - np.asarray(design, dtype=float)) / span, axis=1
+    )
+    nearest = int(np.argmin(distances))
+    return database["casename"].iloc[nearest], snapshotPaths[nearest], distances[nearest]
@@ -0,0 +1,105 @@
+###################################################
+# Watchdog for running cases
+###################################################
+#
+# Watchdog for running cases: wall-clock limit, log inactivity (hang) and
+# license or transient errors in the STAR logs. The executors stop the
+# flagged cases and retry them with an exponential backoff.
+#
+
+import re
+import time
+from pathlib import Path
+
+from starRunner.executors import CaseJob
+
+LICENSE_PATTERNS = [
+    r"licen[cs]e (checkout|server|error|is not available)",
+    r"unable to check ?out",
+    r"FLEXlm",
+    r"lmgrd",
+    r"Waiting for licen[cs]e",
+]
+TRANSIENT_PATTERNS = [
+    r"Connection (refused|reset|timed out)",
+    r"Broken pipe",
+    r"Server::start failed",
+    r"MPI_ABORT",
+]
+
+
+class Watchdog:
+    """
+    check() is called for running jobs, classifyFailure() for jobs that exited
+    with an error. Both return the reason, or None if nothing is wrong.
+    Reasons: "timeout", "hung", "license", "transient".
+    """
+
+    def __init__(
+        self,
+        wallClockLimit=None,
+        inactivityLimit=None,
+        maxRetries=2,
+        retryBackoff=60.0,
+        retryOn=("license", "transient", "hung"),
+        tailBytes=64 * 1024,
+    ):
+        # Seconds, None to disable
+        self.wallClockLimit = wallClockLimit
+        self.inactivityLimit = inactivityLimit
+        self.maxRetries = maxRetries
+        # Delay before the first retry, doubled for each further one
+        self.retryBackoff = retryBackoff
+        self.retryOn = retryOn
+        # Only the end of the logs is searched for errors
+        self.tailBytes = tailBytes
+        self.licensePattern = re.compile("|".join(LICENSE_PATTERNS), re.IGNORECASE)
+        self.transientPattern = re.compile("|".join(TRANSIENT_PATTERNS), re.IGNORECASE)
+
+    def check(self, job: CaseJob):
+        now = time.time()
+        if job.startTime is None:
+            return None
+        if self.wallClockLimit is not None and now - job.startTime > self.wallClockLimit:
+            return "timeout"
+        if self.inactivityLimit is not None:
+            lastActivity = max([job.startTime] + self.__mtimes(job))
+            if now - lastActivity > self.inactivityLimit:
+                return "hung"
+        if self.licensePattern.search(self.__tail(job.stderrPath)):
+            # STAR may wait for a license for ever
+            return "license"
+        return None
+
+    def classifyFailure(self, job: CaseJob):
+        logTail = self.__tail(job.stderrPath) + self.__tail(job.stdoutPath)
+        if self.licensePattern.search(logTail):
+            return "license"
+        if self.transientPattern.search(logTail):
+            return "transient"
+        return None
+
+    def shouldRetry(self, job: CaseJob, reason):
+        return reason in self.retryOn and job.attempt <= self.maxRetries
+
+    def retryDelay(self, job: CaseJob):
+        return self.retryBackoff * 2 ** (job.attempt - 1)
+
+    def __mtimes(self, job: CaseJob):
+        mtimes = []
+        for logPath in (job.stdoutPath, job.stderrPath):
+            try:
+                mtimes.append(Path(logPath).stat().st_mtime)
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def __tail(self, logPath: Path):
+        try:
+            with open(logPath, "rb") as logFile:
+                logFile.seek(0, 2)
+                size = logFile.tell()
+                logFile.seek(max(0, size - self.tailBytes))
+                return logFile.read().decode(errors="replace")
+        except FileNotFoundError:
+            return ""
@@ -0,0 +1,349 @@
+###################################################
+# Work queue on a shared filesystem
+###################################################
+#
+# Work queue on a shared filesystem, no message broker needed. The
+# optimizer puts designs in the queue, workers on any node that sees the
+# queue directory claim them, run the case and publish the objective:
+#   python -m starRunner.work_queue worker --queue cfd/queue
+#
+#   queue/pending/<case>.json            designs waiting for a worker
+#   queue/claimed/<case>.<token>.json    claimed, mtime is the heartbeat
+#   queue/results/<case>.json            published, not yet consumed
+#   queue/consumed/<case>.json           handed to the optimizer
+#
+# A claim is a rename from pending/ to claimed/, so only one worker gets a
+# design. Claims whose heartbeat stops (dead worker) are renamed back to
+# pending/. A worker that loses its claim stops its run of the case and
+# publishes nothing, the rerun elsewhere gives the result. A case may thus
+# run twice, but never both at once, and its result is consumed once.
+#
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from datetime import datetime
+
+
+def writeJson(path: Path, content: dict):
+    # Write next to the target and rename, readers never see a partial file
+    tmpPath = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmpPath, "w") as tmpFile:
+        json.dump(content, tmpFile)
+    os.replace(tmpPath, path)
+
+
+def readJson(path: Path):
+    with open(path) as jsonFile:
+        return json.load(jsonFile)
+
+
+class WorkQueue:
+    def __init__(self, queuePath: Path, staleAfter=300.0, maxAttempts=3):
+        self.queuePath = Path(queuePath)
+        # Seconds without heartbeat before a claim is considered dead
+        self.staleAfter = staleAfter
+        # Runs of a case before it is published as failed
+        self.maxAttempts = maxAttempts
+        self.pendingPath = self.queuePath / "pending"
+        self.claimedPath = self.queuePath / "claimed"
+        self.resultsPath = self.queuePath / "results"
+        self.consumedPath = self.queuePath / "consumed"
+        for path in (
+            self.pendingPath,
+            self.claimedPath,
+            self.resultsPath,
+            self.consumedPath,
+        ):
+            path.mkdir(parents=True, exist_ok=True)
+
+    ### Optimizer side
+    def put(self, caseName: str, designVariables, settings: dict = None):
+        """
+        settings: StarManager attributes the worker sets before running the case.
+        """
+        task = {
+            "caseName": caseName,
+            "designVariables": [float(value) for value in designVariables],
+            "settings": settings or {},
+            "attempt": 0,
+        }
+        writeJson(self.pendingPath / f"{caseName}.json", task)
+
+    def collect(self) -> list[dict]:
+        """Results published since the last call, each case is returned once."""
+        results = []
+        for resultPath in sorted(self.resultsPath.glob("*.json")):
+            consumedPath = self.consumedPath / resultPath.name
+            if consumedPath.exists():
+                # A rerun of a case whose result was already consumed
+                resultPath.unlink(missing_ok=True)
+                continue
+            try:
+                os.rename(resultPath, consumedPath)
+            except FileNotFoundError:
+                continue
+            results.append(readJson(consumedPath))
+        return results
+
+    def waitResults(self, pollInterval=10.0) -> list[dict]:
+        """Block until at least one result arrives, dead claims are requeued meanwhile."""
+        while True:
+            results = self.collect()
+            if results:
+                return results
+            self.requeueStale()
+            time.sleep(pollInterval)
+
+    def requeueStale(self):
+        for claimPath in self.claimedPath.glob("*.json"):
+            if not self.__isStale(claimPath):
+                continue
+            caseName = claimPath.name.rsplit(".", 2)[0]
+            if (self.resultsPath / f"{caseName}.json").exists() or (
+                self.consumedPath / f"{caseName}.json"
+            ).exists():
+                # The worker published and died before releasing the claim
+                claimPath.unlink(missing_ok=True)
+                continue
+            try:
+                task = readJson(claimPath)
+                os.rename(claimPath, self.pendingPath / f"{caseName}.json")
+            except FileNotFoundError:
+                # Released or requeued by someone else in the meantime
+                continue
+            self._print(f"{caseName} requeued, claim of {task.get('worker')} is dead")
+
+    def __isStale(self, claimPath: Path):
+        try:
+            age = time.time() - claimPath.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if age > self.staleAfter:
+            return True
+        try:
+            worker = readJson(claimPath).get("worker", {})
+        except (FileNotFoundError, ValueError):
+            return False
+        # A dead worker on this host is detected without waiting for the timeout
+        if worker.get("host") == socket.gethostname() and "pid" in worker:
+            try:
+                os.kill(worker["pid"], 0)
+            except ProcessLookupError:
+                return True
+            except PermissionError:
+                pass
+        return False
+
+    @staticmethod
+    def __mtime(path: Path):
+        try:
+            return path.stat().st_mtime
+        except FileNotFoundError:
+            return float("inf")
+
+    def inFlight(self) -> list[str]:
+        """Cases queued or running."""
+        caseNames = [path.stem for path in self.pendingPath.glob("*.json")]
+        caseNames += [
+            path.name.rsplit(".", 2)[0] for path in self.claimedPath.glob("*.json")
+        ]
+        return caseNames
+
+    ### Worker side
+    def claim(self, worker: dict):
+        """Returns (task, claimPath) of the oldest pending design, or None."""
+        pendingPaths = sorted(self.pendingPath.glob("*.json"), key=self.__mtime)
+        for pendingPath in pendingPaths:
+            caseName = pendingPath.stem
+            token = uuid.uuid4().hex
+            claimPath = self.claimedPath / f"{caseName}.{token}.json"
+            try:
+                os.rename(pendingPath, claimPath)
+            except FileNotFoundError:
+                # Claimed by another worker first
+                continue
+            # The rename keeps the mtime of the pending file, start the heartbeat
+            os.utime(claimPath)
+            task = readJson(claimPath)
+            task["attempt"] += 1
+            task["worker"] = worker
+            writeJson(claimPath, task)
+            return task, claimPath
+        return None
+
+    def heartbeat(self, claimPath: Path):
+        """Returns False if the claim was lost, i.e. the case was requeued."""
+        try:
+            os.utime(claimPath)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def publish(self, claimPath: Path, task: dict, objective, status="done"):
+        result = {
+            "caseName": task["caseName"],
+            "designVariables": task["designVariables"],
+            "objective": objective,
+            "status": status,
+            "attempt": task["attempt"],
+            "worker": task["worker"],
+        }
+        writeJson(self.resultsPath / f"{task['caseName']}.json", result)
+        claimPath.unlink(missing_ok=True)
+
+    def release(self, claimPath: Path, task: dict):
+        """Put a claimed design back, e.g. when the worker is stopped."""
+        try:
+            os.rename(claimPath, self.pendingPath / f"{task['caseName']}.json")
+        except FileNotFoundError:
+            pass
+
+    def _print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] {type(self).__name__}: {string}")
+
+
+class QueueWorker:
+    """
+    Claims designs from the queue and runs them with StarManager.runSingleCase
+    until the queue has been idle for idleTimeout seconds (None: forever).
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        dataPath: Path,
+        refFilesPath: Path,
+        pollInterval=10.0,
+        idleTimeout=None,
+    ):
+        self.queue = queue
+        self.dataPath = Path(dataPath)
+        self.refFilesPath = Path(refFilesPath)
+        self.pollInterval = pollInterval
+        self.idleTimeout = idleTimeout
+        self.worker = {
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "id": f"{socket.gethostname()}:{os.getpid()}",
+        }
+
+    def run(self):
+        self._print(f"Worker {self.worker['id']} started")
+        idleSince = time.time()
+        while True:
+            self.queue.requeueStale()
+            claimed = self.queue.claim(self.worker)
+            if claimed is None:
+                if (
+                    self.idleTimeout is not None
+                    and time.time() - idleSince > self.idleTimeout
+                ):
+                    break
+                time.sleep(self.pollInterval)
+                continue
+            self.runTask(*claimed)
+            idleSince = time.time()
+        self._print(f"Worker {self.worker['id']} stopped, queue idle")
+
+    def runTask(self, task: dict, claimPath: Path):
+        from case_config import StarManager
+
+        caseName = task["caseName"]
+        if task["attempt"] > self.queue.maxAttempts:
+            self._print(f"{caseName} failed {self.queue.maxAttempts} times, giving up")
+            self.queue.publish(claimPath, task, 1, status="failed")
+            return
+
+        manager = StarManager()
+        for key, value in task["settings"].items():
+            setattr(manager, key, value)
+        stopHeartbeat = threading.Event()
+        claimLost = threading.Event()
+        heartbeat = threading.Thread(
+            target=self.__beat,
+            args=(claimPath, manager, stopHeartbeat, claimLost),
+            daemon=True,
+        )
+        heartbeat.start()
+        self._print(f"{caseName} claimed (attempt {task['attempt']})")
+        try:
+            objective = None
+            manager.prepareCase(
+                caseName, task["designVariables"], self.dataPath, self.refFilesPath
+            )
+            if not claimLost.is_set():
+                manager.submitCase()
+                if manager.starSession is None:
+                    manager.executor.wait(manager.job)
+            # Once more, the heartbeat may not have looked since the case ended
+            if not claimLost.is_set() and not self.queue.heartbeat(claimPath):
+                claimLost.set()
+            # The case was requeued and runs elsewhere: leave its results to that run
+            if not claimLost.is_set():
+                objective = manager.collectResults()
+            status = "done"
+        except Exception as error:
+            self._print(f"{caseName} failed: {error}")
+            objective, status = 1, "failed"
+        except KeyboardInterrupt:
+            self.queue.release(claimPath, task)
+            raise
+        finally:
+            stopHeartbeat.set()
+            heartbeat.join()
+        if claimLost.is_set():
+            self._print(f"{caseName} dropped, its claim was lost")
+            return
+        self.queue.publish(claimPath, task, float(objective), status=status)
+
+    def __beat(self, claimPath: Path, manager, stopHeartbeat, claimLost):
+        interval = self.queue.staleAfter / 5
+        while not stopHeartbeat.wait(interval):
+            if not claimLost.is_set() and not self.queue.heartbeat(claimPath):
+                self._print(f"Claim {claimPath.name} was lost, stopping the case")
+                claimLost.set()
+                # Until the case has been submitted and stopped
+                interval = min(interval, 1.0)
+            if claimLost.is_set():
+                job, executor = getattr(manager, "job", None), manager.executor
+                if job is not None and executor is not None:
+                    executor.cancel(job)
+                    if job.isFinished():
+                        return
+
+    def _print(self, string):
+        timestamp = datetime.now().strftime("%H:%M")
+        print(f"[{timestamp}] {type(self).__name__}: {string}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-filesystem case queue")
+    parser.add_argument("command", choices=["worker", "requeue"])
+    parser.add_argument("--queue", type=Path, default=Path.cwd() / "cfd" / "queue")
+    parser.add_argument("--cfd", type=Path, default=Path.cwd() / "cfd")
+    parser.add_argument("--refFiles", type=Path, default=Path.cwd() / "refFiles")
+    parser.add_argument("--staleAfter", type=float, default=300.0)
+    parser.add_argument("--pollInterval", type=float, default=10.0)
+    parser.add_argument(
+        "--idleTimeout", type=float, default=None, help="seconds, default: forever"
+    )
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue, staleAfter=args.staleAfter)
+    if args.command == "requeue":
+        queue.requeueStale()
+        return
+    QueueWorker(
+        queue, args.cfd, args.refFiles, args.pollInterval, args.idleTimeout
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from case_config import StarManager
+from starRunner.fake_starccm import fakeCommand
+from starRunner.sim_files import CAMPAIGN_BASE_DIR_NAME
+
+REPO_PATH = Path(__file__).parents[1]
+
+
+def test_later_cases_replace_only_the_changed_sketches(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+
+    design = [float(np.mean(bound)) for bound in X.qBound]
+    # The inlet lambdas only change the inlet section
+    inletDesign = list(design)
+    inletDesign[X.var_names.index("lambda1")] = X.qBound[X.var_names.index("lambda1")][0]
+
+    replaced = {}
+    for caseName, x in [("case_1", design), ("case_2", inletDesign), ("case_3", design)]:
+        manager = StarManager()
+        manager.STARCCMPath = fakeCommand()
+        manager.nCPUs = 1
+        manager.runSingleCase(caseName, x, cfdPath, refFilesPath)
+        assert manager.job.status == "done"
+        replaced[caseName] = manager.changedSketches
+        if caseName == "case_1":
+            # Nothing known about the geometry of the base case yet
+            assert (cfdPath / CAMPAIGN_BASE_DIR_NAME / "base.sim").is_file()
+            assert not (cfdPath / caseName / f"{caseName}_base.sim").exists()
+
+    assert sorted(replaced["case_1"]) == ["hex_section", "inlet_section", "outlet_section"]
+    assert replaced["case_2"] == ["inlet_section"]
+    # Compared against the campaign base, not the previous case
+    assert replaced["case_3"] == []
+
+
+def test_best_image_export_keeps_only_the_solution_of_a_new_best(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "ref files"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    objectives = {}
+    for caseName in ("case_1", "case_2"):
+        manager = StarManager()
+        manager.STARCCMPath = fakeCommand()
+        manager.nCPUs = 1
+        manager.imageExport = "best"
+        manager.bestObjective = objectives.get("case_1")
+        objectives[caseName] = manager.runSingleCase(
+            caseName, design, cfdPath, refFilesPath
+        )
+    assert objectives["case_1"] == objectives["case_2"]
+    assert (cfdPath / "case_1" / "case_1_solved.sim").is_file()
+    # The same design is no new best
+    assert not (cfdPath / "case_2" / "case_2_solved.sim").exists()
+
+    manager = StarManager()
+    manager.STARCCMPath = fakeCommand()
+    manager.attachCase("case_1", design, cfdPath, refFilesPath)
+    # Spaces in the paths stay one argument
+    assert manager.exportImages().wait() == 0
+    assert "Playing macro: export_images" in (
+        cfdPath / "case_1" / "CFD_export_out.txt"
+    ).read_text()
+
+
+def test_case_fails_without_its_design_data(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+
+    manager = StarManager()
+    manager.STARCCMPath = fakeCommand()
+    manager.nCPUs = 1
+    design = [float(np.mean(bound)) for bound in X.qBound]
+    manager.prepareCase("case_1", design, cfdPath, refFilesPath)
+    (cfdPath / "case_1" / "design_data.csv").unlink()
+    job = manager.submitCase()
+    manager.executor.wait(job)
+
+    assert job.status == "failed"
+    assert not (cfdPath / "case_1" / "results.csv").exists()
+
+
+def test_running_case_follows_a_new_best_objective(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    manager = StarManager()
+    manager.imageExport = "best"
+    manager.prepareCase("case_1", design, cfdPath, refFilesPath)
+    optionsPath = cfdPath / "case_1" / "case_options.csv"
+    assert "keep_solution_below" not in optionsPath.read_text()
+
+    manager.updateBestObjective(0.25)
+    assert "keep_solution_below, 0.25\n" in optionsPath.read_text()
+    assert "keep_solution, true\n" in optionsPath.read_text()
+
+
+def test_results_are_read_as_numbers(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    cfdPath = tmp_path / "cfd"
+    (cfdPath / "case_1").mkdir(parents=True)
+    (cfdPath / "case_1" / "results.csv").write_text(
+        "Report Name, Value, Unit, \n"
+        "inlet_total_pressure_mca, 101325.0, Pa\n"
+        "HEX_inlet_total_pressure_mca, 101225.0, Pa\n"
+        "HEX_outlet_total_pressure_mca, 101125.0, Pa\n"
+        "outlet_total_pressure_mca, 101000.0, Pa\n"
+        "HEX_inlet_velocity_uniformity, 0.9, \n"
+        "Continuity, 1e-05, \n"
+    )
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    manager = StarManager()
+    manager.attachCase("case_1", design, cfdPath, REPO_PATH / "refFiles")
+    objective = manager.collectResults()
+
+    assert manager.results["inlet_total_pressure_mca"] == 101325.0
+    assert manager.results["Continuity"] == 1e-5
+    assert objective == pytest.approx(325.0 / 101325.0)
+    assert manager.results["ductPressureLoss"] == pytest.approx(225.0 / 101325.0)
+    database = pd.read_csv(cfdPath / "database.csv")
+    assert database["overallDuctPressureLoss"].dtype == float
@@ -0,0 +1,78 @@
+import gzip
+import subprocess
+import sys
+from pathlib import Path
+
+from starRunner.case_log import (
+    CaseLogWriter,
+    iterMonitorRecords,
+    logSegments,
+    readIndex,
+    tailMonitorRecords,
+)
+from starRunner.fake_starccm import monitorTable
+
+CASE_LOG = Path(__file__).parents[1] / "starRunner" / "case_log.py"
+
+
+def solverOutput(iterations):
+    lines = ["Starting the solver"] + list(monitorTable(iterations)) + ["Done"]
+    return "".join(line + "\n" for line in lines).encode()
+
+
+def readSegments(logPath):
+    output = b""
+    for segmentPath in logSegments(logPath).values():
+        if segmentPath.suffix == ".gz":
+            output += gzip.decompress(segmentPath.read_bytes())
+        else:
+            output += segmentPath.read_bytes()
+    return output
+
+
+def test_rotated_log_is_read_back_through_its_index(tmp_path):
+    logPath = tmp_path / "CFD_out.txt"
+    output = solverOutput(200)
+    writer = CaseLogWriter(logPath, maxBytes=4000)
+    for line in output.splitlines(keepends=True):
+        writer.write(line)
+    writer.close()
+
+    segments = logSegments(logPath)
+    assert len(segments) > 3
+    assert list(segments.values())[-1] == logPath
+    assert logPath.stat().st_size <= 4000
+    assert readSegments(logPath) == output
+
+    records = list(iterMonitorRecords(logPath))
+    assert [record.iteration for record in records] == list(range(1, 201))
+    assert records[-1].values["Pressure Drop Monitor"] == 325.0
+    assert records[-1].values["Continuity"] == 1e-5
+    # The index points into the gzipped segments as well
+    rows = [entry for entry in readIndex(logPath) if entry[0] != "H"]
+    assert len(rows) == 200
+    assert {segment for _, segment, _ in rows} == set(segments)
+    assert tailMonitorRecords(logPath, n=5) == records[-5:]
+    assert list(iterMonitorRecords(logPath, fromIteration=150)) == records[149:]
+
+
+def test_wrapper_keeps_only_backup_count_segments(tmp_path):
+    logPath = tmp_path / "CFD_out.txt"
+    output = solverOutput(200)
+    script = f"import sys; sys.stdout.buffer.write({output!r})"
+    with open(logPath, "wb") as stdout:
+        returncode = subprocess.call(
+            [sys.executable, CASE_LOG, "--log", logPath, "--maxBytes", "4000"]
+            + ["--backupCount", "2", "--", sys.executable, "-c", script],
+            stdout=stdout,
+        )
+    assert returncode == 0
+
+    segments = logSegments(logPath)
+    assert len(segments) == 3
+    # Only the latest iterations are left, the tail is complete
+    records = list(iterMonitorRecords(logPath))
+    assert records[-1].iteration == 200
+    assert records[0].iteration > 1
+    assert tailMonitorRecords(logPath, n=10) == records[-10:]
+    assert output.endswith(readSegments(logPath))
@@ -0,0 +1,150 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from starRunner.async_runner import runCaseJob
+from starRunner.executors import BatchSchedulerExecutor, CaseJob, LocalPoolExecutor
+from starRunner.memory_model import MemoryModel
+from starRunner.watchdog import Watchdog
+
+FAKE_SCHEDULER = Path(__file__).parents[1] / "starRunner" / "fake_scheduler.py"
+
+
+def fakeBatchExecutor(watchdog=None, memoryModel=None):
+    executor = BatchSchedulerExecutor(
+        submitCommand=f"{sys.executable} {FAKE_SCHEDULER} submit",
+        statusCommand=f"{sys.executable} {FAKE_SCHEDULER} status {{jobId}}",
+        cancelCommand=f"{sys.executable} {FAKE_SCHEDULER} cancel {{jobId}}",
+        directives="",
+        watchdog=watchdog,
+        memoryModel=memoryModel,
+    )
+    executor.pollInterval = 0.1
+    return executor
+
+
+def sleepJob(casePath: Path, seconds: float):
+    return CaseJob(
+        "case_1",
+        ["sleep", str(seconds)],
+        casePath,
+        casePath / "CFD_out.txt",
+        casePath / "CFD_err.txt",
+    )
+
+
+def allocateJob(casePath: Path, megabytes: int, seconds: float):
+    # Touches the memory, holds it for a moment and exits
+    return CaseJob(
+        "case_1",
+        [
+            sys.executable,
+            "-c",
+            f"import time; b = b'x' * ({megabytes} * 1024**2); time.sleep({seconds})",
+        ],
+        casePath,
+        casePath / "CFD_out.txt",
+        casePath / "CFD_err.txt",
+    )
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake scheduler needs bash")
+def test_batch_queue_wait_is_not_a_hang(tmp_path, monkeypatch):
+    # Longer in the queue than the watchdog limits allow for the run itself
+    monkeypatch.setenv("FAKE_QUEUE_DELAY", "3")
+    executor = fakeBatchExecutor(
+        Watchdog(wallClockLimit=2.5, inactivityLimit=1.5, maxRetries=0)
+    )
+    job = executor.submit(sleepJob(tmp_path, 0.5))
+    assert job.status == "queued"
+    assert job.startTime is None
+
+    executor.wait(job)
+    assert job.status == "done"
+    assert job.reason is None
+    assert job.startTime - job.info["submitTime"] > 2.5
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake scheduler needs bash")
+def test_batch_watchdog_stops_a_running_hang(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_QUEUE_DELAY", "1")
+    executor = fakeBatchExecutor(Watchdog(inactivityLimit=1, maxRetries=0))
+    job = executor.submit(sleepJob(tmp_path, 30))
+
+    executor.wait(job)
+    assert job.status == "failed"
+    assert job.reason == "hung"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake scheduler needs bash")
+def test_batch_runtime_is_the_solver_time(tmp_path, monkeypatch):
+    # The runtime feeds the cost GP and the time budget: no queue wait, no poll delay
+    monkeypatch.setenv("FAKE_QUEUE_DELAY", "2")
+    executor = fakeBatchExecutor()
+    executor.pollInterval = 1.5
+    job = executor.submit(sleepJob(tmp_path, 1))
+
+    executor.wait(job)
+    assert job.status == "done"
+    assert 1 <= job.runtime() < 1.5
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="the fake scheduler needs bash")
+def test_batch_job_requests_its_memory_estimate(tmp_path):
+    databasePath = tmp_path / "database.csv"
+    databasePath.write_text("casename,nCPUs,cell_count,peak_rss_mb\ncase_1,1,1e6,1000\n")
+    executor = fakeBatchExecutor(
+        memoryModel=MemoryModel(databasePath, safetyFactor=1.5)
+    )
+    job = executor.submit(sleepJob(tmp_path, 0.1))
+
+    executor.wait(job)
+    assert job.status == "done"
+    assert "#SBATCH --mem=1500M" in (tmp_path / "job.sh").read_text().splitlines()
+
+
+def test_local_pool_keeps_to_its_cores(tmp_path):
+    executor = LocalPoolExecutor(totalCores=4)
+    executor.pollInterval = 0.1
+    jobs = []
+    for i, nCPUs in enumerate([2, 2, 2, 8]):
+        casePath = tmp_path / f"case_{i + 1}"
+        casePath.mkdir()
+        job = sleepJob(casePath, 0.5)
+        job.name, job.nCPUs = casePath.name, nCPUs
+        jobs.append(executor.submit(job))
+    assert [job.status for job in jobs] == ["running", "running", "pending", "pending"]
+
+    for job in jobs:
+        executor.wait(job)
+    executor.shutdown()
+    assert all(job.status == "done" for job in jobs)
+    # The third waits for a slot, the one larger than the pool runs alone
+    assert jobs[2].startTime >= min(jobs[0].endTime, jobs[1].endTime)
+    assert jobs[3].startTime >= max(job.endTime for job in jobs[:3])
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="peaks are read on Linux")
+def test_local_pool_records_the_peak_of_a_short_case(tmp_path):
+    executor = LocalPoolExecutor(totalCores=1)
+    job = executor.submit(allocateJob(tmp_path, 200, 0.5))
+    # The driver is busy (fitting the GP) for the whole case
+    time.sleep(2)
+
+    executor.wait(job)
+    executor.shutdown()
+    assert job.status == "done"
+    assert 200 * 1024**2 <= job.peakRSS < 400 * 1024**2
+    assert job.cpuTime > 0
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="peaks are read on Linux")
+def test_async_runner_records_the_peak(tmp_path):
+    job = allocateJob(tmp_path, 200, 0.5)
+
+    asyncio.run(runCaseJob(job))
+    assert job.status == "done"
+    assert 200 * 1024**2 <= job.peakRSS < 400 * 1024**2
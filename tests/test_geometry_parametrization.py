@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from geometryParametrization import bezierCurve, checkIfCurveSelfIntersects
+
+
+def loopSelfIntersects(curve):
+    # The check before it was vectorized, as reference
+    foundIntersection, intersection = False, None
+    for i in range(len(curve) - 1):
+        p, r = curve[i], curve[i + 1] - curve[i]
+        for j in range(len(curve) - 1):
+            if i != j:
+                q, s = curve[j], curve[j + 1] - curve[j]
+                rxs = r[0] * s[1] - r[1] * s[0]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    t = ((q - p)[0] * s[1] - (q - p)[1] * s[0]) / rxs
+                    u = ((q - p)[0] * r[1] - (q - p)[1] * r[0]) / rxs
+                if t > 0 and t < 1 and u > 0 and u < 1:
+                    intersection = p + t * r
+                    foundIntersection = True
+                    break
+        if foundIntersection:
+            break
+    return foundIntersection, intersection
+
+
+def randomCurves():
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        # Random walks cross themselves, the Bezier curves of 4 points only now and then
+        yield np.cumsum(rng.normal(size=(rng.integers(2, 40), 2)), axis=0)
+        yield bezierCurve(rng.uniform(size=(4, 2)), numPoints=50)[0]
+    # Straight, with repeated points, and doubling back on itself
+    yield np.linspace([0.0, 0.0], [1.0, 2.0], 20)
+    yield np.repeat(rng.uniform(size=(10, 2)), 2, axis=0)
+    yield np.array([[0.0, 0.0], [2.0, 0.0], [1.0, 0.0], [3.0, 0.0]])
+
+
+@pytest.mark.parametrize("curve", list(randomCurves()))
+def test_vectorized_check_matches_the_loop(curve):
+    errorState = np.geterr()
+    foundIntersection, intersection = checkIfCurveSelfIntersects(curve)
+    expectedFound, expectedIntersection = loopSelfIntersects(curve)
+
+    assert foundIntersection == expectedFound
+    if expectedFound:
+        np.testing.assert_allclose(intersection, expectedIntersection, rtol=1e-12)
+    else:
+        assert intersection is None
+    # The global numpy error handling is left as it was
+    assert np.geterr() == errorState
+
+
+def test_random_walks_include_both_outcomes():
+    outcomes = {loopSelfIntersects(curve)[0] for curve in randomCurves()}
+    assert outcomes == {True, False}
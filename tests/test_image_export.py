@@ -0,0 +1,48 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from starRunner.image_export import BestImageExport
+
+
+class ExportedCase:
+    """Stands for a StarManager whose export runs the given Python code."""
+
+    def __init__(self, caseName, code="import time; time.sleep(0.3)"):
+        self.caseName = caseName
+        self.casePath = Path(caseName)
+        self.code = code
+        self.exports = 0
+        self.discarded = False
+
+    def exportImages(self, images="all"):
+        self.exports += 1
+        return subprocess.Popen([sys.executable, "-c", self.code])
+
+    def discardSolution(self):
+        self.discarded = True
+
+
+def test_one_export_at_a_time_and_former_bests_discarded(capsys):
+    exports = BestImageExport()
+    first, second, third = (ExportedCase(f"case_{k}") for k in (1, 2, 3))
+    exports.submit(first)
+    exports.submit(second)
+    exports.submit(third)
+    # case_2 was superseded while case_1 was still exporting
+    assert (first.exports, second.exports, third.exports) == (1, 0, 0)
+    assert second.discarded and not first.discarded
+
+    exports.wait()
+    assert not exports.isRunning()
+    assert (first.exports, second.exports, third.exports) == (1, 0, 1)
+    # The solved sim of the current best stays
+    assert first.discarded and not third.discarded
+    assert "case_3: images exported" in capsys.readouterr().out
+
+
+def test_failed_export_is_reported(capsys):
+    exports = BestImageExport()
+    exports.submit(ExportedCase("case_1", code="raise SystemExit(3)"))
+    exports.wait()
+    assert "case_1: export failed with code 3" in capsys.readouterr().out
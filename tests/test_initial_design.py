@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.spatial.distance import pdist
+from scipy.stats import qmc
+
+from gpOptim import gpOpt_TBL as X
+
+BOUNDS = np.array(X.qBound, dtype=float)
+
+
+def unitSamples(design):
+    return (design - BOUNDS[:, 0]) / (BOUNDS[:, 1] - BOUNDS[:, 0])
+
+
+@pytest.mark.parametrize("method", ["sobol", "lhs", "maximin"])
+def test_same_seed_same_design_within_bounds(method):
+    def design(seed):
+        return X.initial_design(16, method, seed=seed, nTrials=10)
+
+    assert design(7).shape == (16, X.nPar)
+    np.testing.assert_array_equal(design(7), design(7))
+    assert not np.array_equal(design(7), design(8))
+    assert np.all(design(7) >= BOUNDS[:, 0]) and np.all(design(7) <= BOUNDS[:, 1])
+
+
+def test_lhs_has_one_sample_per_stratum():
+    unit = unitSamples(X.initial_design(16, "lhs", seed=3))
+    for column in unit.T:
+        assert sorted(np.floor(column * 16).astype(int)) == list(range(16))
+
+
+def test_maximin_is_the_best_of_its_trials():
+    nTrials = 20
+    design = unitSamples(X.initial_design(16, "maximin", seed=5, nTrials=nTrials))
+    # The trials as initial_design draws them
+    rng = np.random.default_rng(5)
+    trials = [qmc.LatinHypercube(X.nPar, seed=rng).random(16) for _ in range(nTrials)]
+    distances = [np.min(pdist(trial)) for trial in trials]
+    assert np.min(pdist(design)) == pytest.approx(max(distances))
+    assert np.min(pdist(design)) > np.median(distances)
+
+
+def test_infeasible_samples_are_replaced():
+    lambda1 = X.var_names.index("lambda1")
+    middle = BOUNDS[lambda1].mean()
+
+    def screen(x):
+        return "lambda1 too large" if x[lambda1] > middle else None
+
+    design = X.initial_design(8, "maximin", screen=screen, seed=2, nTrials=10)
+    assert design.shape == (8, X.nPar)
+    assert np.all(design[:, lambda1] <= middle)
+    assert len(np.unique(design, axis=0)) == 8
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from driver_BOGP import recover_journal
+from gpOptim import gpOpt_TBL as X
+from starRunner.journal import OptimizerJournal
+
+
+@pytest.fixture
+def campaign(tmp_path):
+    gpListPath = tmp_path / "gpList.dat"
+    X.write_GPsamples(gpListPath, np.zeros((0, X.nPar)), [])
+    return tmp_path / "journal.jsonl", gpListPath
+
+
+def design(value):
+    return [value] * X.nPar
+
+
+def gpListRows(gpListPath):
+    return X.read_available_GPsamples(gpListPath, X.nPar)[1]
+
+
+def test_torn_last_line_is_dropped_and_the_journal_goes_on(campaign):
+    journalPath, gpListPath = campaign
+    journal = OptimizerJournal(journalPath)
+    journal.ask("case_1", 1, design(0.1))
+    journal.tell("case_1", 1, design(0.1), 2.0)
+    journal.ask("case_2", 2, design(0.2))
+    # Killed while writing the tell of case_2
+    with open(journalPath, "a") as journalFile:
+        journalFile.write('{"event": "tell", "case": "case_2", "i": 2, "x": [0.')
+
+    # Restart
+    journal = OptimizerJournal(journalPath)
+    state = journal.recover()
+    assert list(state.pending()) == ["case_2"]
+    minInd, minR, minQ = recover_journal(state, gpListPath)
+    assert (minInd, minR, minQ) == (1, 2.0, design(0.1))
+    assert list(gpListRows(gpListPath)) == [2.0]
+
+    # Records after the torn line are read back
+    journal.tell("case_2", 2, design(0.2), 1.0)
+    state = journal.recover()
+    assert state.pending() == {}
+    assert recover_journal(state, gpListPath)[:2] == (2, 1.0)
+    assert list(gpListRows(gpListPath)) == [2.0, 1.0]
+
+
+def test_duplicate_tell_adds_one_sample(campaign):
+    journalPath, gpListPath = campaign
+    journal = OptimizerJournal(journalPath)
+    journal.ask("case_1", 1, design(0.1))
+    journal.tell("case_1", 1, design(0.1), 2.0)
+    # Harvested again after a restart
+    journal.tell("case_1", 1, design(0.1), 2.0)
+    journal.ask("case_2", 2, design(0.2))
+    journal.tell("case_2", 2, design(0.2), 3.0)
+
+    state = journal.recover()
+    assert list(state.told) == ["case_1", "case_2"]
+    assert recover_journal(state, gpListPath) == (1, 2.0, design(0.1))
+    # Recovering twice writes nothing more
+    recover_journal(journal.recover(), gpListPath)
+    assert list(gpListRows(gpListPath)) == [2.0, 3.0]
+
+
+def test_case_asked_but_not_told_is_pending(campaign):
+    journalPath, gpListPath = campaign
+    journal = OptimizerJournal(journalPath)
+    journal.ask("case_1", 1, design(0.1))
+    journal.tell("case_1", 1, design(0.1), 2.0)
+    X.write_GPsamples(gpListPath, np.array([design(0.1)]), [2.0])
+    journal.ask("case_2", 2, design(0.2))
+    journal.submit("case_2", pid=12345)
+    # Crash while case_2 runs
+
+    state = OptimizerJournal(journalPath).recover()
+    pending = state.pending()
+    assert list(pending) == ["case_2"]
+    assert pending["case_2"]["i"] == 2
+    assert pending["case_2"]["x"] == design(0.2)
+    assert state.submitted["case_2"]["pid"] == 12345
+    assert state.nextIndex() == 3
+    # Only what was told is in gpList.dat, and only once
+    assert recover_journal(state, gpListPath) == (1, 2.0, design(0.1))
+    assert list(gpListRows(gpListPath)) == [2.0]
@@ -0,0 +1,99 @@
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from case_config import StarManager
+from starRunner.fake_starccm import fakeCommand
+from starRunner.macro_bundle import SHARED_CLASSES, STATIC_MACROS, MacroBundle
+
+REPO_PATH = Path(__file__).parents[1]
+COMPILE_TIME = 0.5
+
+# Stands in for javac: one empty class per source, in the "macro" package
+FAKE_JAVAC = f"""#!{sys.executable}
+import sys
+from pathlib import Path
+args = sys.argv[1:]
+packagePath = Path(args[args.index("-d") + 1]) / "macro"
+packagePath.mkdir(parents=True, exist_ok=True)
+for source in [arg for arg in args if arg.endswith(".java")]:
+    (packagePath / (Path(source).stem + ".class")).touch()
+"""
+
+
+def runCase(tmp_path, caseName, macroBundle):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    cfdPath = tmp_path / caseName
+    cfdPath.mkdir()
+    manager = StarManager()
+    manager.STARCCMPath = fakeCommand()
+    manager.nCPUs = 1
+    manager.macroBundle = macroBundle
+    design = [float(np.mean(bound)) for bound in X.qBound]
+    manager.runSingleCase(caseName, design, cfdPath, refFilesPath)
+    assert manager.job.status == "done"
+    return manager.job
+
+
+def setUpRefFiles(tmp_path):
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    javacPath = tmp_path / "javac"
+    javacPath.write_text(FAKE_JAVAC)
+    javacPath.chmod(0o755)
+    return refFilesPath, javacPath
+
+
+def test_bundle_saves_the_compile_time_of_every_launch(tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_COMPILE_TIME", str(COMPILE_TIME))
+    refFilesPath, javacPath = setUpRefFiles(tmp_path)
+
+    bundle = MacroBundle(refFilesPath, tmp_path / "macros", javacPath=str(javacPath))
+    assert bundle.build() == SHARED_CLASSES + STATIC_MACROS
+    assert bundle.build() == []
+
+    sourceJob = runCase(tmp_path, "case_1", None)
+    bundleJob = runCase(tmp_path, "case_2", bundle)
+
+    def macros(job):
+        return job.command[job.command.index("-batch") + 1].split(",")
+
+    def sources(job):
+        return [macro for macro in macros(job) if macro.endswith(".java")]
+
+    assert [Path(m).stem for m in macros(bundleJob)] == [
+        Path(m).stem for m in macros(sourceJob)
+    ]
+    assert str(bundle.bundlePath) in bundleJob.command
+    # Only the generated macros are still compiled by STAR
+    compiled = len(sources(sourceJob)) - len(sources(bundleJob))
+    assert compiled >= 3
+    assert not any(Path(source).name in STATIC_MACROS for source in sources(bundleJob))
+    saved = sourceJob.runtime() - bundleJob.runtime()
+    assert saved > 0.8 * compiled * COMPILE_TIME
+
+
+def test_shared_class_is_bundled_without_the_macros(tmp_path):
+    refFilesPath, javacPath = setUpRefFiles(tmp_path)
+    bundle = MacroBundle(
+        refFilesPath, tmp_path / "macros", macroNames=[], javacPath=str(javacPath)
+    )
+    assert bundle.build() == SHARED_CLASSES
+    assert bundle.getClassFile("CaseMacro.java").is_file()
+
+    # STAR compiles the macros, against the shared class on the classpath
+    job = runCase(tmp_path, "case_1", bundle)
+    assert str(bundle.bundlePath) in job.command
+    macros = job.command[job.command.index("-batch") + 1].split(",")
+    assert all(macro.endswith(".java") for macro in macros)
+    # Every macro using the case directory comes from the shared class
+    for sourcePath in refFilesPath.glob("*.java"):
+        source = sourcePath.read_text()
+        if sourcePath.name not in SHARED_CLASSES and "getCaseDir(" in source:
+            assert "extends CaseMacro" in source
+            assert "String getCaseDir(" not in source
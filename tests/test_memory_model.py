@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from starRunner import memory_model
+from starRunner.executors import CaseJob
+from starRunner.memory_model import MemoryModel
+
+MB = 1024**2
+
+
+def writeDatabase(databasePath, cellCounts, peaks):
+    pd.DataFrame(
+        {
+            "casename": [f"case_{i}" for i in range(len(peaks))],
+            "nCPUs": 4,
+            "cell_count": cellCounts,
+            "peak_rss_mb": peaks,
+        }
+    ).to_csv(databasePath, index=False)
+
+
+def caseJob(casePath, name):
+    return CaseJob(
+        name, [], casePath, casePath / "CFD_out.txt", casePath / "CFD_err.txt", nCPUs=4
+    )
+
+
+def test_estimate_follows_the_cell_count(tmp_path):
+    # Peak memory: 1 GB plus 1 GB per million cells, with some scatter
+    cellCounts = [1e6, 2e6, 3e6, 4e6, 2.5e6, 1.5e6]
+    scatter = [50, -50, 0, 30, -20, 10]
+    peaks = [1000 + c / 1e3 + s for c, s in zip(cellCounts, scatter)]
+    writeDatabase(tmp_path / "database.csv", cellCounts, peaks)
+    model = MemoryModel(tmp_path / "database.csv", safetyFactor=1.0)
+
+    # Unknown mesh: at least every recorded peak, sized for the largest mesh
+    assert model.estimate(4) >= max(peaks) * MB
+    # A larger mesh needs more, a smaller one less, than the largest recorded
+    assert model.estimate(4, cellCount=8e6) == pytest.approx(9050 * MB, rel=0.02)
+    assert model.estimate(4, cellCount=1e6) < model.estimate(4) / 2
+    # Never below what a recorded case of the same size used
+    for cellCount, peak in zip(cellCounts, peaks):
+        assert model.estimate(4, cellCount=cellCount) >= peak * MB - 1
+
+
+def test_estimate_without_a_trend_is_the_largest_peak(tmp_path):
+    writeDatabase(tmp_path / "database.csv", [1e6, 2e6, 3e6], [3000, 2000, 1000])
+    model = MemoryModel(tmp_path / "database.csv", safetyFactor=1.2)
+    assert model.estimate(4) == pytest.approx(1.2 * 3000 * MB)
+
+
+def test_running_jobs_reserve_their_remaining_peak(tmp_path, monkeypatch):
+    writeDatabase(tmp_path / "database.csv", [1e6], [1000])
+    model = MemoryModel(tmp_path / "database.csv", safetyFactor=1.0)
+    monkeypatch.setattr(memory_model, "availableMemory", lambda: 1800 * MB)
+    running = caseJob(tmp_path, "case_1")
+    waiting = caseJob(tmp_path, "case_2")
+
+    # Just started, case_1 may still grow to its full estimate
+    running.info["rss"] = 0
+    assert not model.fits(waiting, [running])
+    assert waiting.info["waitingForMemory"]
+    # Close to its peak, the rest of its estimate is free for case_2
+    running.info["rss"] = 900 * MB
+    assert model.fits(waiting, [running])
+    assert model.fits(waiting, [])
@@ -0,0 +1,99 @@
+import gzip
+
+import pandas as pd
+
+from starRunner.retention import RetentionPolicy
+
+CASE_FILES = [
+    "{case}.sim",
+    "CFD_out.txt",
+    "load_design.java",
+    "design_data.csv",
+    "results.csv",
+]
+
+
+def writeCampaign(cfdPath, objectives, inFlight=()):
+    """objectives: case name -> objective, None for a failed case."""
+    rows = []
+    for caseName, objective in objectives.items():
+        rows.append(
+            {
+                "casename": caseName,
+                "status": "failed" if objective is None else "done",
+                "maxAveResidual": 1e-5,
+                "overallDuctPressureLoss": objective,
+            }
+        )
+    cfdPath.mkdir(exist_ok=True)
+    pd.DataFrame(rows).to_csv(cfdPath / "database.csv", index=False)
+    for caseName in [*objectives, *inFlight]:
+        casePath = cfdPath / caseName
+        casePath.mkdir()
+        for fileName in CASE_FILES:
+            filePath = casePath / fileName.format(case=caseName)
+            filePath.write_text(f"{caseName}\n" * 100)
+
+
+def caseFiles(casePath):
+    return sorted(path.name for path in casePath.iterdir())
+
+
+def test_only_dominated_and_failed_cases_are_pruned(tmp_path):
+    cfdPath = tmp_path / "cfd"
+    objectives = {
+        "case_1": 1.0,
+        "case_2": 2.0,
+        "case_3": 5.0,
+        "case_4": None,
+        "case_5": 3.0,
+        "case_6": 4.0,
+    }
+    writeCampaign(cfdPath, objectives, inFlight=["case_7"])
+    before = {
+        caseName: caseFiles(cfdPath / caseName) for caseName in [*objectives, "case_7"]
+    }
+
+    policy = RetentionPolicy(cfdPath, topK=2, keepRecent=1)
+    kept, dominated, failed = policy.classify()
+    assert (kept, dominated, failed) == (
+        ["case_1", "case_2", "case_6"],
+        ["case_3", "case_5"],
+        ["case_4"],
+    )
+    assert policy.apply() > 0
+
+    # Top-k, recent and the running case not yet in database.csv are untouched
+    for caseName in ("case_1", "case_2", "case_6", "case_7"):
+        assert caseFiles(cfdPath / caseName) == before[caseName]
+    for caseName in ("case_3", "case_4", "case_5"):
+        casePath = cfdPath / caseName
+        assert caseFiles(casePath) == [
+            "CFD_out.txt.gz",
+            "design_data.csv.gz",
+            "load_design.java.gz",
+            "results.csv",
+        ]
+        with gzip.open(casePath / "CFD_out.txt.gz", "rt") as logFile:
+            assert logFile.read() == f"{caseName}\n" * 100
+
+    # A second pass has nothing left to do
+    assert policy.apply() == 0
+
+
+def test_best_and_protected_cases_are_never_touched(tmp_path):
+    cfdPath = tmp_path / "cfd"
+    writeCampaign(cfdPath, {"case_1": 1.0, "case_2": 2.0, "case_3": 3.0})
+    before = {
+        caseName: caseFiles(cfdPath / caseName) for caseName in ("case_1", "case_3")
+    }
+
+    # Nothing kept by count, still the best design stays in full; case_3 is
+    # run again after a crash and has a row from its first run
+    policy = RetentionPolicy(cfdPath, topK=0, keepRecent=0)
+    policy.schedule(protected=["case_3"])
+    policy.wait()
+
+    assert caseFiles(cfdPath / "case_1") == before["case_1"]
+    assert caseFiles(cfdPath / "case_3") == before["case_3"]
+    assert "case_2.sim" not in caseFiles(cfdPath / "case_2")
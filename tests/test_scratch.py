@@ -0,0 +1,82 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+from pathlib import Path
+
+from starRunner.scratch import OWNER_FILE_NAME, SCRATCH_PREFIX
+
+SCRATCH = Path(__file__).parents[1] / "starRunner" / "scratch.py"
+
+# Stands in for STAR: reads its input, writes into the case directory the
+# pointer names and reports where it ran
+SOLVER = """
+import os, sys
+from pathlib import Path
+caseDir = Path(open(os.environ["BOGP_CASE_POINTER"]).readline().strip())
+design = Path(sys.argv[1]).read_text()
+(caseDir / "results.csv").write_text("pressureDrop\\n" + design)
+(caseDir / "scratch_only.tmp").write_text("x")
+print("solved in", os.getcwd(), "from", sys.argv[1], flush=True)
+sys.exit(int(design))
+"""
+
+
+def runScratch(casePath, scratchRoot, returncode=0):
+    (casePath / "design_data.csv").write_text(str(returncode))
+    return subprocess.call(
+        [sys.executable, SCRATCH, "--case", casePath, "--scratch", scratchRoot]
+        + ["--sync", "results.csv", "--sync", "CFD_*.txt", "--"]
+        + [sys.executable, "-c", SOLVER, casePath / "design_data.csv"],
+        cwd=casePath,
+    )
+
+
+def test_case_runs_in_scratch_and_syncs_back_its_outputs(tmp_path):
+    casePath = tmp_path / "cfd" / "case_1"
+    casePath.mkdir(parents=True)
+    scratchRoot = tmp_path / "scratch"
+
+    assert runScratch(casePath, scratchRoot) == 0
+
+    assert sorted(path.name for path in casePath.iterdir()) == [
+        "CFD_err.txt",
+        "CFD_out.txt",
+        "design_data.csv",
+        "results.csv",
+    ]
+    assert (casePath / "results.csv").read_text() == "pressureDrop\n0"
+    # It ran in scratch, on the staged copy of its input
+    output = (casePath / "CFD_out.txt").read_text().split()
+    stagePath = Path(output[2])
+    assert stagePath.parent == scratchRoot
+    assert stagePath.name.startswith(f"{SCRATCH_PREFIX}case_1_")
+    assert output[4] == str(stagePath / "design_data.csv")
+    # and left nothing there
+    assert list(scratchRoot.iterdir()) == []
+
+
+def test_failed_case_syncs_back_and_stale_scratch_is_removed(tmp_path):
+    casePath = tmp_path / "cfd" / "case_1"
+    casePath.mkdir(parents=True)
+    scratchRoot = tmp_path / "scratch"
+    # Left by a killed run on this host, and by a run on another node
+    deadProc = subprocess.Popen([sys.executable, "-c", "pass"])
+    deadProc.wait()
+    for name, host, pid in [
+        ("stale", socket.gethostname(), deadProc.pid),
+        ("other", "other-node", deadProc.pid),
+        ("alive", socket.gethostname(), os.getpid()),
+    ]:
+        stalePath = scratchRoot / f"{SCRATCH_PREFIX}{name}"
+        stalePath.mkdir(parents=True)
+        (stalePath / OWNER_FILE_NAME).write_text(json.dumps({"host": host, "pid": pid}))
+
+    assert runScratch(casePath, scratchRoot, returncode=3) == 3
+
+    assert (casePath / "results.csv").read_text() == "pressureDrop\n3"
+    assert sorted(path.name for path in scratchRoot.iterdir()) == [
+        f"{SCRATCH_PREFIX}alive",
+        f"{SCRATCH_PREFIX}other",
+    ]
@@ -0,0 +1,86 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from case_config import StarManager
+from starRunner.fake_starccm import fakeCommand
+from starRunner.sim_files import CASE_POINTER_FILE_NAME, stageSimFile
+
+fcntl = pytest.importorskip("fcntl")
+
+REPO_PATH = Path(__file__).parents[1]
+
+
+def failWith(code):
+    def fail(*args):
+        raise OSError(code, os.strerror(code))
+
+    return fail
+
+
+@pytest.fixture
+def baseSim(tmp_path):
+    basePath = tmp_path / "base.sim"
+    basePath.write_bytes(b"sim" * 1000)
+    return basePath
+
+
+def test_reflink_falls_back_to_hardlink_then_copy(tmp_path, baseSim, monkeypatch):
+    monkeypatch.setattr(fcntl, "ioctl", failWith(errno.EOPNOTSUPP))
+    targetPath = tmp_path / "case_1.sim"
+
+    simPath, strategy = stageSimFile(baseSim, targetPath, "reflink")
+    assert (simPath, strategy) == (targetPath, "hardlink")
+    assert os.path.samefile(targetPath, baseSim)
+
+    # Another filesystem
+    monkeypatch.setattr(os, "link", failWith(errno.EXDEV))
+    simPath, strategy = stageSimFile(baseSim, targetPath, "reflink")
+    assert (simPath, strategy) == (targetPath, "copy")
+    assert not os.path.samefile(targetPath, baseSim)
+    assert targetPath.read_bytes() == baseSim.read_bytes()
+
+
+def test_auto_loads_the_base_without_reflink(tmp_path, baseSim, monkeypatch):
+    monkeypatch.setattr(fcntl, "ioctl", failWith(errno.EOPNOTSUPP))
+    targetPath = tmp_path / "case_1.sim"
+    targetPath.write_bytes(b"stale")
+
+    assert stageSimFile(baseSim, targetPath, "auto") == (baseSim, "load")
+    # Neither a partial clone nor the sim of an earlier run is left
+    assert not targetPath.exists()
+
+
+def test_loaded_base_writes_only_to_the_case_directory(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    refFiles = sorted(refFilesPath.iterdir())
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    manager = StarManager()
+    manager.STARCCMPath = fakeCommand()
+    manager.nCPUs = 1
+    manager.simFileStrategy = "load"
+    manager.imageExport = "best"
+    manager.runSingleCase("case_1", design, cfdPath, refFilesPath)
+    assert manager.job.status == "done"
+
+    casePath = cfdPath / "case_1"
+    assert manager.simFilePath == refFilesPath / "basecase_curved_hexmodel_newstar.sim"
+    pointerPath = casePath / CASE_POINTER_FILE_NAME
+    assert manager.job.env == {"BOGP_CASE_POINTER": str(pointerPath)}
+    assert pointerPath.read_text().strip() == str(casePath.resolve())
+    # Results and the solution asked for are saved in the case directory,
+    # nothing next to the shared base
+    assert (casePath / "results.csv").is_file()
+    assert (casePath / "case_1_solved.sim").is_file()
+    assert sorted(refFilesPath.iterdir()) == refFiles
@@ -0,0 +1,167 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from case_config import StarManager
+from starRunner.fake_starccm import fakeCommand
+from starRunner.star_session import StarSession, supersedeCadModels
+
+REPO_PATH = Path(__file__).parents[1]
+MODEL = "HEXTestrigDuctCurvedFinsGeometry"
+ALL_BODIES = {"inlet_section", "hex_section", "outlet_section"}
+
+
+def test_supersede_keeps_the_models_that_still_back_parts():
+    cadModels = {MODEL: ALL_BODIES}
+    cadModels, superseded, removed = supersedeCadModels(
+        cadModels, MODEL, "case_2", ["inlet_section"]
+    )
+    assert superseded == f"{MODEL}_before_case_2"
+    assert removed == []
+    assert cadModels == {
+        f"{MODEL}_before_case_2": {"hex_section", "outlet_section"},
+        MODEL: {"inlet_section"},
+    }
+
+    cadModels, _, removed = supersedeCadModels(
+        cadModels, MODEL, "case_3", ["inlet_section", "hex_section"]
+    )
+    assert removed == [f"{MODEL}_before_case_3"]
+    assert cadModels == {
+        f"{MODEL}_before_case_2": {"outlet_section"},
+        MODEL: {"inlet_section", "hex_section"},
+    }
+
+
+def test_supersede_without_binding_removes_nothing():
+    cadModels, _, removed = supersedeCadModels(
+        {MODEL: ALL_BODIES}, MODEL, "case_2", ["inlet_section"], bound=False
+    )
+    assert removed == []
+    assert cadModels == {f"{MODEL}_before_case_2": ALL_BODIES, MODEL: set()}
+
+
+def test_session_keeps_only_the_models_bound_to_parts(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+
+    # Each design changes other sketches than the one before
+    design = [float(np.mean(bound)) for bound in X.qBound]
+    designs = [list(design)]
+    for name in ("lambda1", "lambda4", "xMidFactor"):
+        design[X.var_names.index(name)] = X.qBound[X.var_names.index(name)][0]
+        designs.append(list(design))
+    designs.append(list(design))
+    expected = [
+        [MODEL],
+        [MODEL, f"{MODEL}_before_case_2"],
+        [MODEL, f"{MODEL}_before_case_2", f"{MODEL}_before_case_3"],
+        [MODEL],
+        None,
+    ]
+
+    session = StarSession(
+        refFilesPath / "basecase_curved_hexmodel_newstar.sim",
+        tmp_path / "session",
+        STARCCMPath=fakeCommand(),
+        nCPUs=1,
+        startTimeout=30,
+    )
+    with session:
+        for i, (x, models) in enumerate(zip(designs, expected)):
+            manager = StarManager()
+            manager.starSession = session
+            caseName = f"case_{i + 1}"
+            manager.prepareCase(caseName, x, cfdPath, refFilesPath)
+            job = manager.submitCase()
+            assert job.returncode == 0, (cfdPath / caseName / "CFD_out.txt").read_text()
+
+            log = (cfdPath / caseName / "CFD_out.txt").read_text()
+            modelLines = [line for line in log.splitlines() if "CAD models:" in line]
+            if models is None:
+                # Nothing changed, no model built or removed
+                assert manager.changedSketches == []
+                assert modelLines == []
+            else:
+                assert modelLines[-1].split(": ", 1)[1].split(", ") == sorted(models)
+        assert set(session.cadModels) == {MODEL}
+
+
+def test_session_drops_the_warm_start_table_of_the_previous_case(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    session = StarSession(
+        refFilesPath / "basecase_curved_hexmodel_newstar.sim",
+        tmp_path / "session",
+        STARCCMPath=fakeCommand(),
+        nCPUs=1,
+        startTimeout=30,
+    )
+    logs = {}
+    with session:
+        for caseName in ("case_1", "case_2", "case_3"):
+            if caseName == "case_3":
+                # No snapshot left to start from
+                for snapshotPath in cfdPath.glob("*/solution_snapshot.csv"):
+                    snapshotPath.unlink()
+            manager = StarManager()
+            manager.starSession = session
+            manager.warmStart = True
+            manager.runSingleCase(caseName, design, cfdPath, refFilesPath)
+            assert manager.job.status == "done"
+            logs[caseName] = (cfdPath / caseName / "CFD_out.txt").read_text()
+
+    assert "Warm start from" in logs["case_2"]
+    assert "Initial conditions: table" in logs["case_2"]
+    assert "Tables: bogp_warm_start" in logs["case_2"]
+    assert "Initial conditions: constant" in logs["case_3"]
+    assert "Tables: none" in logs["case_3"]
+
+
+def test_one_server_runs_successive_cases(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    design = [float(np.mean(bound)) for bound in X.qBound]
+
+    session = StarSession(
+        refFilesPath / "basecase_curved_hexmodel_newstar.sim",
+        tmp_path / "session",
+        STARCCMPath=fakeCommand(),
+        nCPUs=1,
+        startTimeout=30,
+    )
+    with session:
+        serverPid = session.proc.pid
+        for caseName in ("case_1", "case_2", "case_3"):
+            manager = StarManager()
+            manager.starSession = session
+            manager.runSingleCase(caseName, design, cfdPath, refFilesPath)
+            assert manager.job.status == "done"
+            assert (cfdPath / caseName / "results.csv").is_file()
+            # No sim copy per case, the server holds the one it loaded
+            assert not list((cfdPath / caseName).glob("*.sim"))
+            assert session.proc.pid == serverPid
+
+    serverLog = (tmp_path / "session" / "server_out.txt").read_text()
+    assert serverLog.count("Server::start") == 1
+    with pytest.raises(RuntimeError, match="not running"):
+        session.runMacros([], cfdPath / "case_1", None, None)
@@ -0,0 +1,184 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from starRunner.fake_starccm import fakeCommand
+from starRunner.work_queue import WorkQueue, readJson
+
+REPO_PATH = Path(__file__).parents[1]
+N_CASES = 6
+STALE_AFTER = 3.0
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="workers are killed through /proc"
+)
+
+
+def descendants(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as statFile:
+                stat = statFile.read()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rfind(")") + 2 :].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def killTree(pid):
+    """As if the node of the worker died: the worker and the STAR run it started."""
+    for process in [pid] + descendants(pid):
+        try:
+            os.kill(process, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def claimsOf(queue: WorkQueue, pid):
+    claims = []
+    for claimPath in queue.claimedPath.glob("*.json"):
+        try:
+            if readJson(claimPath)["worker"]["pid"] == pid:
+                claims.append(claimPath)
+        except (OSError, ValueError, KeyError):
+            continue
+    return claims
+
+
+@pytest.fixture
+def campaign(tmp_path):
+    from gpOptim import gpOpt_TBL as X
+
+    refFilesPath = tmp_path / "refFiles"
+    shutil.copytree(REPO_PATH / "refFiles", refFilesPath)
+    (refFilesPath / "basecase_curved_hexmodel_newstar.sim").touch()
+    cfdPath = tmp_path / "cfd"
+    cfdPath.mkdir()
+    queue = WorkQueue(cfdPath / "queue", staleAfter=STALE_AFTER)
+    settings = {"STARCCMPath": fakeCommand(), "nCPUs": 1}
+    for i, x in enumerate(X.initial_design(N_CASES, "lhs", seed=0)):
+        queue.put(f"case_{i + 1}", x, settings=settings)
+    return tmp_path, queue
+
+
+def startWorkers(tmp_path, nWorkers, runtime=3):
+    env = dict(os.environ, PYTHONPATH=str(REPO_PATH), FAKE_RUNTIME=str(runtime))
+    command = [
+        sys.executable,
+        "-m",
+        "starRunner.work_queue",
+        "worker",
+        "--queue",
+        str(tmp_path / "cfd" / "queue"),
+        "--cfd",
+        str(tmp_path / "cfd"),
+        "--refFiles",
+        str(tmp_path / "refFiles"),
+        "--staleAfter",
+        str(STALE_AFTER),
+        "--pollInterval",
+        "0.5",
+        "--idleTimeout",
+        "10",
+    ]
+    return [
+        subprocess.Popen(
+            command,
+            cwd=tmp_path,
+            env=env,
+            stdout=open(tmp_path / f"worker_{k}.log", "w"),
+            stderr=subprocess.STDOUT,
+        )
+        for k in range(nWorkers)
+    ]
+
+
+def collectAll(queue: WorkQueue, timeout=180):
+    results = []
+    deadline = time.time() + timeout
+    while len(results) < N_CASES and time.time() < deadline:
+        results += queue.collect()
+        queue.requeueStale()
+        time.sleep(0.5)
+    return results
+
+
+def waitForRun(queue: WorkQueue, worker, timeout=60):
+    """Name of the case the worker runs, once its STAR run has started."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        claims = claimsOf(queue, worker.pid)
+        if claims:
+            caseName = claims[0].name.rsplit(".", 2)[0]
+            if (queue.queuePath.parent / caseName / "CFD_out.txt").exists():
+                time.sleep(0.5)
+                return caseName
+        time.sleep(0.1)
+    pytest.fail("the worker started no case")
+
+
+def stopWorkers(workers):
+    for worker in workers:
+        if worker.poll() is None:
+            killTree(worker.pid)
+        worker.wait()
+
+
+def test_no_case_lost_or_duplicated_when_a_worker_dies(campaign):
+    tmp_path, queue = campaign
+    workers = startWorkers(tmp_path, 3)
+    try:
+        waitForRun(queue, workers[0])
+        killTree(workers[0].pid)
+
+        results = collectAll(queue)
+    finally:
+        stopWorkers(workers)
+
+    counts = Counter(result["caseName"] for result in results)
+    assert sorted(counts) == sorted(f"case_{i + 1}" for i in range(N_CASES))
+    assert set(counts.values()) == {1}
+    assert all(result["status"] == "done" for result in results)
+    assert not any(queue.resultsPath.glob("*.json"))
+
+
+def test_worker_that_lost_its_claim_stops_and_publishes_nothing(campaign):
+    tmp_path, queue = campaign
+    # Still running when the worker wakes up again
+    workers = startWorkers(tmp_path, 2, runtime=10)
+    try:
+        caseName = waitForRun(queue, workers[0])
+        # Frozen longer than the heartbeat timeout, the case is requeued meanwhile
+        os.kill(workers[0].pid, signal.SIGSTOP)
+        time.sleep(STALE_AFTER + 1)
+        queue.requeueStale()
+        os.kill(workers[0].pid, signal.SIGCONT)
+
+        results = collectAll(queue)
+    finally:
+        stopWorkers(workers)
+
+    counts = Counter(result["caseName"] for result in results)
+    assert sorted(counts) == sorted(f"case_{i + 1}" for i in range(N_CASES))
+    assert set(counts.values()) == {1}
+    byCase = {result["caseName"]: result for result in results}
+    assert byCase[caseName]["attempt"] == 2
+    workerLog = (tmp_path / "worker_0.log").read_text()
+    assert f"{caseName} finished with code -15 (cancelled)" in workerLog
+    assert f"{caseName} dropped, its claim was lost" in workerLog